@@ -8,13 +8,50 @@ import pandas as pd
 import shlex
 import subprocess
 import logging
-import io
+import resource
 import json
+import contextlib
+import collections
+import tempfile
+import threading
 from ddot import Ontology
 
+try:
+    import pyarrow.feather as feather
+except ImportError:  # pragma: no cover
+    feather = None
+
 
 logger = logging.getLogger('runddot')
 
+# if first argument, runddot reads jobs from standard input
+# as json lines of the form {"id": <job id>, "args": [<arguments>]}
+# and after writing result of each job writes DONE:<job id>
+WORKER_FLAG = '--worker'
+DONE_PREFIX = 'DONE:'
+
+# number of lines of clixo standard error kept for error messages
+STDERR_TAIL_LINES = 50
+
+# written before result of each run with json resource usage
+USAGE_PREFIX = 'USAGE:'
+
+# written instead of RESULT: line when --clusteronly is set
+# followed by path to clustering output
+CLUSTERED_PREFIX = 'CLUSTERED:'
+
+# dtypes of clixo output columns (parent, child, type, score). Parent
+# and child are inferred since child can be a gene or a term id
+CLIXO_DTYPES = {2: str, 3: 'float64'}
+
+# column names and dtypes of interaction file passed to NDEx
+INTERACTION_COLUMNS = ['Gene1', 'Gene2', 'has_edge']
+INTERACTION_DTYPES = {0: 'category', 1: 'category', 2: 'float64'}
+
+# suffix of binary copy of parsed interaction file written
+# next to it, if pyarrow is available, so reruns skip parsing
+SIDECAR_SUFFIX = '.feather'
+
 
 def _parse_arguments(desc, args):
     """Parses command line arguments"""
@@ -49,74 +86,292 @@ def _parse_arguments(desc, args):
     parser.add_argument('--output',
                         help='If set, write output of algorithm to '
                              'file specified')
+    parser.add_argument('--clusteroutput',
+                        help='If set, clixo is NOT run and output of '
+                             'algorithm is read from file specified')
+    parser.add_argument('--clusteronly', action='store_true',
+                        help='If set, only clixo is run writing output '
+                             'to file set via --output and the '
+                             'ontology is NOT uploaded to NDEx')
     return parser.parse_args(args)
 
 
-def run_clixo(clixopath, inputfile, alpha, beta):
+def _tail_stream(stream, lines):
+    """
+    Reads stream until it is closed appending each line to lines
+    :param stream: binary stream to read
+    :param lines: :py:class:`collections.deque` with maxlen set
+    :return: None
+    """
+    for line in iter(stream.readline, b''):
+        lines.append(line.decode('utf-8', 'replace'))
+    stream.close()
+
+
+def run_clixo(clixopath, inputfile, alpha, beta, outputfile):
     """
-    Runs clixo
-    :param clixopath:
-    :param alpha:
-    :param beta:
-    :param inputfile:
-    :param outputfile:
-    :return:
+    Runs clixo writing its standard output directly to outputfile
+    so output is never held in memory
+    :param clixopath: path to clixo
+    :param inputfile: 3 column input file
+    :param alpha: clixo alpha parameter
+    :param beta: clixo beta parameter
+    :param outputfile: file to write clixo output to
+    :return: tuple (exit code, last lines of standard error as str)
     """
     cmd_to_run = clixopath + ' ' + inputfile + ' ' + str(alpha) + ' ' + str(beta)
     logger.debug(cmd_to_run)
-    p = subprocess.Popen(shlex.split(cmd_to_run),
-                         stdout=subprocess.PIPE,
-                         stderr=subprocess.PIPE)
+    errlines = collections.deque(maxlen=STDERR_TAIL_LINES)
+    with open(outputfile, 'wb') as f:
+        p = subprocess.Popen(shlex.split(cmd_to_run),
+                             stdout=f,
+                             stderr=subprocess.PIPE)
+        errthread = threading.Thread(target=_tail_stream,
+                                     args=(p.stderr, errlines))
+        errthread.start()
+        p.wait()
+        errthread.join()
+    return p.returncode, ''.join(errlines)
+
 
-    out, err = p.communicate()
-    return p.returncode, out, err
+def read_clixo_output(clusterfile):
+    """
+    Parses clixo output with the pandas C parser. Lines
+    starting with # are skipped
+    :param clusterfile: path to clixo output
+    :return: clixo output
+    :rtype: :py:class:`pandas.DataFrame`
+    """
+    return pd.read_csv(clusterfile, sep='\t', engine='c', header=None,
+                       comment='#', dtype=CLIXO_DTYPES, low_memory=False)
 
 
-def run_ddot(theargs):
+def _parse_interaction_file(inputfile):
+    """
+    Parses and validates 3 column tab delimited interaction file
+    with pandas C parser. Genes are stored as categories, shared by
+    both gene columns so they can be compared, to keep memory use
+    down. Weights are float64 so values sent to NDEx are unchanged
+    :param inputfile: path to interaction file
+    :raises ValueError: if file is not 3 columns with numeric weight
+    :return: interactions with columns INTERACTION_COLUMNS
+    :rtype: :py:class:`pandas.DataFrame`
+    """
+    df = pd.read_csv(inputfile, sep='\t', engine='c', header=None,
+                     comment='#', dtype=INTERACTION_DTYPES)
+    if df.shape[1] != 3:
+        raise ValueError('Interaction file must have 3 tab delimited '
+                         'columns, found ' + str(df.shape[1]))
+    if df.isnull().values.any():
+        raise ValueError('Interaction file has ' +
+                         str(int(df.isnull().any(axis=1).sum())) +
+                         ' rows with missing values')
+    genes = pd.CategoricalDtype(df[0].cat.categories.union(
+        df[1].cat.categories))
+    df[0] = df[0].astype(genes)
+    df[1] = df[1].astype(genes)
+    df.columns = INTERACTION_COLUMNS
+    return df
+
+
+def get_ddot_network(idf):
+    """
+    Gets copy of interactions with plain python string genes,
+    as ddot expects, instead of categories
+    :param idf: interactions from :py:func:`read_interaction_file`
+    :return: interactions with columns INTERACTION_COLUMNS
+    :rtype: :py:class:`pandas.DataFrame`
+    """
+    network = idf.copy()
+    for col in INTERACTION_COLUMNS[:2]:
+        network[col] = network[col].astype(str)
+    return network
+
+
+def read_interaction_file(inputfile):
+    """
+    Gets interaction file as a data frame. If a sidecar file
+    newer then inputfile exists it is loaded instead, otherwise the
+    file is parsed with :py:func:`_parse_interaction_file` and, if
+    pyarrow is available, the sidecar is written for reruns
+    :param inputfile: path to interaction file
+    :raises ValueError: if file is invalid
+    :return: interactions with columns INTERACTION_COLUMNS
+    :rtype: :py:class:`pandas.DataFrame`
+    """
+    sidecar = inputfile + SIDECAR_SUFFIX
+    if feather is not None and os.path.isfile(sidecar) and\
+            os.path.getmtime(sidecar) >= os.path.getmtime(inputfile):
+        try:
+            return feather.read_feather(sidecar)
+        except Exception as e:
+            logger.info('Unable to read ' + sidecar + ': ' + str(e))
+
+    df = _parse_interaction_file(inputfile)
+    if feather is not None:
+        try:
+            feather.write_feather(df, sidecar)
+        except Exception as e:
+            logger.info('Unable to write ' + sidecar + ': ' + str(e))
+    return df
+
+
+def get_ddot_result(theargs):
+    """
+    Runs clixo, unless theargs.clusteroutput is set, and uploads
+    resulting ontology to NDEx, unless theargs.clusteronly is set
+    :param theargs: parsed arguments from :py:func:`_parse_arguments`
+    :return: tuple (NDEx url of ontology, None) or (None, None) if
+             theargs.clusteronly is set or
+             (None, 'str containing error message')
+    """
+    tmpfile = None
     try:
-        (e_code, c_out, c_err) = run_clixo(theargs.clixopath, theargs.input, theargs.alpha, theargs.beta)
-        df = pd.read_csv(io.StringIO(c_out.decode('utf-8')), sep='\t',
-                         engine='python', header=None, comment='#')
-
-        if theargs.output is not None:
-            try:
-                with open(theargs.output, 'wb') as f:
-                    f.write(c_out)
-                outputdir = os.path.dirname(theargs.output)
-                statres = os.stat(outputdir)
-                os.chown(theargs.output, statres[stat.ST_UID],
-                         statres[stat.ST_GID])
-            except Exception as ex:
-                sys.stderr.write('Caught exception trying to write file or'
-                                 'change permission: ' + str(ex))
+        if theargs.clusteronly is True and theargs.output is None:
+            return None, '--output must be set with --clusteronly'
+        # parsed before clixo runs so an invalid file fails fast
+        idf = read_interaction_file(theargs.input)
+        if theargs.clusteroutput is not None:
+            clusterfile = theargs.clusteroutput
+        else:
+            if theargs.output is not None:
+                clusterfile = theargs.output
+            else:
+                (fd, tmpfile) = tempfile.mkstemp(suffix='.clixo')
+                os.close(fd)
+                clusterfile = tmpfile
+            (e_code, c_err) = run_clixo(theargs.clixopath, theargs.input,
+                                        theargs.alpha, theargs.beta,
+                                        clusterfile)
+            if theargs.output is not None:
+                try:
+                    outputdir = os.path.dirname(theargs.output)
+                    statres = os.stat(outputdir)
+                    os.chown(theargs.output, statres[stat.ST_UID],
+                             statres[stat.ST_GID])
+                except Exception as ex:
+                    sys.stderr.write('Caught exception trying to change '
+                                     'permission: ' + str(ex))
+            if e_code != 0:
+                # output of a failed run is partial, so it is
+                # neither parsed nor uploaded
+                emsg = 'clixo exited with code ' + str(e_code)
+                if c_err.strip():
+                    emsg += ': ' + c_err.strip()
+                logger.error(emsg)
+                return None, emsg
+        df = read_clixo_output(clusterfile)
 
         ont1 = Ontology.from_table(df, clixo_format=True, parent=0, child=1)
 
+        if theargs.clusteronly is True:
+            return None, None
+
         if theargs.ndexserver.startswith('http://'):
             server = theargs.ndexserver
         else:
             server = 'http://' + theargs.ndexserver
 
-        idf = pd.read_csv(theargs.input, sep='\t', engine='python', header=None, comment='#')
-        idf.rename(columns={0: 'Gene1', 1: 'Gene2', 2: 'has_edge'}, inplace=True)
         ont_url, G = ont1.to_ndex(name=theargs.ndexname,
-                                  network=idf,
+                                  network=get_ddot_network(idf),
                                   main_feature='has_edge',
                                   ndex_server=server,
                                   ndex_pass=theargs.ndexuser,
                                   ndex_user=theargs.ndexpass,
                                   layout=theargs.ndexlayout,
                                   visibility=theargs.ndexvisibility)
-        return 'RESULT:' + ont_url.strip().replace('/v2/network/',
-                                                   '/#/network/') + '\n'
+        return ont_url.strip().replace('/v2/network/', '/#/network/'), None
     except OverflowError as ofe:
         logger.exception('Error running clixo')
-        return 'ERROR:' + str(ofe) + '\n'
+        return None, str(ofe)
     except Exception as e:
         logger.exception('Some other error')
-        return 'ERROR:' + str(e) + '\n'
+        return None, str(e)
+    finally:
+        if tmpfile is not None and os.path.isfile(tmpfile):
+            os.unlink(tmpfile)
 
-    return {'error': 'unknown error'}
+
+def run_ddot(theargs):
+    """
+    Runs ddot via :py:func:`get_ddot_result`
+    :param theargs: parsed arguments from :py:func:`_parse_arguments`
+    :return: RESULT:<NDEx url>, CLUSTERED:<clustering output> or
+             ERROR:<message> line
+    """
+    ndexurl, emsg = get_ddot_result(theargs)
+    if emsg is not None:
+        return 'ERROR:' + emsg + '\n'
+    if theargs.clusteronly is True:
+        return CLUSTERED_PREFIX + theargs.output + '\n'
+    return 'RESULT:' + ndexurl + '\n'
+
+
+def get_resource_usage(start=None, maxrss=True):
+    """
+    Gets resource usage of this process and children
+    that have been waited for. Peak resident set size is
+    the max over the life of this process
+    :param start: if set, value from earlier call to this function
+                  whose CPU time is subtracted
+    :param maxrss: if False, peak resident set size is left out
+    :return: dict with peak resident set size in bytes (maxrss) and
+             CPU time in seconds (cputime)
+    """
+    selfru = resource.getrusage(resource.RUSAGE_SELF)
+    childru = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cputime = (selfru.ru_utime + selfru.ru_stime +
+               childru.ru_utime + childru.ru_stime)
+    if start is not None:
+        cputime -= start['cputime']
+    usage = {'cputime': round(cputime, 3)}
+    if maxrss is True:
+        usage['maxrss'] = max(selfru.ru_maxrss, childru.ru_maxrss) * 1024
+    return usage
+
+
+def _get_usage_line(start, maxrss=True):
+    """
+    Gets USAGE: line for resource usage since start
+    :param start: value from :py:func:`get_resource_usage`
+    :param maxrss: if False, peak resident set size is left out
+    :return: str
+    """
+    return USAGE_PREFIX + json.dumps(get_resource_usage(start,
+                                                        maxrss=maxrss)) + '\n'
+
+
+def run_worker(desc, infile, outfile):
+    """
+    Runs jobs read from infile until it is closed. Anything
+    written to standard output while a job runs is redirected to
+    standard error so only job results are written to outfile
+    :param desc: description passed to argument parser
+    :param infile: file to read json job lines from
+    :param outfile: file to write results to
+    :return: 0
+    """
+    for line in infile:
+        line = line.strip()
+        if len(line) == 0:
+            continue
+        jobid = None
+        start = get_resource_usage()
+        try:
+            job = json.loads(line)
+            jobid = job['id']
+            with contextlib.redirect_stdout(sys.stderr):
+                theargs = _parse_arguments(desc, job['args'])
+                res = run_ddot(theargs)
+        except (Exception, SystemExit) as e:
+            logger.exception('Unable to run job: ' + line)
+            res = 'ERROR:Unable to run job: ' + str(e) + '\n'
+        # peak resident set size of a worker spans all of its jobs
+        outfile.write(_get_usage_line(start, maxrss=False))
+        outfile.write(res)
+        outfile.write(DONE_PREFIX + str(jobid) + '\n')
+        outfile.flush()
+    return 0
 
 
 def main(args):
@@ -125,13 +380,18 @@ def main(args):
     Runs tasks generated by DDOT REST service
 
     """
+    if len(args) > 1 and args[1] == WORKER_FLAG:
+        return run_worker(desc, sys.stdin, sys.stdout)
+
     theargs = _parse_arguments(desc, args[1:])
     theargs.program = args[0]
     theargs.version = 'unknown'
     try:
+        start = get_resource_usage()
         res = run_ddot(theargs)
         if res is None or res == '':
             sys.stdout.write('Result is empty or None wtf\n')
+        sys.stdout.write(_get_usage_line(start))
         sys.stdout.write(res)
         sys.stdout.flush()
     except Exception as ex:
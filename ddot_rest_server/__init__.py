@@ -13,12 +13,27 @@ import json
 import shutil
 import time
 import copy
+import hashlib
+import gzip
+import math
+import sqlite3
+import threading
+import stat
+import zlib
+import tempfile
 import flask
 
-from flask import Flask, jsonify, request
+from flask import Flask, Request, jsonify, request
 from flask_restplus import reqparse, Api, Resource, fields, marshal
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
+from werkzeug.http import is_resource_modified
+from ddot_rest_server.fswatch import FileSystemWatcher
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
 
 
 desc = """The Data-Driven Ontology Toolkit (DDOT) REST Service
@@ -40,11 +55,42 @@ JOB_PATH_KEY = 'JOB_PATH'
 WAIT_COUNT_KEY = 'WAIT_COUNT'
 SLEEP_TIME_KEY = 'SLEEP_TIME'
 DEFAULT_RATE_LIMIT_KEY = 'DEFAULT_RATE_LIMIT'
+MAX_WAIT_KEY = 'MAX_WAIT'
+MAX_STREAM_TIME_KEY = 'MAX_STREAM_TIME'
+MAX_STREAMS_KEY = 'MAX_STREAMS'
+MAX_WAITS_KEY = 'MAX_WAITS'
+MAX_STREAM_TASKS_KEY = 'MAX_STREAM_TASKS'
+MAX_INTERACTION_FILE_SIZE_KEY = 'MAX_INTERACTION_FILE_SIZE'
+MAX_BATCH_SIZE_KEY = 'MAX_BATCH_SIZE'
 
 app.config[JOB_PATH_KEY] = '/tmp'
 app.config[WAIT_COUNT_KEY] = 60
 app.config[SLEEP_TIME_KEY] = 10
 app.config[DEFAULT_RATE_LIMIT_KEY] = '360 per hour'
+app.config[MAX_WAIT_KEY] = 30
+app.config[MAX_STREAM_TIME_KEY] = 300
+
+# max number of event streams each process serves at once. Every
+# open stream ties up a request thread so this should be well under
+# the number of threads per process. A client needs only one stream
+# since a stream can follow up to MAX_STREAM_TASKS tasks
+app.config[MAX_STREAMS_KEY] = 2
+app.config[MAX_STREAM_TASKS_KEY] = 1000
+
+# max number of GET requests with wait parameter each process
+# holds open at once, further requests are answered immediately.
+# Like event streams each one ties up a request thread
+app.config[MAX_WAITS_KEY] = 2
+
+# max size in bytes of interaction file after decompression,
+# None means no limit. Uncompressed uploads over the limit stop
+# being written to disk as soon as it is exceeded. Set flask
+# MAX_CONTENT_LENGTH to also reject oversized request bodies
+# before they are read
+app.config[MAX_INTERACTION_FILE_SIZE_KEY] = None
+
+# max number of alpha, beta pairs in a batch submission
+app.config[MAX_BATCH_SIZE_KEY] = 100
 
 app.config.from_envvar(DDOT_REST_SETTINGS_ENV, silent=True)
 app.logger.info('Job Path dir: ' + app.config[JOB_PATH_KEY])
@@ -56,8 +102,18 @@ TMP_RESULT = 'result.tmp'
 RESULT = 'result.json'
 CLUSTEROUT = 'rawcluster.output'
 
+# suffix of gzip compressed copies of CLUSTEROUT and interaction
+# file the task runner replaces them with once a task is done
+COMPRESSED_SUFFIX = '.gz'
+COMPRESSION_LEVEL = 6
+
+# binary copy of parsed interaction file written by runddot.py
+INTERACTION_FILE_SIDECAR = 'interactionfile.feather'
+
 ERROR_PARAM = 'error'
 REMOTEIP_PARAM = 'remoteip'
+WAIT_PARAM = 'wait'
+IDS_PARAM = 'ids'
 
 
 STATUS_RESULT_KEY = 'status'
@@ -65,16 +121,64 @@ NOTFOUND_STATUS = 'notfound'
 UNKNOWN_STATUS = 'unknown'
 SUBMITTED_STATUS = 'submitted'
 PROCESSING_STATUS = 'processing'
+# clustering is done and raw output is available, but
+# NDEx upload has not yet been started
+CLUSTERED_STATUS = 'clustered'
+# NDEx upload of clustering output is running
+UPLOADING_STATUS = 'uploading'
 DONE_STATUS = 'done'
 ERROR_STATUS = 'error'
 
+# states of a task, in the order a task moves through them, that
+# have a directory under JOB_PATH
+TASK_STATES = [SUBMITTED_STATUS, PROCESSING_STATUS, CLUSTERED_STATUS,
+               UPLOADING_STATUS, DONE_STATUS]
+
+# states where task has not yet completed
+PENDING_STATES = (SUBMITTED_STATUS, PROCESSING_STATUS, CLUSTERED_STATUS,
+                  UPLOADING_STATUS)
+
+# states where raw output from clustering algorithm is available
+CLUSTERED_STATES = (CLUSTERED_STATUS, UPLOADING_STATUS, DONE_STATUS)
+
 # directory where token files named after tasks to delete
 # are stored
 DELETE_REQUESTS = 'delete_requests'
 
+# directory where json files named after batch ids listing
+# tasks in each batch are stored
+BATCHES = 'batches'
+
+# directory under JOB_PATH holding one copy of each unique
+# interaction file named after its SHA-256
+BLOBS = 'blobs'
+
+# directory under JOB_PATH where uploaded files are written as
+# the request body is received
+UPLOADS = 'uploads'
+
+# sqlite database under JOB_PATH mapping task uuid to
+# state, ip address and path of task directory
+TASK_INDEX = 'taskindex.db'
+
 # key in result dictionary denoting the
 # result data
 RESULT_KEY = 'result'
+TASKID_KEY = 'id'
+
+# time in milliseconds clients should wait before
+# reconnecting to an event stream that was closed
+EVENT_STREAM_RETRY_MS = 5000
+
+# size in bytes of chunks read from RESULT file
+# when streaming it to the client
+RESULT_CHUNK_SIZE = 65536
+
+# size in bytes of chunks read from uploaded interaction file
+UPLOAD_CHUNK_SIZE = 1048576
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
 NDEXURL_KEY = 'ndexurl'
 HIVIEWURL_KEY = 'hiviewurl'
 
@@ -89,6 +193,39 @@ NDEXPASS_PARAM = 'ndexpass'
 NDEXNAME_PARAM = 'ndexname'
 HIVIEWURL_PARAM = 'hiviewurl'
 NETATTRIB_PARAM = 'networkattributes'
+SUBMITTIME_PARAM = 'submittime'
+INTERACTION_FILE_SHA256_PARAM = 'interactionfilesha256'
+INTERACTION_FILE_SIZE_PARAM = 'interactionfilesize'
+
+# json list of {"alpha": <alpha>, "beta": <beta>} passed to batch
+# submission, one task is created per entry
+ALPHA_BETA_LIST_PARAM = 'alphabetalist'
+
+# set in task json of tasks created by batch submission
+BATCH_ID_PARAM = 'batchid'
+
+# keys in batch json file and batch responses
+BATCH_TASKS_KEY = 'tasks'
+LOCATION_KEY = 'location'
+LOCATIONS_KEY = 'locations'
+
+# set in task json by create_task(), holds summary of
+# interaction file with keys below
+INTERACTION_FILE_STATS_PARAM = 'interactionfilestats'
+NODE_COUNT_KEY = 'nodes'
+EDGE_COUNT_KEY = 'edges'
+MIN_WEIGHT_KEY = 'minweight'
+MAX_WEIGHT_KEY = 'maxweight'
+
+# longest line allowed in interaction file
+MAX_INTERACTION_LINE_LEN = 65536
+
+# set in task json by task runner, holds resource usage
+# of task with keys below
+RESOURCE_USAGE_PARAM = 'resourceusage'
+WALLTIME_KEY = 'walltime'
+CPUTIME_KEY = 'cputime'
+MAXRSS_KEY = 'maxrss'
 
 
 api = Api(app, version=str(__version__),
@@ -142,6 +279,23 @@ def get_processing_dir():
     return os.path.join(app.config[JOB_PATH_KEY], PROCESSING_STATUS)
 
 
+def get_clustered_dir():
+    """
+    Gets base directory where jobs whose clustering has completed,
+    but are waiting for upload to NDEx will be placed
+    :return:
+    """
+    return os.path.join(app.config[JOB_PATH_KEY], CLUSTERED_STATUS)
+
+
+def get_uploading_dir():
+    """
+    Gets base directory where jobs being uploaded to NDEx will be placed
+    :return:
+    """
+    return os.path.join(app.config[JOB_PATH_KEY], UPLOADING_STATUS)
+
+
 def get_done_dir():
     """
         Gets base directory where completed jobs will be placed
@@ -151,6 +305,23 @@ def get_done_dir():
     return os.path.join(app.config[JOB_PATH_KEY], DONE_STATUS)
 
 
+def get_batch_dir():
+    """
+    Gets base directory where batch json files will be placed
+    :return:
+    """
+    return os.path.join(app.config[JOB_PATH_KEY], BATCHES)
+
+
+def get_upload_dir():
+    """
+    Gets base directory where uploaded files are written as they
+    are received
+    :return:
+    """
+    return os.path.join(app.config[JOB_PATH_KEY], UPLOADS)
+
+
 def get_delete_request_dir():
     """
     Gets base directory where delete request token files will be placed
@@ -159,18 +330,1029 @@ def get_delete_request_dir():
     return os.path.join(app.config[JOB_PATH_KEY], DELETE_REQUESTS)
 
 
-def create_task(params):
+class TaskIndex(object):
     """
-    Creates a task by consuming data from request_obj passed in
-    and persisting that information to the filesystem under
-    JOB_PATH/SUBMIT_DIR/<IP ADDRESS>/UUID with various parameters
-    stored in TASK_JSON file and if the 'network' file is set
-    that data is dumped to NETWORK_DATA file within the directory
-    :param request_obj:
-    :return: string that is a uuid which denotes directory name
+    Persistent index of tasks stored in a sqlite database
+    under the job path. Each entry maps a task uuid to
+    the state, ip address and full path of the task directory
+    so tasks can be found without scanning the state directories.
+
+    The index is only a cache, any failure to read or write
+    it is logged and callers are expected to fall back to
+    scanning the filesystem.
+    """
+
+    # database files known to have the tasks table
+    _initialized = set()
+
+    # max tasks looked up per query by lookup_many, kept
+    # under sqlite's default limit of 999 parameters
+    LOOKUP_BATCH_SIZE = 500
+
+    def __init__(self, jobpath, timeout=30):
+        """
+        Constructor
+        :param jobpath: base directory containing state directories
+        :param timeout: seconds to wait on a locked database
+        """
+        self._jobpath = jobpath
+        self._timeout = timeout
+        self._dbfile = None
+        if jobpath is not None:
+            self._dbfile = os.path.join(jobpath, TASK_INDEX)
+
+    def _create_dbfile(self):
+        """
+        Creates empty database file with mode 0664 regardless of
+        umask. The REST service and task runner run as different users
+        in the same group and sqlite creates journal files with the
+        same mode as the database file so both users can write to it
+        :return: None
+        """
+        try:
+            original_umask = os.umask(0)
+            fd = os.open(self._dbfile, os.O_WRONLY | os.O_CREAT | os.O_EXCL,
+                         0o664)
+            os.close(fd)
+        except FileExistsError:
+            pass
+        except OSError as e:
+            app.logger.error('Unable to create ' + self._dbfile + ' : ' +
+                             str(e))
+        finally:
+            os.umask(original_umask)
+
+    def _make_group_writable(self):
+        """
+        Adds group write permission to database file, if this
+        process owns it, which fixes files created before
+        :py:meth:`_create_dbfile` set the mode
+        :return: None
+        """
+        try:
+            st = os.stat(self._dbfile)
+            if st.st_uid == os.geteuid() and not st.st_mode & stat.S_IWGRP:
+                os.chmod(self._dbfile, stat.S_IMODE(st.st_mode) |
+                         stat.S_IRGRP | stat.S_IWGRP)
+        except OSError as e:
+            app.logger.debug('Unable to make ' + self._dbfile +
+                             ' group writable : ' + str(e))
+
+    def _connect(self):
+        """
+        Opens connection to index, creating the database file and
+        table if needed
+        :return: sqlite3 connection
+        """
+        if not os.path.isfile(self._dbfile):
+            self._create_dbfile()
+            TaskIndex._initialized.discard(self._dbfile)
+        conn = sqlite3.connect(self._dbfile, timeout=self._timeout)
+        if self._dbfile not in TaskIndex._initialized:
+            self._make_group_writable()
+            conn.execute('CREATE TABLE IF NOT EXISTS tasks '
+                         '(uuid TEXT PRIMARY KEY, state TEXT, '
+                         'ipaddr TEXT, path TEXT)')
+            TaskIndex._initialized.add(self._dbfile)
+        return conn
+
+    def get_dbfile(self):
+        """
+        Gets path to index database file
+        :return:
+        """
+        return self._dbfile
+
+    def update(self, uuidstr, state, ipaddr, taskpath):
+        """
+        Adds or replaces entry for task
+        :param uuidstr: uuid of task
+        :param state: state of task ie submitted, processing, done
+        :param ipaddr: ip address directory of task
+        :param taskpath: full path to task directory
+        :return: None upon success or str with error message
+        """
+        if self._dbfile is None or uuidstr is None:
+            return 'Index file or uuid is None'
+        try:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute('INSERT OR REPLACE INTO tasks '
+                                 '(uuid, state, ipaddr, path) '
+                                 'VALUES (?, ?, ?, ?)',
+                                 (uuidstr, state, ipaddr, taskpath))
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            app.logger.error('Unable to update task index for ' +
+                             str(uuidstr) + ' : ' + str(e))
+            return str(e)
+        return None
+
+    def remove(self, uuidstr):
+        """
+        Removes entry for task
+        :param uuidstr: uuid of task
+        :return: None upon success or str with error message
+        """
+        if self._dbfile is None or uuidstr is None:
+            return 'Index file or uuid is None'
+        if not os.path.isfile(self._dbfile):
+            return None
+        try:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute('DELETE FROM tasks WHERE uuid = ?',
+                                 (uuidstr,))
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            app.logger.error('Unable to remove ' + str(uuidstr) +
+                             ' from task index : ' + str(e))
+            return str(e)
+        return None
+
+    def lookup(self, uuidstr):
+        """
+        Looks up task in index
+        :param uuidstr: uuid of task
+        :return: tuple (state, ipaddr, taskpath) or None if not found
+        """
+        if self._dbfile is None or uuidstr is None:
+            return None
+        if not os.path.isfile(self._dbfile):
+            return None
+        try:
+            conn = self._connect()
+            try:
+                row = conn.execute('SELECT state, ipaddr, path FROM tasks '
+                                   'WHERE uuid = ?', (uuidstr,)).fetchone()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            app.logger.error('Unable to query task index for ' +
+                             str(uuidstr) + ' : ' + str(e))
+            return None
+        if row is None:
+            return None
+        return row[0], row[1], row[2]
+
+    def lookup_many(self, uuidlist):
+        """
+        Looks up several tasks in index with one query per
+        LOOKUP_BATCH_SIZE tasks
+        :param uuidlist: list of task uuids
+        :return: dict of uuid to tuple (state, ipaddr, taskpath) for
+                 tasks found in index
+        """
+        if self._dbfile is None or not os.path.isfile(self._dbfile):
+            return {}
+        uuidlist = list(uuidlist)
+        found = {}
+        try:
+            conn = self._connect()
+            try:
+                for i in range(0, len(uuidlist), TaskIndex.LOOKUP_BATCH_SIZE):
+                    batch = uuidlist[i:i + TaskIndex.LOOKUP_BATCH_SIZE]
+                    rows = conn.execute('SELECT uuid, state, ipaddr, path '
+                                        'FROM tasks WHERE uuid IN (' +
+                                        ','.join(['?'] * len(batch)) +
+                                        ')', batch)
+                    for row in rows:
+                        found[row[0]] = (row[1], row[2], row[3])
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            app.logger.error('Unable to query task index for ' +
+                             str(len(uuidlist)) + ' tasks : ' + str(e))
+        return found
+
+    def rebuild(self):
+        """
+        Replaces contents of index with the tasks found by scanning
+        the directories of each state in TASK_STATES
+        :return: number of tasks indexed or None if there was an error
+        """
+        if self._dbfile is None or not os.path.isdir(self._jobpath):
+            return None
+        entries = []
+        for state in TASK_STATES:
+            statedir = os.path.join(self._jobpath, state)
+            if not os.path.isdir(statedir):
+                continue
+            for ipaddr in os.listdir(statedir):
+                ip_path = os.path.join(statedir, ipaddr)
+                if not os.path.isdir(ip_path):
+                    continue
+                for uuidstr in os.listdir(ip_path):
+                    taskpath = os.path.join(ip_path, uuidstr)
+                    if os.path.isdir(taskpath):
+                        entries.append((uuidstr, state, ipaddr, taskpath))
+        try:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute('DELETE FROM tasks')
+                    conn.executemany('INSERT OR REPLACE INTO tasks '
+                                     '(uuid, state, ipaddr, path) '
+                                     'VALUES (?, ?, ?, ?)', entries)
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            app.logger.error('Unable to rebuild task index : ' + str(e))
+            return None
+        return len(entries)
+
+
+def get_task_index():
+    """
+    Gets index of tasks under JOB_PATH
+    :return: :py:class:`TaskIndex`
+    """
+    return TaskIndex(app.config[JOB_PATH_KEY])
+
+
+def make_shared_dirs(path):
+    """
+    Creates path and any missing parent directories with mode 0775
+    regardless of umask so the REST service and task runner, which
+    run as different users in the same group, can both modify them
+    :param path: directory to create
+    :return: None
+    """
+    missing = []
+    while path and not os.path.isdir(path):
+        missing.append(path)
+        path = os.path.dirname(path)
+    # os.makedirs ignores mode for parent directories so
+    # each missing directory is created here
+    try:
+        original_umask = os.umask(0)
+        for entry in reversed(missing):
+            try:
+                os.mkdir(entry, mode=0o775)
+            except FileExistsError:
+                pass
+    finally:
+        os.umask(original_umask)
+
+
+class BlobStore(object):
+    """
+    Content addressed store of interaction files under JOB_PATH/BLOBS.
+    Each blob is named after the SHA-256 of its contents and the
+    interaction file of each task is a hard link to it, so identical
+    uploads share one copy on disk. The link count of a blob is its
+    reference count, a blob whose link count is 1 is not used by any
+    task and is removed by :py:meth:`release` or
+    :py:meth:`remove_unreferenced`. If hard links are not supported
+    tasks simply keep their own copy.
+    """
+    def __init__(self, jobpath):
+        """
+        Constructor
+        :param jobpath: base directory containing state directories
+        """
+        self._blobdir = None
+        if jobpath is not None:
+            self._blobdir = os.path.join(jobpath, BLOBS)
+
+    def get_blob_path(self, digest, compressed=False):
+        """
+        Gets path to blob
+        :param digest: SHA-256 hex digest of blob
+        :param compressed: If True, get path to gzip compressed
+                           copy of blob
+        :return: path or None if digest is not a SHA-256 hex digest
+        """
+        if self._blobdir is None or not isinstance(digest, str) or\
+                len(digest) != 64:
+            return None
+        try:
+            int(digest, 16)
+        except ValueError:
+            return None
+        blob = os.path.join(self._blobdir, digest[:2], digest)
+        if compressed is True:
+            return blob + COMPRESSED_SUFFIX
+        return blob
+
+    def add(self, srcfile, digest):
+        """
+        Makes srcfile a hard link to the blob for digest. If the blob
+        does not exist srcfile becomes the blob, otherwise srcfile
+        is atomically replaced by a link to the existing blob
+        :param srcfile: file whose contents have SHA-256 of digest
+        :param digest: SHA-256 hex digest of srcfile
+        :return: True if srcfile is linked to blob otherwise False
+        """
+        blob = self.get_blob_path(digest)
+        if blob is None:
+            return False
+        tmpfile = None
+        try:
+            make_shared_dirs(os.path.dirname(blob))
+            # retry once since blob can be released between calls
+            for attempt in range(2):
+                try:
+                    os.link(srcfile, blob)
+                    return True
+                except FileExistsError:
+                    pass
+                tmpfile = blob + '.' + get_uuid() + '.tmp'
+                try:
+                    os.link(blob, tmpfile)
+                except FileNotFoundError:
+                    tmpfile = None
+                    continue
+                os.replace(tmpfile, srcfile)
+                tmpfile = None
+                return True
+        except OSError as e:
+            app.logger.info('Unable to add ' + srcfile + ' to blob store: ' +
+                            str(e))
+        finally:
+            if tmpfile is not None and os.path.isfile(tmpfile):
+                os.unlink(tmpfile)
+        return False
+
+    def add_compressed(self, srcfile, digest, destfile):
+        """
+        Makes destfile a hard link to the gzip compressed copy of the
+        blob for digest, creating it from srcfile if it does not exist
+        :param srcfile: file whose contents have SHA-256 of digest
+        :param digest: SHA-256 hex digest of srcfile
+        :param destfile: path of compressed file to create
+        :return: True if destfile is linked to compressed blob
+                 otherwise False
+        """
+        gzblob = self.get_blob_path(digest, compressed=True)
+        if gzblob is None:
+            return False
+        tmpfile = None
+        try:
+            make_shared_dirs(os.path.dirname(gzblob))
+            # retry once since blob can be released between calls
+            for attempt in range(2):
+                tmpfile = gzblob + '.' + get_uuid() + '.tmp'
+                if not os.path.isfile(gzblob):
+                    compress_file(srcfile, tmpfile)
+                    try:
+                        os.link(tmpfile, gzblob)
+                    except FileExistsError:
+                        pass
+                    os.unlink(tmpfile)
+                try:
+                    os.link(gzblob, tmpfile)
+                except FileNotFoundError:
+                    continue
+                os.replace(tmpfile, destfile)
+                tmpfile = None
+                return True
+        except OSError as e:
+            app.logger.info('Unable to add compressed ' + srcfile +
+                            ' to blob store: ' + str(e))
+        finally:
+            if tmpfile is not None and os.path.isfile(tmpfile):
+                os.unlink(tmpfile)
+        return False
+
+    def release(self, digest):
+        """
+        Removes blob for digest, and its compressed copy, if no task
+        links to them. Call after removing interaction file of a task
+        :param digest: SHA-256 hex digest of blob
+        :return: True if a blob was removed otherwise False
+        """
+        removed = False
+        for compressed in [False, True]:
+            blob = self.get_blob_path(digest, compressed=compressed)
+            if blob is None:
+                return False
+            try:
+                if os.stat(blob).st_nlink > 1:
+                    continue
+                os.unlink(blob)
+                removed = True
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                app.logger.error('Unable to release blob ' + blob + ' : ' +
+                                 str(e))
+        return removed
+
+    def remove_unreferenced(self):
+        """
+        Removes blobs no task links to, such as those left behind
+        if a task directory was removed by hand
+        :return: tuple (number of blobs removed, bytes freed)
+        """
+        numremoved = 0
+        numbytes = 0
+        if self._blobdir is None or not os.path.isdir(self._blobdir):
+            return numremoved, numbytes
+        for entry in os.listdir(self._blobdir):
+            subdir = os.path.join(self._blobdir, entry)
+            if not os.path.isdir(subdir):
+                continue
+            for blobname in os.listdir(subdir):
+                blob = os.path.join(subdir, blobname)
+                try:
+                    st = os.stat(blob)
+                    if st.st_nlink > 1:
+                        continue
+                    os.unlink(blob)
+                except OSError:
+                    continue
+                numremoved += 1
+                numbytes += st.st_size
+        return numremoved, numbytes
+
+
+def get_blob_store():
+    """
+    Gets store of interaction files under JOB_PATH
+    :return: :py:class:`BlobStore`
+    """
+    return BlobStore(app.config[JOB_PATH_KEY])
+
+
+class InteractionFileError(Exception):
+    """
+    Raised when uploaded interaction file cannot be saved
+    """
+    pass
+
+
+class InteractionFileTooLargeError(InteractionFileError):
+    """
+    Raised when uploaded interaction file exceeds
+    MAX_INTERACTION_FILE_SIZE
+    """
+    pass
+
+
+class StreamDecompressor(object):
+    """
+    Incrementally decompresses gzip or zstd data read from a stream.
+    Multi member gzip files, such as those created by bgzip, and
+    multi frame zstd files are supported. No more then
+    UPLOAD_CHUNK_SIZE bytes are decompressed at a time so highly
+    compressed data cannot exhaust memory
+    """
+    def __init__(self, compression, stream):
+        """
+        Constructor
+        :param compression: either 'gzip' or 'zstd'
+        :param stream: file like object to read compressed data from
+        :raises InteractionFileError: if compression is not supported
+        """
+        self._compression = compression
+        self._stream = stream
+        self._data = b''
+        self._decomp_full = False
+        if compression == 'gzip':
+            self._decomp = self._new_gzip_decompressor()
+            self._errors = (zlib.error,)
+        elif compression == 'zstd':
+            if zstandard is None:
+                raise InteractionFileError('zstd compressed interaction '
+                                           'files are not supported by '
+                                           'this server')
+            self._tracker = _ZstdFrameTracker(stream)
+            dctx = zstandard.ZstdDecompressor()
+            self._decomp = dctx.stream_reader(self._tracker,
+                                              read_size=UPLOAD_CHUNK_SIZE,
+                                              read_across_frames=True)
+            self._errors = (zstandard.ZstdError,)
+        else:
+            raise InteractionFileError('Unsupported compression: ' +
+                                       str(compression))
+
+    def _new_gzip_decompressor(self):
+        """
+        Creates zlib decompressor for gzip data
+        :return:
+        """
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    def _read_gzip(self):
+        """
+        Decompresses next chunk of gzip data, starting a new
+        decompressor at the start of each gzip member
+        :return: decompressed bytes or empty bytes at end of stream
+        """
+        while True:
+            # zlib can hold output back once max_length is hit
+            # so input is only read once decompressor has no more
+            if not self._data and (self._decomp.eof or
+                                   not self._decomp_full):
+                self._data = self._stream.read(UPLOAD_CHUNK_SIZE)
+                if not self._data:
+                    return b''
+            if self._decomp.eof:
+                self._decomp = self._new_gzip_decompressor()
+            out = self._decomp.decompress(self._data, UPLOAD_CHUNK_SIZE)
+            self._decomp_full = len(out) == UPLOAD_CHUNK_SIZE
+            self._data = self._decomp.unconsumed_tail
+            if self._decomp.eof:
+                self._data = self._decomp.unused_data
+            if out:
+                return out
+
+    def read(self):
+        """
+        Reads and decompresses data from stream
+        :raises InteractionFileError: if data is corrupt
+        :return: decompressed bytes no larger then UPLOAD_CHUNK_SIZE
+                 or empty bytes once stream is exhausted
+        """
+        try:
+            if self._compression == 'zstd':
+                return self._decomp.read(UPLOAD_CHUNK_SIZE)
+            return self._read_gzip()
+        except self._errors as e:
+            raise InteractionFileError('Unable to decompress interaction '
+                                       'file: ' + str(e))
+
+    def finish(self):
+        """
+        Checks the compressed data did not end part way
+        through a gzip member or zstd frame. Should be called
+        once :py:meth:`read` returns empty bytes
+        :raises InteractionFileError: if data is truncated
+        :return: None
+        """
+        if self._compression == 'zstd':
+            complete = self._tracker.at_frame_boundary()
+        else:
+            complete = self._decomp.eof
+        if not complete:
+            raise InteractionFileError('Unable to decompress interaction '
+                                       'file: ' + self._compression +
+                                       ' data is truncated')
+
+
+class _ZstdFrameTracker(object):
+    """
+    Stream that walks the frame and block headers of zstd data as it
+    is read, without decompressing it, to tell if the data ends part
+    way through a frame. zstandard stream readers silently treat
+    truncated data as complete
+    """
+    FRAME_MAGIC = 0xFD2FB528
+    SKIPPABLE_MAGIC = 0x184D2A50
+    SKIPPABLE_MASK = 0xFFFFFFF0
+    DICTID_SIZES = [0, 1, 2, 4]
+    CONTENT_SIZE_SIZES = [0, 2, 4, 8]
+    RLE_BLOCK = 1
+    RESERVED_BLOCK = 3
+
+    def __init__(self, stream):
+        """
+        Constructor
+        :param stream: file like object with zstd data
+        """
+        self._stream = stream
+        self._header = b''
+        self._skip = 0
+        self._in_frame = False
+        self._checksum_size = 0
+
+    def read(self, size=-1):
+        """
+        Reads up to size bytes
+        :param size: max number of bytes to read, -1 for all
+        :raises InteractionFileError: if data is not zstd frames
+        :return: bytes
+        """
+        data = self._stream.read(size)
+        self._walk(data)
+        return data
+
+    def at_frame_boundary(self):
+        """
+        Tells if data read so far ends at the end of a frame
+        :return: True if data ends at end of a frame otherwise False
+        """
+        return not self._in_frame and self._skip == 0 and\
+            len(self._header) == 0
+
+    def _get_header_size(self):
+        """
+        Gets size of frame or block header being read, which for
+        frame headers grows as more of the header is read
+        :return: size in bytes
+        """
+        if self._in_frame:
+            return 3
+        if len(self._header) < 4:
+            return 4
+        magic = int.from_bytes(self._header[:4], 'little')
+        if magic & self.SKIPPABLE_MASK == self.SKIPPABLE_MAGIC:
+            return 8
+        if len(self._header) < 5:
+            return 5
+        descriptor = self._header[4]
+        single_segment = (descriptor >> 5) & 1
+        content_size_flag = descriptor >> 6
+        content_size = self.CONTENT_SIZE_SIZES[content_size_flag]
+        if content_size_flag == 0 and single_segment == 1:
+            content_size = 1
+        return 5 + (1 - single_segment) +\
+            self.DICTID_SIZES[descriptor & 3] + content_size
+
+    def _end_header(self):
+        """
+        Parses complete frame or block header setting number
+        of bytes to skip to reach the next header
+        :raises InteractionFileError: if header is invalid
+        :return: None
+        """
+        header = self._header
+        self._header = b''
+        if self._in_frame:
+            blockheader = int.from_bytes(header, 'little')
+            blocktype = (blockheader >> 1) & 3
+            if blocktype == self.RESERVED_BLOCK:
+                raise InteractionFileError('Unable to decompress '
+                                           'interaction file: invalid '
+                                           'zstd block')
+            if blocktype == self.RLE_BLOCK:
+                self._skip = 1
+            else:
+                self._skip = blockheader >> 3
+            if blockheader & 1:
+                self._skip += self._checksum_size
+                self._in_frame = False
+            return
+        magic = int.from_bytes(header[:4], 'little')
+        if magic & self.SKIPPABLE_MASK == self.SKIPPABLE_MAGIC:
+            self._skip = int.from_bytes(header[4:8], 'little')
+            return
+        if magic != self.FRAME_MAGIC:
+            raise InteractionFileError('Unable to decompress interaction '
+                                       'file: invalid zstd frame')
+        self._checksum_size = 4 if header[4] & 4 else 0
+        self._in_frame = True
+
+    def _walk(self, data):
+        """
+        Walks headers in data, which continues where
+        the data from the last call left off
+        :param data: bytes
+        :raises InteractionFileError: if a header is invalid
+        :return: None
+        """
+        pos = 0
+        while True:
+            if self._skip > 0:
+                if pos == len(data):
+                    return
+                numbytes = min(self._skip, len(data) - pos)
+                self._skip -= numbytes
+                pos += numbytes
+                continue
+            needed = self._get_header_size() - len(self._header)
+            if needed <= 0:
+                self._end_header()
+                continue
+            if pos == len(data):
+                return
+            piece = data[pos:pos + needed]
+            self._header += piece
+            pos += len(piece)
+
+
+class UploadFile(object):
+    """
+    File an upload is written to as the request body is received. It
+    is placed under JOB_PATH/UPLOADS, on the same filesystem as the
+    task directories, so an uncompressed interaction file can be hard
+    linked into its task directory instead of being written a second
+    time. Once more then maxsize bytes of uncompressed data are
+    received the rest is discarded. The file is removed when
+    closed, which werkzeug does at the end of the request
+    """
+    def __init__(self, uploaddir, maxsize=None):
+        """
+        Constructor
+        :param uploaddir: directory to write file to
+        :param maxsize: max number of bytes of uncompressed data to
+                        write, None for no limit
+        """
+        fd, self.name = tempfile.mkstemp(suffix='.tmp', dir=uploaddir)
+        self._file = os.fdopen(fd, 'wb+')
+        self.maxsize = maxsize
+        self._head = b''
+        self._numbytes = 0
+        self.too_large = False
+
+    def write(self, data):
+        """
+        Writes data unless file exceeds maxsize
+        :param data: bytes
+        :return: number of bytes consumed
+        """
+        if len(self._head) < len(ZSTD_MAGIC):
+            self._head += data[:len(ZSTD_MAGIC) - len(self._head)]
+        self._numbytes += len(data)
+        if self.too_large:
+            return len(data)
+        if self.maxsize is not None and self._numbytes > self.maxsize\
+                and _get_compression(self._head) is None:
+            self.too_large = True
+            self._file.truncate(0)
+            return len(data)
+        return self._file.write(data)
+
+    def close(self):
+        """
+        Closes and removes file
+        :return: None
+        """
+        self._file.close()
+        try:
+            os.unlink(self.name)
+        except FileNotFoundError:
+            pass
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+
+class UploadRequest(Request):
+    """
+    Request that writes uploaded files to :py:class:`UploadFile`
+    instead of werkzeug's temporary files
+    """
+    def _get_file_stream(self, total_content_length, content_type,
+                         filename=None, content_length=None):
+        """
+        Creates file upload is written to
+        :return: :py:class:`UploadFile`
+        """
+        uploaddir = get_upload_dir()
+        if not os.path.isdir(uploaddir):
+            make_shared_dirs(uploaddir)
+        return UploadFile(uploaddir,
+                          maxsize=app.config[MAX_INTERACTION_FILE_SIZE_KEY])
+
+
+app.request_class = UploadRequest
+
+
+class _PeekedStream(object):
+    """
+    Stream that returns bytes already read from
+    another stream before reading the rest of it
+    """
+    def __init__(self, head, stream):
+        """
+        Constructor
+        :param head: bytes already read from stream
+        :param stream: file like object
+        """
+        self._head = head
+        self._stream = stream
+
+    def read(self, size=-1):
+        """
+        Reads up to size bytes
+        :param size: max number of bytes to read, -1 for all
+        :return: bytes
+        """
+        if not self._head:
+            return self._stream.read(size)
+        if size < 0:
+            data = self._head + self._stream.read()
+        else:
+            data = self._head[:size]
+        self._head = self._head[len(data):]
+        return data
+
+
+class InteractionFileValidator(object):
+    """
+    Validates interaction file a chunk at a time as it is written,
+    checking each line has 3 tab delimited columns with a non empty
+    gene name in the first two and a finite number in the third.
+    Lines starting with # are skipped and anything after a # is
+    ignored, matching how runddot.py parses the file. Summary
+    statistics are gathered in the same pass
+    """
+    def __init__(self):
+        """
+        Constructor
+        """
+        self._partial = b''
+        self._linenum = 0
+        self._nodes = set()
+        self._edges = 0
+        self._minweight = None
+        self._maxweight = None
+
+    def add_chunk(self, chunk):
+        """
+        Validates complete lines in chunk, any trailing partial
+        line is kept until the next chunk or :py:meth:`finish`
+        :param chunk: bytes
+        :raises InteractionFileError: if a line is invalid
+        :return: None
+        """
+        lines = (self._partial + chunk).split(b'\n')
+        self._partial = lines.pop()
+        if len(self._partial) > MAX_INTERACTION_LINE_LEN:
+            raise InteractionFileError('Line ' + str(self._linenum + 1) +
+                                       ' exceeds ' +
+                                       str(MAX_INTERACTION_LINE_LEN) +
+                                       ' bytes')
+        for line in lines:
+            self._add_line(line)
+
+    def _add_line(self, line):
+        """
+        Validates line
+        :param line: line without newline as bytes
+        :raises InteractionFileError: if line is invalid
+        :return: None
+        """
+        self._linenum += 1
+        line = line.split(b'#', 1)[0].rstrip(b'\r')
+        if len(line) == 0:
+            return
+        cols = line.split(b'\t')
+        if len(cols) != 3:
+            raise InteractionFileError('Line ' + str(self._linenum) +
+                                       ' has ' + str(len(cols)) +
+                                       ' tab delimited columns, '
+                                       'expected 3')
+        if len(cols[0]) == 0 or len(cols[1]) == 0:
+            raise InteractionFileError('Line ' + str(self._linenum) +
+                                       ' has empty gene name')
+        try:
+            weight = float(cols[2])
+        except ValueError:
+            weight = None
+        if weight is None or math.isnan(weight) or math.isinf(weight):
+            raise InteractionFileError('Line ' + str(self._linenum) +
+                                       ' has non numeric weight: ' +
+                                       cols[2].decode('utf-8', 'replace'))
+        self._nodes.add(cols[0])
+        self._nodes.add(cols[1])
+        self._edges += 1
+        if self._minweight is None or weight < self._minweight:
+            self._minweight = weight
+        if self._maxweight is None or weight > self._maxweight:
+            self._maxweight = weight
+
+    def finish(self):
+        """
+        Validates any final line lacking a newline and
+        checks at least one edge was seen
+        :raises InteractionFileError: if file is invalid
+        :return: None
+        """
+        if len(self._partial) > 0:
+            self._add_line(self._partial)
+            self._partial = b''
+        if self._edges == 0:
+            raise InteractionFileError('Interaction file has no edges')
+
+    def get_stats(self):
+        """
+        Gets summary of interaction file
+        :return: dict with NODE_COUNT_KEY, EDGE_COUNT_KEY,
+                 MIN_WEIGHT_KEY, and MAX_WEIGHT_KEY
+        """
+        return {NODE_COUNT_KEY: len(self._nodes),
+                EDGE_COUNT_KEY: self._edges,
+                MIN_WEIGHT_KEY: self._minweight,
+                MAX_WEIGHT_KEY: self._maxweight}
+
+
+def _get_compression(chunk):
+    """
+    Looks at magic number at start of chunk to
+    determine compression
+    :param chunk: first bytes of file
+    :return: 'gzip', 'zstd', or None if not compressed
+    """
+    if chunk.startswith(GZIP_MAGIC):
+        return 'gzip'
+    if chunk.startswith(ZSTD_MAGIC):
+        return 'zstd'
+    # zstd files written by pzstd start with a skippable frame
+    if len(chunk) >= 4 and int.from_bytes(chunk[:4], 'little') &\
+            _ZstdFrameTracker.SKIPPABLE_MASK ==\
+            _ZstdFrameTracker.SKIPPABLE_MAGIC:
+        return 'zstd'
+    return None
+
+
+def save_interaction_file(stream, destfile, maxsize=None, validator=None):
+    """
+    Writes stream to destfile in UPLOAD_CHUNK_SIZE chunks, transparently
+    decompressing gzip or zstd data, and computes SHA-256 of the data
+    written as it goes so the file never needs to be read again. If
+    stream is an uncompressed :py:class:`UploadFile` it is already on
+    disk so it is only read and then hard linked to destfile.
+
+    :param stream: file like object to read from
+    :param destfile: path to write data to
+    :param maxsize: max number of bytes to write, None for no limit
+    :param validator: if set, :py:class:`InteractionFileValidator` passed
+                      the data as it is written
+    :raises InteractionFileTooLargeError: if more then maxsize bytes
+            would be written
+    :raises InteractionFileError: if data cannot be decompressed or
+            validator rejects it
+    :return: tuple (sha256 hex digest, number of bytes written)
+    """
+    if isinstance(stream, UploadFile) and stream.too_large:
+        raise InteractionFileTooLargeError('Interaction file exceeds ' +
+                                           str(stream.maxsize) +
+                                           ' bytes')
+    sha256 = hashlib.sha256()
+    numbytes = 0
+    head = stream.read(len(ZSTD_MAGIC))
+    reader = _PeekedStream(head, stream)
+    compression = _get_compression(head)
+    decompressor = None
+    if compression is not None:
+        app.logger.debug('Interaction file is ' +
+                         compression + ' compressed')
+        decompressor = StreamDecompressor(compression, reader)
+    linksrc = None
+    if decompressor is None and isinstance(stream, UploadFile):
+        linksrc = stream.name
+    f = None
+    try:
+        if linksrc is None:
+            f = open(destfile, 'wb')
+        while True:
+            if decompressor is None:
+                chunk = reader.read(UPLOAD_CHUNK_SIZE)
+            else:
+                chunk = decompressor.read()
+            if not chunk:
+                break
+            numbytes += len(chunk)
+            if maxsize is not None and numbytes > maxsize:
+                raise InteractionFileTooLargeError('Interaction file '
+                                                   'exceeds ' +
+                                                   str(maxsize) +
+                                                   ' bytes')
+            if validator is not None:
+                validator.add_chunk(chunk)
+            sha256.update(chunk)
+            if f is not None:
+                f.write(chunk)
+        if decompressor is not None:
+            decompressor.finish()
+        if validator is not None:
+            validator.finish()
+    finally:
+        if f is not None:
+            f.close()
+    if linksrc is not None:
+        _link_file(linksrc, destfile)
+    return sha256.hexdigest(), numbytes
+
+
+def compress_file(srcfile, destfile):
+    """
+    Writes gzip compressed copy of srcfile to destfile. The data is
+    written to a temporary file renamed to destfile once complete
+    so readers never see a partially written file
+    :param srcfile: file to compress
+    :param destfile: path of compressed file
+    :return: None
+    """
+    tmpfile = destfile + '.tmp'
+    try:
+        with open(srcfile, 'rb') as f:
+            with gzip.open(tmpfile, 'wb',
+                           compresslevel=COMPRESSION_LEVEL) as gzf:
+                shutil.copyfileobj(f, gzf, UPLOAD_CHUNK_SIZE)
+        os.replace(tmpfile, destfile)
+    finally:
+        if os.path.isfile(tmpfile):
+            os.unlink(tmpfile)
+
+
+def _create_task_dir(params):
+    """
+    Sets uuid, task type, and submit time in params and creates
+    task directory JOB_PATH/SUBMIT_DIR/<IP ADDRESS>/UUID
+    :param params: task parameters
+    :return: path to task directory
     """
     params['uuid'] = get_uuid()
     params['tasktype'] = 'ddot_ontology'
+    params[SUBMITTIME_PARAM] = time.time()
     taskpath = os.path.join(get_submit_dir(), str(params[REMOTEIP_PARAM]),
                             str(params['uuid']))
     try:
@@ -178,29 +1360,216 @@ def create_task(params):
         os.makedirs(taskpath, mode=0o775)
     finally:
         os.umask(original_umask)
+    return taskpath
 
+
+def _save_task_interaction_file(params, taskpath):
+    """
+    Saves interaction file in params to taskpath and replaces
+    INTERACTION_FILE_PARAM in params with name of file. The SHA-256,
+    size and stats of the file are also set in params
+    :param params: task parameters
+    :param taskpath: path to task directory
+    :raises InteractionFileError: if file is invalid or too large
+    :return: path to saved interaction file which is hard linked
+             to the file in :py:class:`BlobStore` if possible
+    """
     app.logger.debug('interaction file param: ' +
                      str(params[INTERACTION_FILE_PARAM]))
     interfile_path = os.path.join(taskpath, INTERACTION_FILE_PARAM)
-    with open(interfile_path, 'wb') as f:
-        shutil.copyfileobj(params[INTERACTION_FILE_PARAM].stream, f)
-        f.flush()
+    validator = InteractionFileValidator()
+    digest, filesize = save_interaction_file(params[INTERACTION_FILE_PARAM].stream,
+                                             interfile_path,
+                                             maxsize=app.config[MAX_INTERACTION_FILE_SIZE_KEY],
+                                             validator=validator)
     os.chmod(interfile_path, mode=0o775)
+    get_blob_store().add(interfile_path, digest)
 
     params[INTERACTION_FILE_PARAM] = INTERACTION_FILE_PARAM
+    params[INTERACTION_FILE_SHA256_PARAM] = digest
+    params[INTERACTION_FILE_SIZE_PARAM] = filesize
+    params[INTERACTION_FILE_STATS_PARAM] = validator.get_stats()
     app.logger.debug(interfile_path + ' saved and it is ' +
-                     str(os.path.getsize(interfile_path)) + ' bytes')
+                     str(filesize) + ' bytes')
+    return interfile_path
 
-    tmp_task_json = TASK_JSON + '.tmp'
-    taskfilename = os.path.join(taskpath, tmp_task_json)
-    with open(taskfilename, 'w') as f:
-        json.dump(params, f)
+
+def _write_json_file(data, destfile):
+    """
+    Writes data as json to destfile via a temporary file that is
+    renamed so readers never see a partially written file
+    :param data: data to write
+    :param destfile: path to file
+    :return: None
+    """
+    tmpfile = destfile + '.tmp'
+    with open(tmpfile, 'w') as f:
+        json.dump(data, f)
         f.flush()
-    os.chmod(taskfilename, mode=0o775)
-    shutil.move(taskfilename, os.path.join(taskpath, TASK_JSON))
+    os.chmod(tmpfile, mode=0o775)
+    shutil.move(tmpfile, destfile)
+
+
+def _submit_task(params, taskpath):
+    """
+    Writes TASK_JSON file in taskpath, which makes task visible to
+    task runner, and adds task to task index
+    :param params: task parameters
+    :param taskpath: path to task directory
+    :return: None
+    """
+    _write_json_file(params, os.path.join(taskpath, TASK_JSON))
+    get_task_index().update(params['uuid'], SUBMITTED_STATUS,
+                            str(params[REMOTEIP_PARAM]), taskpath)
+
+
+def create_task(params):
+    """
+    Creates a task by consuming data from request_obj passed in
+    and persisting that information to the filesystem under
+    JOB_PATH/SUBMIT_DIR/<IP ADDRESS>/UUID with various parameters
+    stored in TASK_JSON file and if the 'network' file is set
+    that data is dumped to NETWORK_DATA file within the directory
+    :param request_obj:
+    :return: string that is a uuid which denotes directory name
+    """
+    taskpath = _create_task_dir(params)
+    try:
+        _save_task_interaction_file(params, taskpath)
+    except InteractionFileError:
+        shutil.rmtree(taskpath, ignore_errors=True)
+        raise
+    _submit_task(params, taskpath)
     return params['uuid']
 
 
+def parse_alpha_beta_list(rawlist, maxsize=None):
+    """
+    Parses json list of the form [{"alpha": <alpha>, "beta": <beta>}]
+    :param rawlist: json string
+    :param maxsize: max number of entries allowed, None means no limit
+    :raises ValueError: if rawlist is not valid
+    :return: list of tuples (alpha, beta)
+    :rtype: list
+    """
+    try:
+        entries = json.loads(rawlist)
+    except (TypeError, ValueError) as e:
+        raise ValueError(ALPHA_BETA_LIST_PARAM + ' is not valid json: ' +
+                         str(e))
+    if not isinstance(entries, list) or len(entries) == 0:
+        raise ValueError(ALPHA_BETA_LIST_PARAM + ' must be a non empty '
+                                                 'list')
+    if maxsize is not None and len(entries) > maxsize:
+        raise ValueError(ALPHA_BETA_LIST_PARAM + ' has ' +
+                         str(len(entries)) + ' entries, max allowed is ' +
+                         str(maxsize))
+    pairs = []
+    for index, entry in enumerate(entries):
+        try:
+            alpha = float(entry[ALPHA_PARAM])
+            beta = float(entry[BETA_PARAM])
+        except (TypeError, ValueError, KeyError):
+            raise ValueError('Entry ' + str(index) + ' of ' +
+                             ALPHA_BETA_LIST_PARAM + ' must have numeric ' +
+                             ALPHA_PARAM + ' and ' + BETA_PARAM)
+        if not math.isfinite(alpha) or not math.isfinite(beta):
+            raise ValueError('Entry ' + str(index) + ' of ' +
+                             ALPHA_BETA_LIST_PARAM + ' must have finite ' +
+                             ALPHA_PARAM + ' and ' + BETA_PARAM)
+        pairs.append((alpha, beta))
+    return pairs
+
+
+def _link_file(srcfile, destfile):
+    """
+    Hard links srcfile to destfile falling back to a
+    copy if hard links are not supported
+    :param srcfile: existing file
+    :param destfile: path of new file
+    :return: None
+    """
+    try:
+        os.link(srcfile, destfile)
+    except OSError as e:
+        app.logger.info('Unable to hard link ' + srcfile + ' copying '
+                        'instead: ' + str(e))
+        shutil.copyfile(srcfile, destfile)
+        os.chmod(destfile, mode=0o775)
+
+
+def create_batch(params, alphabetalist):
+    """
+    Creates a task for each alpha, beta pair in alphabetalist that
+    share one interaction file. The file is saved in the first task
+    directory, and :py:class:`BlobStore`, and hard linked into the
+    rest. The list of tasks is
+    written to BATCHES/<batch id>.json under JOB_PATH
+    :param params: task parameters, the alpha and beta are ignored
+    :param alphabetalist: list of tuples (alpha, beta)
+    :return: tuple (batch id, list of task uuids)
+    """
+    batchid = get_uuid()
+    tasks = []
+    interfile_path = None
+    try:
+        for alpha, beta in alphabetalist:
+            taskparams = dict(params)
+            taskparams[ALPHA_PARAM] = alpha
+            taskparams[BETA_PARAM] = beta
+            taskparams[BATCH_ID_PARAM] = batchid
+            taskpath = _create_task_dir(taskparams)
+            tasks.append((taskparams, taskpath))
+            if interfile_path is None:
+                interfile_path = _save_task_interaction_file(taskparams,
+                                                             taskpath)
+                # later tasks get name, SHA-256, and stats of saved file
+                params = dict(taskparams)
+            else:
+                _link_file(interfile_path,
+                           os.path.join(taskpath, INTERACTION_FILE_PARAM))
+
+        batchdir = get_batch_dir()
+        if not os.path.isdir(batchdir):
+            make_shared_dirs(batchdir)
+        _write_json_file({TASKID_KEY: batchid,
+                          REMOTEIP_PARAM: str(params[REMOTEIP_PARAM]),
+                          SUBMITTIME_PARAM: time.time(),
+                          BATCH_TASKS_KEY: [t[0]['uuid'] for t in tasks]},
+                         os.path.join(batchdir, batchid + '.json'))
+    except Exception:
+        for taskparams, taskpath in tasks:
+            shutil.rmtree(taskpath, ignore_errors=True)
+        # blob is only removed if no other task links to it
+        digest = params.get(INTERACTION_FILE_SHA256_PARAM)
+        if digest is not None:
+            get_blob_store().release(digest)
+        raise
+
+    for taskparams, taskpath in tasks:
+        _submit_task(taskparams, taskpath)
+    return batchid, [t[0]['uuid'] for t in tasks]
+
+
+def get_batch(batchid):
+    """
+    Gets batch created by :py:func:`create_batch`
+    :param batchid: id of batch
+    :return: dict from batch json file or None if not found
+    """
+    if batchid is None:
+        return None
+    batchfile = os.path.join(get_batch_dir(), batchid + '.json')
+    if not os.path.isfile(batchfile):
+        return None
+    try:
+        with open(batchfile, 'r') as f:
+            return json.load(f)
+    except Exception:
+        app.logger.exception('Caught exception reading ' + batchfile)
+        return None
+
+
 def log_task_json_file(taskpath):
     """
     Writes information about task to logger
@@ -221,7 +1590,7 @@ def log_task_json_file(taskpath):
         app.logger.info('Json file of task: ' + str(data))
 
 
-def get_task(uuidstr, iphintlist=None, basedir=None):
+def get_task(uuidstr, iphintlist=None, basedir=None, useindex=True):
     """
     Gets task under under basedir.
     :param uuidstr: uuid string for task
@@ -231,6 +1600,8 @@ def get_task(uuidstr, iphintlist=None, basedir=None):
                        is first checked and if the path is a directory
                        it is returned
     :param basedir:  base directory as string ie /foo
+    :param useindex: if False, task index is not looked at, but is
+                     still updated if task is found
     :return: full path to task or None if not found
     """
     if uuidstr is None:
@@ -245,7 +1616,32 @@ def get_task(uuidstr, iphintlist=None, basedir=None):
         app.logger.error(basedir + ' is not a directory')
         return None
 
-    # Todo: Add logic to leverage iphintlist
+    # the index only covers state directories directly under JOB_PATH.
+    # A task lives in exactly one directory so if the index points
+    # to an existing directory the answer is known without a scan
+    basedir = os.path.normpath(basedir)
+    taskindex = None
+    if os.path.dirname(basedir) == os.path.normpath(app.config[JOB_PATH_KEY]):
+        taskindex = get_task_index()
+        indexed = None
+        if useindex is True:
+            indexed = taskindex.lookup(uuidstr)
+        if indexed is not None and os.path.isdir(indexed[2]):
+            if os.path.dirname(os.path.dirname(indexed[2])) == basedir:
+                return indexed[2]
+            return None
+
+    if iphintlist is not None:
+        for iphint in iphintlist:
+            if iphint is None:
+                continue
+            taskpath = os.path.join(basedir, str(iphint), uuidstr)
+            if os.path.isdir(taskpath):
+                if taskindex is not None:
+                    taskindex.update(uuidstr, os.path.basename(basedir),
+                                     str(iphint), taskpath)
+                return taskpath
+
     # Todo: Add a retry if not found with small delay in case of dir is moving
     for entry in os.listdir(basedir):
         ip_path = os.path.join(basedir, entry)
@@ -257,37 +1653,282 @@ def get_task(uuidstr, iphintlist=None, basedir=None):
             taskpath = os.path.join(ip_path, subentry)
 
             if os.path.isdir(taskpath):
+                if taskindex is not None:
+                    taskindex.update(uuidstr, os.path.basename(basedir),
+                                     entry, taskpath)
                 return taskpath
     return None
 
 
-def wait_for_task(uuidstr, hintlist=None):
+def get_task_state(uuidstr, iphintlist=None):
     """
-    Waits for task to appear in done directory
+    Looks up task in task index and if not found, or the index is
+    out of date, looks under the directory of each state in
+    TASK_STATES in that order
+    :param uuidstr: uuid of task
+    :param iphintlist: list of ip addresses to search under first
+    :return: tuple (state, full path to task) or (None, None) if not found
+    """
+    if uuidstr is None:
+        return None, None
+    indexed = get_task_index().lookup(uuidstr)
+    if indexed is not None and os.path.isdir(indexed[2]):
+        state = os.path.basename(os.path.dirname(os.path.dirname(indexed[2])))
+        if state in TASK_STATES:
+            return state, indexed[2]
+
+    for state in TASK_STATES:
+        basedir = os.path.join(app.config[JOB_PATH_KEY], state)
+        taskpath = get_task(uuidstr, iphintlist=iphintlist, basedir=basedir,
+                            useindex=False)
+        if taskpath is not None:
+            return state, taskpath
+    return None, None
+
+
+def get_task_states(uuidlist, iphintlist=None):
+    """
+    Like :py:func:`get_task_state` for several tasks, except tasks
+    in the task index are looked up with one query
+    :param uuidlist: list of task uuids
+    :param iphintlist: list of ip addresses to search under first
+    :return: dict of uuid to tuple (state, full path to task) or
+             (None, None) if not found
+    """
+    indexed = get_task_index().lookup_many(uuidlist)
+    states = {}
+    for uuidstr in uuidlist:
+        entry = indexed.get(uuidstr)
+        if entry is not None and os.path.isdir(entry[2]):
+            state = os.path.basename(os.path.dirname(os.path.dirname(entry[2])))
+            if state in TASK_STATES:
+                states[uuidstr] = (state, entry[2])
+                continue
+        states[uuidstr] = get_task_state(uuidstr, iphintlist=iphintlist)
+    return states
+
+
+def wait_for_task(uuidstr, hintlist=None, timeout=None):
+    """
+    Waits for task to appear in done directory. Instead of
+    sleeping a fixed amount this function wakes up whenever
+    the task index under JOB_PATH is modified, which happens
+    every time the task runner moves a task. Since filesystem
+    notifications are not seen for changes made on other hosts
+    the done directory is also rechecked every SLEEP_TIME seconds.
+
     :param uuidstr: uuid of task
     :param hintlist: list of ip addresses to search under
+    :param timeout: max time in seconds to wait, if None
+                    WAIT_COUNT * SLEEP_TIME is used
     :return: string containing full path to task or None if not found
     """
     if uuidstr is None:
         app.logger.error('uuid is None')
         return None
 
-    counter = 0
-    taskpath = None
+    if timeout is None:
+        timeout = app.config[WAIT_COUNT_KEY] * app.config[SLEEP_TIME_KEY]
+
+    deadline = time.time() + timeout
     done_dir = get_done_dir()
-    while counter < app.config[WAIT_COUNT_KEY]:
-        taskpath = get_task(uuidstr, iphintlist=hintlist,
-                            basedir=done_dir)
-        if taskpath is not None:
-            break
-        app.logger.debug('Sleeping while waiting for ' + uuidstr)
-        time.sleep(app.config[SLEEP_TIME_KEY])
-        counter = counter + 1
+    watcher = FileSystemWatcher([get_task_index().get_dbfile()])
+    try:
+        while True:
+            taskpath = get_task(uuidstr, iphintlist=hintlist,
+                                basedir=done_dir)
+            if taskpath is not None:
+                return taskpath
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            app.logger.debug('Waiting for ' + uuidstr)
+            if not watcher.is_watching():
+                # index may have been created since we started waiting
+                watcher.add_watch(get_task_index().get_dbfile())
+            poll_time = app.config[SLEEP_TIME_KEY]
+            if poll_time <= 0:
+                poll_time = remaining
+            watcher.wait(min(remaining, poll_time))
+    finally:
+        watcher.close()
 
-    if taskpath is None:
-        app.logger.info('Wait time exceeded while looking for: ' + uuidstr)
+    app.logger.info('Wait time exceeded while looking for: ' + uuidstr)
+    return None
+
+
+def get_task_parameters(taskpath):
+    """
+    Gets task parameters from TASK_JSON file as
+    a dictionary
+    :param taskpath:
+    :return: task parameters
+    :rtype dict:
+    """
+    taskparams = None
+    try:
+        taskjsonfile = os.path.join(taskpath, TASK_JSON)
+
+        if os.path.isfile(taskjsonfile):
+            with open(taskjsonfile, 'r') as f:
+                taskparams = json.load(f)
+            if 'remoteip' in taskparams:
+                # delete the remote ip
+                del taskparams['remoteip']
+    except Exception:
+        app.logger.exception('Caught exception getting parameters')
+    return taskparams
+
+
+def _get_task_event_state(state, taskpath):
+    """
+    Gets state of task for event stream where tasks in done
+    directory whose TASK_JSON has an error are reported as
+    ERROR_STATUS and tasks that are not found as NOTFOUND_STATUS
+    :param state: state of task from :py:func:`get_task_state`
+    :param taskpath: path to task from :py:func:`get_task_state`
+    :return: state of task
+    :rtype str:
+    """
+    if state is None:
+        return NOTFOUND_STATUS
+    if state != DONE_STATUS:
+        return state
+    taskjsonfile = os.path.join(taskpath, TASK_JSON)
+    try:
+        if os.path.isfile(taskjsonfile):
+            with open(taskjsonfile, 'r') as f:
+                if ERROR_PARAM in json.load(f):
+                    return ERROR_STATUS
+    except Exception:
+        app.logger.exception('Caught exception reading ' + taskjsonfile)
+    return state
+
+
+def _format_event(state, uuidstr):
+    """
+    Formats state change as server sent event
+    :param state: state of task
+    :param uuidstr: uuid of task
+    :return: event
+    :rtype str:
+    """
+    return ('event: ' + state + '\ndata: ' +
+            json.dumps({STATUS_RESULT_KEY: state, TASKID_KEY: uuidstr}) +
+            '\n\n')
+
+
+# number of long running requests of this process keyed
+# by config key holding the max allowed
+_open_requests = {MAX_STREAMS_KEY: 0, MAX_WAITS_KEY: 0}
+_open_requests_lock = threading.Lock()
+
+
+def _acquire_request_slot(limitkey):
+    """
+    Reserves slot for a long running request
+    :param limitkey: config key with max number of these requests
+    :return: True if reserved otherwise False
+    """
+    with _open_requests_lock:
+        if _open_requests[limitkey] >= app.config[limitkey]:
+            return False
+        _open_requests[limitkey] += 1
+        return True
+
+
+def _release_request_slot(limitkey):
+    """
+    Releases slot reserved by :py:func:`_acquire_request_slot`
+    :param limitkey: config key with max number of these requests
+    :return: None
+    """
+    with _open_requests_lock:
+        _open_requests[limitkey] = max(_open_requests[limitkey] - 1, 0)
+
+
+def acquire_event_stream():
+    """
+    Reserves one of the MAX_STREAMS event streams of this process
+    :return: True if reserved, caller must then call
+             :py:func:`release_event_stream`, or False if MAX_STREAMS
+             streams are already open
+    """
+    return _acquire_request_slot(MAX_STREAMS_KEY)
 
-    return taskpath
+
+def release_event_stream():
+    """
+    Releases event stream reserved by :py:func:`acquire_event_stream`
+    :return: None
+    """
+    _release_request_slot(MAX_STREAMS_KEY)
+
+
+def acquire_wait():
+    """
+    Reserves one of the MAX_WAITS waits of this process
+    :return: True if reserved, caller must then call
+             :py:func:`release_wait`, or False if MAX_WAITS
+             requests are already waiting
+    """
+    return _acquire_request_slot(MAX_WAITS_KEY)
+
+
+def release_wait():
+    """
+    Releases wait reserved by :py:func:`acquire_wait`
+    :return: None
+    """
+    _release_request_slot(MAX_WAITS_KEY)
+
+
+def generate_task_events(uuidlist, iphintlist=None, timeout=None):
+    """
+    Generator that yields server sent events for each state
+    transition of the tasks in uuidlist until every task reaches
+    done, error or is not found, or timeout seconds elapse. Like
+    :py:func:`wait_for_task` this wakes up when the task index is
+    modified and otherwise rechecks every SLEEP_TIME seconds
+    emitting a keepalive comment.
+
+    :param uuidlist: list of task uuids
+    :param iphintlist: list of ip addresses to search under first
+    :param timeout: max time in seconds to stream events, if None
+                    MAX_STREAM_TIME is used
+    :return: str containing server sent event
+    """
+    if timeout is None:
+        timeout = app.config[MAX_STREAM_TIME_KEY]
+    deadline = time.time() + timeout
+    watcher = FileSystemWatcher([get_task_index().get_dbfile()])
+    try:
+        yield 'retry: ' + str(EVENT_STREAM_RETRY_MS) + '\n\n'
+        last_states = dict.fromkeys(uuidlist)
+        while True:
+            states = get_task_states(list(last_states.keys()),
+                                     iphintlist=iphintlist)
+            for uuidstr, (state, taskpath) in states.items():
+                state = _get_task_event_state(state, taskpath)
+                if state != last_states[uuidstr]:
+                    yield _format_event(state, uuidstr)
+                    last_states[uuidstr] = state
+                if state in (DONE_STATUS, ERROR_STATUS, NOTFOUND_STATUS):
+                    del last_states[uuidstr]
+            if len(last_states) == 0:
+                return
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return
+            if not watcher.is_watching():
+                watcher.add_watch(get_task_index().get_dbfile())
+            poll_time = app.config[SLEEP_TIME_KEY]
+            if poll_time <= 0:
+                poll_time = remaining
+            if not watcher.wait(min(remaining, poll_time)):
+                yield ': keepalive\n\n'
+    finally:
+        watcher.close()
 
 
 ERROR_RESP = api.model('ErrorResponseSchema', {
@@ -345,7 +1986,8 @@ class RunOntology(Resource):
                                   'elements.  File should be 3 tab separated '
                                   'columns with 1 undirected edge per line '
                                   'of the format node1, node2, edgeWeight '
-                                  '(similarity between node1 and node2)\n\n'
+                                  '(similarity between node1 and node2). '
+                                  'File can be gzip or zstd compressed\n\n'
                                   'Example file:\n\n ```Bash\nARL2BP  DDAH1 '
                                   '  0.5101\nARL2BP  REPS1   0.6277\n```\n',
                              location='files')
@@ -389,6 +2031,7 @@ class RunOntology(Resource):
                        ' specified in **Location** field in HEADERS to '
                        'status and results', headers=POST_HEADERS)
     @api.response(400, 'Bad request, an invalid input was passed in')
+    @api.response(413, 'Interaction file is too large', ERROR_RESP)
     @api.response(429, 'Too many requests', TOO_MANY_REQUESTS, headers=RATE_LIMIT_HEADERS)
     @api.response(500, 'Internal server error', ERROR_RESP, headers=RATE_LIMIT_HEADERS)
     @api.expect(post_parser)
@@ -411,46 +2054,202 @@ class RunOntology(Resource):
             resp.headers[LOCATION] = ONTOLOGY_NS + '/' + res
             resp.status_code = 202
             return resp
-        except OSError as ea:
-            app.logger.exception('Error creating task due to Exception ' +
-                                 str(ea))
+        except (InteractionFileError, OSError) as e:
+            return _get_create_task_error(e)
+
+
+def _get_create_task_error(e):
+    """
+    Creates error response for exception raised while
+    creating task
+    :param e: exception
+    :type e: :py:class:`InteractionFileError` or :py:class:`OSError`
+    :return: tuple (marshalled ErrorResponse, http status code)
+    """
+    er = ErrorResponse()
+    er.description = str(e)
+    if isinstance(e, InteractionFileTooLargeError):
+        app.logger.info('Rejecting interaction file: ' + str(e))
+        er.message = 'Interaction file is too large'
+        return marshal(er, ERROR_RESP), 413
+    if isinstance(e, InteractionFileError):
+        app.logger.info('Rejecting interaction file: ' + str(e))
+        er.message = 'Invalid interaction file'
+        return marshal(er, ERROR_RESP), 400
+    app.logger.exception('Error creating task due to Exception ' +
+                         str(e))
+    er.message = 'Error creating task due to Exception'
+    return marshal(er, ERROR_RESP), 500
+
+
+@ns.route('/batch', strict_slashes=False)
+class RunOntologyBatch(Resource):
+    """
+    Runs ontology for each alpha, beta pair on one interaction file
+    """
+    POST_HEADERS = copy.deepcopy(RATE_LIMIT_HEADERS)
+    POST_HEADERS['Location'] = 'URL containing status of tasks in batch'
+
+    post_parser = RunOntology.post_parser.copy()
+    post_parser.remove_argument(ALPHA_PARAM)
+    post_parser.remove_argument(BETA_PARAM)
+    post_parser.add_argument(ALPHA_BETA_LIST_PARAM, required=True,
+                             help='JSON list of alpha and beta values, one '
+                                  'task is run for each entry. '
+                                  'Example:\n\n ```\n[{"alpha": 0.05, '
+                                  '"beta": 0.5}, {"alpha": 0.1, '
+                                  '"beta": 0.5}]\n```\n',
+                             location='form')
+
+    @api.doc('Runs Ontology for several alpha and beta values')
+    @api.response(202, 'The tasks were successfully submitted to the '
+                       'service. Body has batch **id** and **locations** '
+                       'of tasks. Visit the URL specified in **Location** '
+                       'field in HEADERS for status of all tasks',
+                  headers=POST_HEADERS)
+    @api.response(400, 'Bad request, an invalid input was passed in')
+    @api.response(413, 'Interaction file is too large', ERROR_RESP)
+    @api.response(429, 'Too many requests', TOO_MANY_REQUESTS, headers=RATE_LIMIT_HEADERS)
+    @api.response(500, 'Internal server error', ERROR_RESP, headers=RATE_LIMIT_HEADERS)
+    @api.expect(post_parser)
+    def post(self):
+        """
+        Submits batch of requests
+
+        The interaction file is uploaded and stored once and a task is
+        created for each entry in **alphabetalist**. Upon post returns 202
+        with a json body of the form
+        {"id": <batch id>, "locations": [<URL of task>, ...]}
+        where each location matches the URL of GET request below.
+        """
+        app.logger.debug("Batch post received")
+
+        try:
+            params = RunOntologyBatch.post_parser.parse_args(request,
+                                                             strict=True)
+            params['remoteip'] = request.remote_addr
+            alphabetalist = parse_alpha_beta_list(params.pop(ALPHA_BETA_LIST_PARAM),
+                                                  maxsize=app.config[MAX_BATCH_SIZE_KEY])
+        except ValueError as ev:
             er = ErrorResponse()
-            er.message = 'Error creating task due to Exception'
-            er.description = str(ea)
-            return marshal(er, ERROR_RESP), 500
+            er.message = 'Invalid ' + ALPHA_BETA_LIST_PARAM
+            er.description = str(ev)
+            return marshal(er, ERROR_RESP), 400
+        try:
+            batchid, taskids = create_batch(params, alphabetalist)
+        except (InteractionFileError, OSError) as e:
+            return _get_create_task_error(e)
+
+        resp = jsonify({TASKID_KEY: batchid,
+                        LOCATIONS_KEY: [ONTOLOGY_NS + '/' + t
+                                        for t in taskids]})
+        resp.headers[LOCATION] = ONTOLOGY_NS + '/batch/' + batchid
+        resp.status_code = 202
+        return resp
+
+
+@ns.route('/batch/<string:id>', strict_slashes=False)
+class GetBatchStatus(Resource):
+    """
+    Gets status of tasks in batch
+    """
+
+    @api.response(200, 'Successful response from server')
+    @api.response(410, 'Batch not found')
+    @api.response(429, 'Too many requests', TOO_MANY_REQUESTS)
+    def get(self, id):
+        """
+        Gets status of each task in batch
+
+        Returns json of the form {"id": <batch id>, "tasks": [{"id":
+        <task id>, "status": <status>, "location": <URL of task>}, ...]}
+        where status is submitted, processing, clustered, uploading, done,
+        error, or notfound if task was deleted.
+        """
+        cleanid = id.strip()
+        batch = get_batch(cleanid)
+        if batch is None:
+            resp = jsonify({STATUS_RESULT_KEY: NOTFOUND_STATUS,
+                            TASKID_KEY: cleanid})
+            resp.status_code = 410
+            return resp
+        hintlist = [batch.get(REMOTEIP_PARAM, request.remote_addr)]
+        taskids = batch.get(BATCH_TASKS_KEY, [])
+        states = get_task_states(taskids, iphintlist=hintlist)
+        tasks = []
+        for taskid in taskids:
+            tasks.append({TASKID_KEY: taskid,
+                          STATUS_RESULT_KEY: _get_task_event_state(*states[taskid]),
+                          LOCATION_KEY: ONTOLOGY_NS + '/' + taskid})
+        resp = jsonify({TASKID_KEY: cleanid,
+                        BATCH_TASKS_KEY: tasks})
+        resp.status_code = 200
+        return resp
 
 
 @ns.route('/<string:id>', strict_slashes=False)
 class GetQueryResult(Resource):
     """More class doc here"""
+
+    get_parser = reqparse.RequestParser()
+    get_parser.add_argument(WAIT_PARAM, type=float,
+                            help='If set, wait up to this many seconds for '
+                                 'task to complete before returning. Value '
+                                 'is capped by the server (default 30 '
+                                 'seconds)',
+                            location='args')
+
     @api.response(200, 'Successful response from server')
     @api.response(410, 'Task not found')
     @api.response(429, 'Too many requests', TOO_MANY_REQUESTS)
     @api.response(500, 'Internal server error', ERROR_RESP)
+    @api.expect(get_parser)
     def get(self, id):
         """
         Gets results
+
+        While a task runs its **status** is one of submitted,
+        processing, clustered (clustering is done and raw output can
+        be fetched from **rawclusteringoutput**) or uploading (result
+        is being saved to NDEx).
+
+        If **wait** is set and the task has not completed, the
+        request blocks until the task completes or **wait** seconds
+        elapse, whichever comes first. If the server already has its
+        limit of waiting requests the current status is returned
+        without waiting.
+
+        Once a task has run, **parameters** includes **resourceusage**
+        with wall time and CPU time in seconds and peak resident set
+        size in bytes (**walltime**, **cputime**, **maxrss**).
+        **maxrss** is left out if task ran on a long running worker.
         """
         cleanid = id.strip()
+        hintlist = [request.remote_addr]
 
-        taskpath = get_task(cleanid, basedir=get_submit_dir())
-
-        if taskpath is not None:
-            resp = jsonify({STATUS_RESULT_KEY: SUBMITTED_STATUS,
-                            PARAMETERS_KEY: self._get_task_parameters(taskpath)})
-            resp.status_code = 200
-            return resp
-
-        taskpath = get_task(cleanid, basedir=get_processing_dir())
+        state, taskpath = get_task_state(cleanid, iphintlist=hintlist)
 
-        if taskpath is not None:
-            resp = jsonify({STATUS_RESULT_KEY: PROCESSING_STATUS,
-                            PARAMETERS_KEY: self._get_task_parameters(taskpath)})
+        wait = self._get_wait_time()
+        if wait > 0 and state in PENDING_STATES:
+            if acquire_wait():
+                try:
+                    waitpath = wait_for_task(cleanid, hintlist=hintlist,
+                                             timeout=wait)
+                finally:
+                    release_wait()
+                if waitpath is not None:
+                    state, taskpath = get_task_state(cleanid,
+                                                     iphintlist=hintlist)
+            else:
+                app.logger.info('MAX_WAITS requests already waiting, '
+                                'not waiting for ' + cleanid)
+
+        if state in PENDING_STATES:
+            resp = jsonify({STATUS_RESULT_KEY: state,
+                            PARAMETERS_KEY: get_task_parameters(taskpath)})
             resp.status_code = 200
             return resp
 
-        taskpath = get_task(cleanid, basedir=get_done_dir())
-
         if taskpath is None:
             resp = jsonify({STATUS_RESULT_KEY: NOTFOUND_STATUS,
                             PARAMETERS_KEY: None})
@@ -461,41 +2260,91 @@ class GetQueryResult(Resource):
         if not os.path.isfile(result):
             er = ErrorResponse()
             er.message = 'No result found'
-            er.description = self._get_task_parameters(taskpath)
+            er.description = get_task_parameters(taskpath)
             return marshal(er, ERROR_RESP), 500
 
-        log_task_json_file(taskpath)
-        app.logger.info('Result file is ' + str(os.path.getsize(result)) +
-                        ' bytes')
-
-        with open(result, 'r') as f:
-            data = json.load(f)
+        return self._get_result_response(taskpath, result)
 
-        return jsonify({STATUS_RESULT_KEY: DONE_STATUS,
-                        RESULT_KEY: data,
-                        PARAMETERS_KEY: self._get_task_parameters(taskpath)})
+    def _get_result_response(self, taskpath, result):
+        """
+        Creates response for completed task. Rather then parsing
+        the result file, its contents are streamed as is into the
+        json envelope holding the status and parameters. An ETag and
+        Last-Modified header derived from the result and TASK_JSON
+        files are set so clients can get a 304 on repeat requests
+        :param taskpath: path to task
+        :param result: path to result file
+        :return: response
+        :rtype: :py:class:`flask.Response`
+        """
+        statlist = [os.stat(result)]
+        taskjsonfile = os.path.join(taskpath, TASK_JSON)
+        if os.path.isfile(taskjsonfile):
+            statlist.append(os.stat(taskjsonfile))
+        etag = hashlib.sha1(' '.join([str(st.st_mtime_ns) + ':' +
+                                      str(st.st_size)
+                                      for st in statlist])
+                            .encode('utf-8')).hexdigest()
+        last_modified = datetime.utcfromtimestamp(int(max([st.st_mtime for
+                                                           st in statlist])))
+
+        if not is_resource_modified(request.environ, etag=etag,
+                                    last_modified=last_modified):
+            resp = flask.Response(status=304)
+            resp.set_etag(etag)
+            resp.last_modified = last_modified
+            return resp
 
-    def _get_task_parameters(self, taskpath):
+        log_task_json_file(taskpath)
+        resultsize = statlist[0].st_size
+        app.logger.info('Result file is ' + str(resultsize) + ' bytes')
+
+        envelope = json.dumps({STATUS_RESULT_KEY: DONE_STATUS,
+                               PARAMETERS_KEY: get_task_parameters(taskpath)})
+        head = (envelope[:-1] + ', ' + json.dumps(RESULT_KEY) +
+                ': ').encode('utf-8')
+        if resultsize == 0:
+            head += b'null'
+        tail = b'}'
+
+        resultfile = open(result, 'rb')
+
+        def generate():
+            try:
+                yield head
+                while True:
+                    chunk = resultfile.read(RESULT_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    yield chunk
+                yield tail
+            finally:
+                resultfile.close()
+
+        resp = flask.Response(generate(), mimetype='application/json')
+        resp.call_on_close(resultfile.close)
+        resp.headers['Content-Length'] = str(len(head) + resultsize +
+                                             len(tail))
+        resp.set_etag(etag)
+        resp.last_modified = last_modified
+        return resp
+
+    def _get_wait_time(self):
         """
-        Gets task parameters from TASK_JSON file as
-        a dictionary
-        :param taskpath:
-        :return: task parameters
-        :rtype dict:
+        Gets value of wait query parameter limited
+        to range 0 to MAX_WAIT
+        :return: time in seconds to wait
+        :rtype float:
         """
-        taskparams = None
         try:
-            taskjsonfile = os.path.join(taskpath, TASK_JSON)
-
-            if os.path.isfile(taskjsonfile):
-                with open(taskjsonfile, 'r') as f:
-                    taskparams = json.load(f)
-                if 'remoteip' in taskparams:
-                    # delete the remote ip
-                    del taskparams['remoteip']
-        except Exception:
-            app.logger.exception('Caught exception getting parameters')
-        return taskparams
+            params = GetQueryResult.get_parser.parse_args(request)
+        except Exception as e:
+            app.logger.info('Ignoring invalid wait parameter: ' + str(e))
+            return 0
+        wait = params[WAIT_PARAM]
+        if wait is None or wait <= 0:
+            return 0
+        return min(wait, app.config[MAX_WAIT_KEY])
 
     @api.doc('Creates request to delete query')
     @api.response(200, 'Delete request successfully received')
@@ -535,8 +2384,106 @@ class GetQueryResult(Resource):
             return marshal(er, ERROR_RESP), 500
 
 
+def _get_event_stream_response(uuidlist):
+    """
+    Creates server sent event stream of state transitions
+    of tasks in uuidlist
+    :param uuidlist: list of task uuids
+    :return: response or tuple (error, 503) if MAX_STREAMS event
+             streams are already open
+    """
+    if not acquire_event_stream():
+        er = ErrorResponse()
+        er.message = 'Too many open event streams'
+        er.description = ('Server limit of ' +
+                          str(app.config[MAX_STREAMS_KEY]) +
+                          ' event streams reached, retry in ' +
+                          str(app.config[SLEEP_TIME_KEY]) + ' seconds')
+        return marshal(er, ERROR_RESP), 503
+    try:
+        events = generate_task_events(uuidlist,
+                                      iphintlist=[request.remote_addr])
+        resp = flask.Response(flask.stream_with_context(events),
+                              mimetype='text/event-stream')
+        resp.headers['Cache-Control'] = 'no-cache'
+        resp.headers['X-Accel-Buffering'] = 'no'
+        resp.call_on_close(release_event_stream)
+    except Exception:
+        release_event_stream()
+        raise
+    return resp
+
+
+@ns.route('/events', strict_slashes=False)
+class GetTasksEvents(Resource):
+    """Streams state transitions of several tasks"""
+
+    get_parser = reqparse.RequestParser()
+    get_parser.add_argument(IDS_PARAM, type=str, required=True,
+                            help='Comma delimited list of task ids',
+                            location='args')
+
+    @api.response(200, 'Stream of server sent events with mimetype '
+                       'text/event-stream')
+    @api.response(400, 'Invalid list of task ids', ERROR_RESP)
+    @api.response(429, 'Too many requests', TOO_MANY_REQUESTS)
+    @api.response(503, 'Too many open event streams', ERROR_RESP)
+    @api.expect(get_parser)
+    def get(self):
+        """
+        Streams state transitions of tasks in **ids** as server sent events
+
+        Events are the same as GET /ontology/<id>/events with the id
+        in the data of each event telling which task it is for. The
+        stream ends once every task is done, in error, or not found.
+        Clients following many tasks should use this instead of a
+        stream per task since the number of open streams is limited.
+        """
+        params = GetTasksEvents.get_parser.parse_args(request)
+        uuidlist = []
+        for taskid in params[IDS_PARAM].split(','):
+            taskid = taskid.strip()
+            if len(taskid) > 0 and taskid not in uuidlist:
+                uuidlist.append(taskid)
+        maxtasks = app.config[MAX_STREAM_TASKS_KEY]
+        if len(uuidlist) == 0 or len(uuidlist) > maxtasks:
+            er = ErrorResponse()
+            er.message = 'Invalid ' + IDS_PARAM
+            er.description = (IDS_PARAM + ' must list between 1 and ' +
+                              str(maxtasks) + ' task ids')
+            return marshal(er, ERROR_RESP), 400
+        return _get_event_stream_response(uuidlist)
+
+
+@ns.route('/<string:id>/events', strict_slashes=False)
+class GetTaskEvents(Resource):
+    """Streams task state transitions"""
+
+    @api.response(200, 'Stream of server sent events with mimetype '
+                       'text/event-stream')
+    @api.response(429, 'Too many requests', TOO_MANY_REQUESTS)
+    @api.response(503, 'Too many open event streams', ERROR_RESP)
+    def get(self, id):
+        """
+        Streams state transitions of task as server sent events
+
+        Each event is named after the state of the task
+        (**submitted**, **processing**, **clustered**, **uploading**,
+        **done**, **error**, or **notfound**) and its data is a json
+        object with the status and id of the task. The stream ends once
+        the task is done, in error, or not found. Streams still open
+        after a server defined time limit are closed and the client
+        should reconnect.
+
+        The number of open streams is limited, if exceeded 503 is
+        returned and the client should poll GET /ontology/<id> or
+        retry later. To follow several tasks use GET /ontology/events
+        """
+        return _get_event_stream_response([id.strip()])
+
+
 @ns.route('/<string:id>/rawclusteringoutput', strict_slashes=False)
-class GetQueryResult(Resource):
+class GetRawClusteringOutput(Resource):
     """More class doc here"""
 
     @api.response(200, 'Successful response from server, output will be '
@@ -546,26 +2493,76 @@ class GetQueryResult(Resource):
     @api.response(500, 'Internal server error', ERROR_RESP)
     def get(self, id):
         """
-        If a task has completed returns raw output from clustering
-        algorithm with mimetype text/plain.
+        If clustering for a task has completed returns raw output from
+        clustering algorithm with mimetype text/plain. This is available
+        as soon as the task reaches clustered state, before the result
+        has been saved to NDEx.
         """
         cleanid = id.strip()
 
-        taskpath = get_task(cleanid, basedir=get_done_dir())
+        state, taskpath = get_task_state(cleanid,
+                                         iphintlist=[request.remote_addr])
 
-        if taskpath is None:
+        if state not in CLUSTERED_STATES:
             resp = flask.make_response()
             resp.status_code = 404
             return resp
 
         result = os.path.join(taskpath, CLUSTEROUT)
-        if not os.path.isfile(result):
+        gzresult = result + COMPRESSED_SUFFIX
+        # task runner removes uncompressed output right after
+        # the compressed copy appears so that is checked first
+        if os.path.isfile(gzresult):
+            return send_gzip_file(gzresult, mimetype='text/plain')
+        try:
+            return flask.send_file(result, mimetype='text/plain')
+        except FileNotFoundError:
+            app.logger.debug(result + ' removed, looking for ' + gzresult)
+
+        if not os.path.isfile(gzresult):
             er = ErrorResponse()
             er.message = 'No output found from clustering algorithm'
-            er.description = self._get_task_parameters(taskpath)
+            er.description = get_task_parameters(taskpath)
             return marshal(er, ERROR_RESP), 500
 
-        return flask.send_file(result, mimetype='text/plain')
+        return send_gzip_file(gzresult, mimetype='text/plain')
+
+
+def send_gzip_file(gzfile, mimetype):
+    """
+    Creates response for gzip compressed file. If the client accepts
+    gzip encoding the compressed bytes are sent as is with
+    Content-Encoding set, otherwise the file is decompressed as it
+    is sent
+    :param gzfile: path to gzip compressed file
+    :param mimetype: mimetype of uncompressed data
+    :return: response
+    :rtype: :py:class:`flask.Response`
+    """
+    if request.accept_encodings['gzip'] > 0:
+        resp = flask.send_file(gzfile, mimetype=mimetype, conditional=True)
+        resp.headers['Content-Encoding'] = 'gzip'
+        resp.headers['Vary'] = 'Accept-Encoding'
+        return resp
+
+    app.logger.debug('Client does not accept gzip, decompressing ' +
+                     gzfile)
+    gzf = gzip.open(gzfile, 'rb')
+
+    def generate():
+        try:
+            while True:
+                chunk = gzf.read(RESULT_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            gzf.close()
+
+    resp = flask.Response(generate(), mimetype=mimetype)
+    resp.call_on_close(gzf.close)
+    resp.headers['Vary'] = 'Accept-Encoding'
+    return resp
 
 
 class ServerStatus(object):
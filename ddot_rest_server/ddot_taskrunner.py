@@ -4,25 +4,94 @@
 import os
 import sys
 import argparse
+import collections
 import logging
 import logging.config
 import time
 import shutil
+import errno
 import json
 from json import JSONDecodeError
 import glob
 import subprocess
+import hashlib
+import heapq
+import importlib.util
+import queue
+import resource
+import signal
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED
+from concurrent.futures import wait as wait_for_futures
 import daemon
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import ddot_rest_server
+from ddot_rest_server.fswatch import FileSystemWatcher
 from ndex2.client import Ndex2
 
 logger = logging.getLogger('ddottaskrunner')
 
 LOG_FORMAT = "%(asctime)-15s %(levelname)s %(relativeCreated)dms " \
-             "%(filename)s::%(funcName)s():%(lineno)d %(message)s"
+             "%(threadName)s %(filename)s::%(funcName)s():%(lineno)d " \
+             "%(message)s"
 
 RUNDDOT = 'runddot.py'
 
+# directory under taskdir where clustering output is cached
+CLUSTER_CACHE_DIR = 'clustercache'
+
+# file in processing task directory whose modification time
+# is periodically updated by task runner processing the task
+LEASE_FILE = 'lease'
+
+# key in task json counting number of times task was
+# reclaimed after being abandoned by a task runner
+RECLAIM_COUNT_KEY = 'reclaimcount'
+
+# max number of cached NDEx clients and time in seconds
+# an unused client is kept
+NDEX_CLIENT_CACHE_SIZE = 8
+NDEX_CLIENT_MAX_IDLE = 300
+
+# retries with exponential backoff for NDEx requests
+# failing with one of NDEX_RETRY_STATUS codes
+NDEX_RETRIES = 3
+NDEX_RETRY_BACKOFF = 0.5
+NDEX_RETRY_STATUS = (500, 502, 503, 504)
+
+# values for --executor
+DOCKER_EXECUTOR = 'docker'
+LOCAL_EXECUTOR = 'local'
+INPROCESS_EXECUTOR = 'inprocess'
+
+# prefixes of result lines written by runddot.py
+RESULT_PREFIX = 'RESULT:'
+ERROR_PREFIX = 'ERROR:'
+
+# prefix of line written by runddot.py in place of RESULT: line
+# when only clustering was run via --clusteronly
+CLUSTERED_PREFIX = 'CLUSTERED:'
+
+# max characters of standard error from runddot.py put in
+# error message when it fails without writing a result
+STDERR_TAIL_LEN = 500
+
+# number of lines of standard error kept while a command runs
+STDERR_TAIL_LINES = 50
+
+# longest line read from a command at once, longer lines
+# are split so memory use stays bounded
+MAX_LINE_LEN = 65536
+
+# prefix of line written by runddot.py with json resource usage
+USAGE_PREFIX = 'USAGE:'
+
+# time in seconds to wait after SIGTERM before sending
+# SIGKILL to runddot.py that exceeded its time limit
+TIMEOUT_KILL_GRACE = 10
+
 def _parse_arguments(desc, args):
     """Parses command line arguments"""
     help_formatter = argparse.RawDescriptionHelpFormatter
@@ -43,6 +112,115 @@ def _parse_arguments(desc, args):
     parser.add_argument('--disabledelete', action='store_true',
                         help='If set, task runner will NOT monitor '
                              'delete requests')
+    parser.add_argument('--disableinotify', action='store_true',
+                        help='If set, task runner will NOT use inotify to '
+                             'detect new tasks and delete requests and '
+                             'will instead only check every --wait_time '
+                             'seconds')
+    parser.add_argument('--executor', default=DOCKER_EXECUTOR,
+                        choices=[DOCKER_EXECUTOR, LOCAL_EXECUTOR,
+                                 INPROCESS_EXECUTOR],
+                        help='How runddot.py is run. ' + DOCKER_EXECUTOR +
+                             ' runs it in a docker container, ' +
+                             LOCAL_EXECUTOR + ' runs it as a subprocess '
+                             'with --python, and ' + INPROCESS_EXECUTOR +
+                             ' imports and runs it within the task runner. '
+                             'The last two require ddot, pandas, and clixo '
+                             'to be installed on this host (default ' +
+                             DOCKER_EXECUTOR + ')')
+    parser.add_argument('--python', default=sys.executable,
+                        help='Python used to run runddot.py by ' +
+                             LOCAL_EXECUTOR + ' executor (default ' +
+                             sys.executable + ')')
+    parser.add_argument('--clixopath',
+                        help='Path to clixo passed to runddot.py by ' +
+                             LOCAL_EXECUTOR + ' and ' + INPROCESS_EXECUTOR +
+                             ' executors. If unset, runddot.py default '
+                             'is used')
+    parser.add_argument('--tasktimeout', type=int, default=0,
+                        help='Max time in seconds a task can run before it '
+                             'is stopped and put into error state. '
+                             '0 means no limit (default 0)')
+    parser.add_argument('--taskmemory', type=int, default=0,
+                        help='Max memory in bytes a task can use. Passed '
+                             'to docker as --memory, or set as address '
+                             'space rlimit by ' + LOCAL_EXECUTOR +
+                             ' executor. 0 means no limit (default 0)')
+    parser.add_argument('--taskcpus', type=float, default=0,
+                        help='Max number of CPUs a task can use. Passed to '
+                             'docker as --cpus. ' + LOCAL_EXECUTOR +
+                             ' executor instead limits CPU time to '
+                             '--tasktimeout times this value. 0 means no '
+                             'limit (default 0)')
+    parser.add_argument('--warmcontainers', type=int, default=0,
+                        help='If greater then 0, this many long running '
+                             'docker containers are started as needed '
+                             'and tasks are sent to them, avoiding the '
+                             'startup cost of a new container per task '
+                             '(default 0)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of tasks to run in parallel '
+                             '(default 1)')
+    parser.add_argument('--uploadworkers', type=int, default=0,
+                        help='If greater then 0, upload of results to NDEx '
+                             'is done separately from clustering by this '
+                             'many upload workers. Tasks go to clustered '
+                             'state once clustering completes, freeing the '
+                             'clustering worker for the next task. If 0, '
+                             'clustering and upload are done together by '
+                             'the same worker (default 0)')
+    parser.add_argument('--leasetime', type=int, default=600,
+                        help='Time in seconds a task in processing can go '
+                             'without a heartbeat from the task runner '
+                             'processing it before it is considered '
+                             'abandoned and put back in the submitted '
+                             'queue. A value of 0 or less disables this '
+                             '(default 600)')
+    parser.add_argument('--maxreclaims', type=int, default=2,
+                        help='Number of times an abandoned task is '
+                             'resubmitted before it is put into error '
+                             'state (default 2)')
+    parser.add_argument('--retentionmaxage', type=int, default=0,
+                        help='Time in seconds after which done tasks are '
+                             'removed. 0 means no limit (default 0)')
+    parser.add_argument('--retentionmaxsize', type=int, default=0,
+                        help='Max size in bytes of all done tasks, oldest '
+                             'are removed once exceeded. 0 means no limit '
+                             '(default 0)')
+    parser.add_argument('--retentionmaxipsize', type=int, default=0,
+                        help='Max size in bytes of done tasks from a single '
+                             'ip address, oldest tasks from that ip '
+                             'address are removed once exceeded. 0 means '
+                             'no limit (default 0)')
+    parser.add_argument('--retentionmaxdeletes', type=int, default=20,
+                        help='Max number of done tasks removed by '
+                             'retention policies each time they are '
+                             'checked (default 20)')
+    parser.add_argument('--retentioninterval', type=int, default=60,
+                        help='Time in seconds between checks of retention '
+                             'policies (default 60)')
+    parser.add_argument('--deletebatchsize', type=int, default=50,
+                        help='Max number of delete task requests handled '
+                             'before looking for a task to run '
+                             '(default 50)')
+    parser.add_argument('--disablecompression', action='store_true',
+                        help='If set, task runner will NOT gzip compress '
+                             'clustering output and interaction file of '
+                             'tasks once they are done')
+    parser.add_argument('--disablecache', action='store_true',
+                        help='If set, task runner will NOT cache '
+                             'clustering output')
+    parser.add_argument('--clearcache', action='store_true',
+                        help='If set, task runner removes all cached '
+                             'clustering output on startup')
+    parser.add_argument('--cachemaxsize', type=int, default=10737418240,
+                        help='Max size in bytes of clustering output '
+                             'cache, least recently used entries are '
+                             'removed once exceeded (default 10737418240)')
+    parser.add_argument('--cachemaxage', type=int, default=2592000,
+                        help='Time in seconds since last use after which '
+                             'clustering output cache entries are removed '
+                             '(default 2592000)')
     parser.add_argument('--nodaemon', default=False, action='store_true',
                         help='If set program will NOT run in daemon mode')
     parser.add_argument('--logconfig', help='Logging configuration file')
@@ -73,6 +251,44 @@ def _setuplogging(theargs):
             pass
 
 
+def _remove_batch_if_done(basedir, batchid):
+    """
+    Removes BATCHES/<batchid>.json under basedir once none of the
+    tasks listed in it have a directory under basedir. Called after
+    a task in the batch is deleted so batch records do not outlive
+    their tasks
+    :param basedir: base directory of tasks
+    :param batchid: id of batch
+    :return: True if batch record was removed otherwise False
+    """
+    if batchid is None:
+        return False
+    batchfile = os.path.join(basedir, ddot_rest_server.BATCHES,
+                             batchid + '.json')
+    try:
+        with open(batchfile, 'r') as f:
+            batch = json.load(f)
+        taskids = batch[ddot_rest_server.BATCH_TASKS_KEY]
+        remoteip = str(batch[ddot_rest_server.REMOTEIP_PARAM])
+    except FileNotFoundError:
+        return False
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        logger.error('Unable to read ' + batchfile + ' : ' + str(e))
+        return False
+    for taskid in taskids:
+        for state in ddot_rest_server.TASK_STATES:
+            if os.path.isdir(os.path.join(basedir, state,
+                                          remoteip, taskid)):
+                return False
+    try:
+        os.unlink(batchfile)
+    except FileNotFoundError:
+        return False
+    logger.info('Removed record of batch ' + batchid +
+                ' since all of its tasks are deleted')
+    return True
+
+
 class FileBasedTask(object):
     """Represents a task
     """
@@ -84,7 +300,13 @@ class FileBasedTask(object):
     TASK_FILES = [ddot_rest_server.RESULT,
                   ddot_rest_server.TASK_JSON,
                   ddot_rest_server.INTERACTION_FILE_PARAM,
-                  ddot_rest_server.CLUSTEROUT]
+                  ddot_rest_server.CLUSTEROUT,
+                  ddot_rest_server.INTERACTION_FILE_SIDECAR,
+                  ddot_rest_server.INTERACTION_FILE_PARAM +
+                  ddot_rest_server.COMPRESSED_SUFFIX,
+                  ddot_rest_server.CLUSTEROUT +
+                  ddot_rest_server.COMPRESSED_SUFFIX,
+                  LEASE_FILE]
 
     def __init__(self, taskdir, taskdict):
         self._taskdir = taskdir
@@ -107,6 +329,8 @@ class FileBasedTask(object):
         # this is a paranoid removal since we only are tossing
         # the directory in question and files listed in TASK_FILES
         try:
+            digest = self._get_interactionfile_sha256_from_taskdir()
+            batchid = self._get_batchid_from_taskdir()
             for entry in os.listdir(self._taskdir):
                 if entry not in FileBasedTask.TASK_FILES:
                     logger.error(entry + ' not in files created by task')
@@ -115,12 +339,98 @@ class FileBasedTask(object):
                 if os.path.isfile(fp):
                     os.unlink(fp)
             os.rmdir(self._taskdir)
+            taskattrib = self._get_uuid_ip_state_basedir_from_path()
+            ddot_rest_server.TaskIndex(taskattrib[FileBasedTask.BASEDIR]).\
+                remove(taskattrib[FileBasedTask.UUID])
+            if digest is not None:
+                ddot_rest_server.BlobStore(taskattrib[FileBasedTask.BASEDIR]).\
+                    release(digest)
+            _remove_batch_if_done(taskattrib[FileBasedTask.BASEDIR], batchid)
             return None
         except Exception as e:
             logger.exception('Caught exception removing ' + self._taskdir)
             return ('Caught exception ' + str(e) + 'trying to remove ' +
                     self._taskdir)
 
+    def compress_task_files(self):
+        """
+        Replaces CLUSTEROUT and interaction file with gzip compressed
+        copies ending with COMPRESSED_SUFFIX. The compressed interaction
+        file is hard linked to a compressed blob in
+        :py:class:`ddot_rest_server.BlobStore` so it is only
+        compressed once. The parsed copy of the interaction file,
+        INTERACTION_FILE_SIDECAR, is removed since it is only
+        needed to run the task. Only call once task is done.
+        :return: None upon success or str with error message
+        """
+        if self._taskdir is None:
+            return 'Task dir is None'
+        try:
+            sidecar = os.path.join(self._taskdir,
+                                   ddot_rest_server.INTERACTION_FILE_SIDECAR)
+            if os.path.isfile(sidecar):
+                os.unlink(sidecar)
+            clusterout = os.path.join(self._taskdir,
+                                      ddot_rest_server.CLUSTEROUT)
+            if os.path.isfile(clusterout):
+                ddot_rest_server.compress_file(clusterout, clusterout +
+                                               ddot_rest_server.
+                                               COMPRESSED_SUFFIX)
+                os.unlink(clusterout)
+            ifile = os.path.join(self._taskdir,
+                                 ddot_rest_server.INTERACTION_FILE_PARAM)
+            if os.path.isfile(ifile):
+                gzifile = ifile + ddot_rest_server.COMPRESSED_SUFFIX
+                digest = self._get_interactionfile_sha256_from_taskdir()
+                store = ddot_rest_server.BlobStore(self.get_basedir())
+                if not store.add_compressed(ifile, digest, gzifile):
+                    ddot_rest_server.compress_file(ifile, gzifile)
+                os.unlink(ifile)
+                if digest is not None:
+                    store.release(digest)
+        except Exception as e:
+            logger.exception('Caught exception compressing files in ' +
+                             self._taskdir)
+            return ('Caught exception ' + str(e) + ' trying to compress '
+                    'files in ' + self._taskdir)
+        return None
+
+    def _get_interactionfile_sha256_from_taskdir(self):
+        """
+        Gets SHA-256 of interaction file from task dict
+        falling back to TASK_JSON file in task directory
+        :return: hex digest or None
+        """
+        digest = self.get_interactionfile_sha256()
+        if digest is not None:
+            return digest
+        return self._get_value_from_task_json(ddot_rest_server.
+                                              INTERACTION_FILE_SHA256_PARAM)
+
+    def _get_batchid_from_taskdir(self):
+        """
+        Gets batch id from task dict falling back to TASK_JSON
+        file in task directory
+        :return: batch id or None
+        """
+        batchid = self.get_batchid()
+        if batchid is not None:
+            return batchid
+        return self._get_value_from_task_json(ddot_rest_server.BATCH_ID_PARAM)
+
+    def _get_value_from_task_json(self, key):
+        """
+        Gets value of key from TASK_JSON file in task directory
+        :param key: key to look up
+        :return: value or None if not found or file cannot be read
+        """
+        tjson = os.path.join(self._taskdir, ddot_rest_server.TASK_JSON)
+        try:
+            with open(tjson, 'r') as f:
+                return json.load(f).get(key)
+        except (OSError, ValueError, AttributeError):
+            return None
+
     def save_task(self):
         """
         Updates task in datastore. For filesystem based
@@ -152,9 +462,11 @@ class FileBasedTask(object):
     def move_task(self, new_state,
                   error_message=None):
         """
-        Changes state of task to new_state
+        Changes state of task to new_state. The directory is
+        moved via an atomic rename so if multiple runners attempt
+        to move the same task only one will succeed
         :param new_state: new state
-        :return: None
+        :return: None upon success or str with error message
         """
         taskattrib = self._get_uuid_ip_state_basedir_from_path()
         if taskattrib is None or taskattrib[FileBasedTask.BASEDIR] is None:
@@ -184,11 +496,111 @@ class FileBasedTask(object):
         ptaskdir = os.path.join(taskattrib[FileBasedTask.BASEDIR], new_state,
                                 taskattrib[FileBasedTask.IPADDR],
                                 taskattrib[FileBasedTask.UUID])
-        shutil.move(self._taskdir, ptaskdir)
+        try:
+            self._rename_taskdir(ptaskdir)
+        except FileNotFoundError:
+            return ('Task ' + self._taskdir +
+                    ' no longer exists, it was likely moved by another '
+                    'runner')
+        except OSError as e:
+            return ('Unable to move task ' + self._taskdir + ' to ' +
+                    ptaskdir + ' : ' + str(e))
         self._taskdir = ptaskdir
+        ddot_rest_server.TaskIndex(taskattrib[FileBasedTask.BASEDIR]).\
+            update(taskattrib[FileBasedTask.UUID], new_state,
+                   taskattrib[FileBasedTask.IPADDR], ptaskdir)
+
+        return None
+
+    def write_lease(self):
+        """
+        Creates or updates lease file in task directory denoting
+        this process owns the task
+        :return: None upon success or str with error message
+        """
+        if self._taskdir is None:
+            return 'Task dir is None'
+        leasefile = os.path.join(self._taskdir, LEASE_FILE)
+        try:
+            with open(leasefile, 'w') as f:
+                f.write(socket.gethostname() + ':' + str(os.getpid()) +
+                        ':' + threading.current_thread().name)
+                f.flush()
+        except OSError as e:
+            logger.error('Unable to write lease ' + leasefile + ' : ' +
+                         str(e))
+            return str(e)
+        return None
+
+    def renew_lease(self):
+        """
+        Updates modification time of lease file
+        :return: None upon success or str with error message
+        """
+        if self._taskdir is None:
+            return 'Task dir is None'
+        try:
+            os.utime(os.path.join(self._taskdir, LEASE_FILE))
+        except OSError as e:
+            logger.error('Unable to renew lease for ' + self._taskdir +
+                         ' : ' + str(e))
+            return str(e)
+        return None
 
+    def remove_lease(self):
+        """
+        Removes lease file if it exists
+        :return: None
+        """
+        if self._taskdir is None:
+            return None
+        leasefile = os.path.join(self._taskdir, LEASE_FILE)
+        if os.path.isfile(leasefile):
+            os.unlink(leasefile)
         return None
 
+    def get_lease_age(self):
+        """
+        Gets time in seconds since lease was last renewed. If there
+        is no lease file, the time since the task directory was last
+        changed, which includes being moved, is used
+        :return: age in seconds or None if task directory is not found
+        """
+        if self._taskdir is None:
+            return None
+        try:
+            leasefile = os.path.join(self._taskdir, LEASE_FILE)
+            if os.path.isfile(leasefile):
+                lastupdate = os.stat(leasefile).st_mtime
+            else:
+                lastupdate = os.stat(self._taskdir).st_ctime
+        except OSError:
+            return None
+        return time.time() - lastupdate
+
+    def _rename_taskdir(self, ptaskdir):
+        """
+        Renames task directory to ptaskdir creating parent
+        directory if needed. If the rename crosses filesystems
+        shutil.move() is used which is NOT atomic
+        :param ptaskdir: new path for task directory
+        :raises FileNotFoundError: if task directory does not exist
+        :return: None
+        """
+        parentdir = os.path.dirname(ptaskdir)
+        if not os.path.isdir(parentdir):
+            try:
+                original_umask = os.umask(0)
+                os.makedirs(parentdir, mode=0o775, exist_ok=True)
+            finally:
+                os.umask(original_umask)
+        try:
+            os.rename(self._taskdir, ptaskdir)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            shutil.move(self._taskdir, ptaskdir)
+
     def _get_uuid_ip_state_basedir_from_path(self):
         """
         Parses taskdir path into main parts and returns
@@ -234,6 +646,14 @@ class FileBasedTask(object):
         """
         return self._get_uuid_ip_state_basedir_from_path()[FileBasedTask.STATE]
 
+    def get_basedir(self):
+        """
+        Gets base directory containing state directories
+        based on taskdir
+        :return:
+        """
+        return self._get_uuid_ip_state_basedir_from_path()[FileBasedTask.BASEDIR]
+
     def get_task_uuid(self):
         """
         Parses taskdir path to get uuid
@@ -324,6 +744,38 @@ class FileBasedTask(object):
             return None
         return snp_file
 
+    def get_batchid(self):
+        """
+        Gets id of batch task was submitted in
+        :return: batch id or None
+        """
+        if self._taskdict is None:
+            return None
+        return self._taskdict.get(ddot_rest_server.BATCH_ID_PARAM)
+
+    def set_resource_usage(self, usage):
+        """
+        Sets resource usage of task in task json, call
+        :py:meth:`save_task` to persist
+        :param usage: dict with keys WALLTIME_KEY, CPUTIME_KEY, and
+                      MAXRSS_KEY, any of which can be missing
+        :return: None
+        """
+        if self._taskdict is None:
+            self._taskdict = {}
+        self._taskdict[ddot_rest_server.RESOURCE_USAGE_PARAM] = usage
+
+    def get_interactionfile_sha256(self):
+        """
+        Gets SHA-256 of interaction file computed when task was created
+        :return: hex digest or None
+        """
+        if self._taskdict is None:
+            return None
+        if ddot_rest_server.INTERACTION_FILE_SHA256_PARAM not in self._taskdict:
+            return None
+        return self._taskdict[ddot_rest_server.INTERACTION_FILE_SHA256_PARAM]
+
     def get_tmp_resultpath(self):
         """
         Gets tmp result path
@@ -406,51 +858,380 @@ class FileBasedTask(object):
         return json.loads(rawattribs)
 
 
+class TaskLeaseHeartbeat(object):
+    """
+    Context manager that writes lease for task and renews
+    it every interval seconds from a background thread
+    until exited
+    """
+    def __init__(self, task, interval):
+        """
+        Constructor
+        :param task: task to hold lease on
+        :param interval: time in seconds between renewals, if None
+                         or 0 or less the lease is not maintained
+        """
+        self._task = task
+        self._interval = interval
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def _renew(self):
+        """
+        Renews lease until stop event is set
+        :return: None
+        """
+        while not self._stop_event.wait(self._interval):
+            self._task.renew_lease()
+
+    def __enter__(self):
+        if self._interval is None or self._interval <= 0:
+            return self
+        self._task.write_lease()
+        self._thread = threading.Thread(target=self._renew,
+                                        name=threading.current_thread().name +
+                                        '-heartbeat')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join()
+        try:
+            self._task.remove_lease()
+        except OSError as e:
+            logger.error('Unable to remove lease : ' + str(e))
+
+
+class AbandonedTaskReclaimer(object):
+    """
+    Looks for tasks in processing or uploading whose lease has
+    expired, meaning the task runner processing them crashed, and
+    puts them back in submitted or clustered respectively so they
+    are run again. Tasks that are reclaimed more then max_reclaims
+    times are put in error state instead
+    """
+
+    # pairs of (state of running task, state to put it back in)
+    RECLAIM_STATES = [(ddot_rest_server.PROCESSING_STATUS,
+                       ddot_rest_server.SUBMITTED_STATUS),
+                      (ddot_rest_server.UPLOADING_STATUS,
+                       ddot_rest_server.CLUSTERED_STATUS)]
+
+    def __init__(self, taskdir, lease_time, max_reclaims=2):
+        """
+        Constructor
+        :param taskdir: base directory containing state directories
+        :param lease_time: time in seconds after which a lease expires
+        :param max_reclaims: number of times task is resubmitted before
+                             it is put into error state
+        """
+        self._taskdir = taskdir
+        self._lease_time = lease_time
+        self._max_reclaims = max_reclaims
+
+    def get_lease_time(self):
+        """
+        Gets lease time
+        :return: lease time in seconds
+        """
+        return self._lease_time
+
+    def reclaim_tasks(self):
+        """
+        Examines processing and uploading directories for tasks with
+        expired leases
+        :return: number of tasks reclaimed
+        """
+        if self._taskdir is None:
+            return 0
+        numreclaimed = 0
+        for state, prev_state in AbandonedTaskReclaimer.RECLAIM_STATES:
+            statedir = os.path.join(self._taskdir, state)
+            if not os.path.isdir(statedir):
+                continue
+            for entry in os.listdir(statedir):
+                fp = os.path.join(statedir, entry)
+                if not os.path.isdir(fp):
+                    continue
+                for subentry in os.listdir(fp):
+                    subfp = os.path.join(fp, subentry)
+                    if not os.path.isdir(subfp):
+                        continue
+                    task = FileBasedTask(subfp, {})
+                    age = task.get_lease_age()
+                    if age is None or age <= self._lease_time:
+                        continue
+                    if self._reclaim_task(task, age, prev_state) is True:
+                        numreclaimed += 1
+        return numreclaimed
+
+    def _reclaim_task(self, task, age,
+                      prev_state=ddot_rest_server.SUBMITTED_STATUS):
+        """
+        Moves task back to prev_state or to error if it has
+        been reclaimed too many times
+        :param task: abandoned task
+        :param age: age of lease in seconds
+        :param prev_state: state to put task back in
+        :return: True if task was reclaimed otherwise False
+        """
+        tjson = os.path.join(task.get_taskdir(), ddot_rest_server.TASK_JSON)
+        try:
+            with open(tjson, 'r') as f:
+                task.set_taskdict(json.load(f))
+        except Exception as e:
+            logger.error('Unable to read ' + tjson + ' : ' + str(e))
+            task.set_taskdict({})
+        taskdict = task.get_taskdict()
+        reclaimcount = taskdict.get(RECLAIM_COUNT_KEY, 0)
+        logger.info('Task ' + task.get_taskdir() + ' lease expired ' +
+                    str(int(age)) + ' seconds ago, it has been reclaimed ' +
+                    str(reclaimcount) + ' time(s)')
+        task.remove_lease()
+        if reclaimcount >= self._max_reclaims:
+            emsg = task.move_task(ddot_rest_server.ERROR_STATUS,
+                                  error_message='Task abandoned by task '
+                                                'runner ' +
+                                                str(reclaimcount + 1) +
+                                                ' times')
+        else:
+            emsg = task.move_task(prev_state)
+            if emsg is None:
+                taskdict[RECLAIM_COUNT_KEY] = reclaimcount + 1
+                task.save_task()
+        if emsg is not None:
+            logger.info('Unable to reclaim task: ' + emsg)
+            return False
+        return True
+
+
 class FileBasedSubmittedTaskFactory(object):
     """
-    Reads file system to get tasks
+    Reads file system to get tasks. Tasks are kept in a queue
+    per ip address directory ordered by submission time. Ip address
+    queues are served round robin, so a client with many queued
+    tasks cannot starve other clients. The queues are refreshed
+    incrementally by only listing ip address directories whose
+    modification time changed. A task that cannot be claimed is
+    dropped from its queue, see :py:meth:`claim_failed`.
+    By default tasks in submitted state are returned, but any state
+    can be passed to constructor, such as clustered for tasks waiting
+    to be uploaded to NDEx.
     """
-    def __init__(self, taskdir):
+
+    # time in seconds after which all directories are relisted
+    # regardless of their modification time
+    FULL_RESCAN_INTERVAL = 300
+
+    # directories modified less then this many seconds before they
+    # were listed are relisted on next refresh since entries added
+    # within the same timestamp granularity would otherwise be missed
+    RACY_INTERVAL = 2
+
+    # number of times claiming a task can fail before it is
+    # no longer returned by get_next_task()
+    MAX_CLAIM_ATTEMPTS = 5
+
+    def __init__(self, taskdir, state=ddot_rest_server.SUBMITTED_STATUS):
         self._taskdir = taskdir
         self._submitdir = None
         if self._taskdir is not None:
-            self._submitdir = os.path.join(self._taskdir,
-                                           ddot_rest_server.SUBMITTED_STATUS)
+            self._submitdir = os.path.join(self._taskdir, state)
         self._problemlist = []
+        self._ipqueues = {}
+        self._taskdicts = {}
+        self._pending = set()
+        self._dirmtimes = {}
+        self._lastserved = {}
+        self._servecount = 0
+        self._last_full_rescan = 0
+        self._claimfailures = {}
+
+    def _get_submit_time(self, jsondata, tjson):
+        """
+        Gets submission time of task falling back to modification
+        time of task json file
+        :param jsondata: task json data
+        :param tjson: path to task json file
+        :return: submit time in seconds since epoch
+        """
+        try:
+            return float(jsondata[ddot_rest_server.SUBMITTIME_PARAM])
+        except (KeyError, TypeError, ValueError):
+            return os.path.getmtime(tjson)
+
+    def _queue_pending_tasks(self):
+        """
+        Attempts to read task json for each pending task directory
+        and adds any that are readable to ip queue
+        :return: None
+        """
+        for subfp in list(self._pending):
+            if not os.path.isdir(subfp):
+                self._pending.discard(subfp)
+                continue
+            tjson = os.path.join(subfp, ddot_rest_server.TASK_JSON)
+            if not os.path.isfile(tjson):
+                continue
+            try:
+                with open(tjson, 'r') as f:
+                    jsondata = json.load(f)
+                submittime = self._get_submit_time(jsondata, tjson)
+            except Exception as e:
+                if subfp not in self._problemlist:
+                    logger.info('Skipping task: ' + subfp +
+                                ' due to error reading json' +
+                                ' file: ' + str(e))
+                    self._problemlist.append(subfp)
+                continue
+            if subfp in self._problemlist:
+                self._problemlist.remove(subfp)
+            self._pending.discard(subfp)
+            ipaddr = os.path.basename(os.path.dirname(subfp))
+            self._taskdicts[subfp] = jsondata
+            heapq.heappush(self._ipqueues.setdefault(ipaddr, []),
+                           (submittime, subfp))
+
+    def _refresh(self):
+        """
+        Looks for new tasks, only listing ip address
+        directories that changed since last refresh
+        :return: None
+        """
+        now = time.time()
+        fullrescan = now - self._last_full_rescan > self.FULL_RESCAN_INTERVAL
+        if fullrescan:
+            self._dirmtimes = {}
+            self._last_full_rescan = now
+            self._claimfailures = {k: v for k, v in
+                                   self._claimfailures.items()
+                                   if os.path.isdir(k)}
+
+        for entry in os.listdir(self._submitdir):
+            fp = os.path.join(self._submitdir, entry)
+            try:
+                st = os.stat(fp)
+            except OSError:
+                continue
+            if not os.path.isdir(fp):
+                continue
+            if self._dirmtimes.get(fp) == st.st_mtime_ns:
+                continue
+            for subentry in os.listdir(fp):
+                subfp = os.path.join(fp, subentry)
+                if subfp in self._taskdicts:
+                    continue
+                # tasks that could not be claimed are only retried
+                # on full rescans
+                failures = self._claimfailures.get(subfp, 0)
+                if failures >= self.MAX_CLAIM_ATTEMPTS or\
+                        (failures > 0 and not fullrescan):
+                    continue
+                if os.path.isdir(subfp):
+                    self._pending.add(subfp)
+            if now - st.st_mtime > self.RACY_INTERVAL:
+                self._dirmtimes[fp] = st.st_mtime_ns
+            else:
+                self._dirmtimes.pop(fp, None)
+        self._queue_pending_tasks()
+
+    def _get_head_of_queue(self, ipaddr):
+        """
+        Gets first task in queue for ip address dropping
+        any tasks that no longer exist
+        :param ipaddr: ip address
+        :return: first entry in queue or None if queue is empty
+        """
+        queue = self._ipqueues[ipaddr]
+        while len(queue) > 0:
+            head = queue[0]
+            if os.path.isdir(head[1]):
+                return head
+            heapq.heappop(queue)
+            self._taskdicts.pop(head[1], None)
+        del self._ipqueues[ipaddr]
+        return None
 
     def get_next_task(self):
         """
-        Looks for next task in task dir. currently finds the first
-        :return:
+        Gets next task to run. The returned task is left in the queue
+        until it is moved out of the submitted directory or
+        :py:meth:`claim_failed` is called. Its task json
+        is read again so the returned task is never out of date
+        :return: task or None if there are no tasks
         """
         if self._submitdir is None:
             logger.error('Submit directory is None')
             return None
         if not os.path.isdir(self._submitdir):
-            logger.error(self._submitdir +
+            # normal until first task reaches this state
+            logger.debug(self._submitdir +
                          ' does not exist or is not a directory')
             return None
         logger.debug('Examining ' + self._submitdir + ' for new tasks')
-        for entry in os.listdir(self._submitdir):
-            fp = os.path.join(self._submitdir, entry)
-            if not os.path.isdir(fp):
+        self._refresh()
+
+        best = None
+        bestkey = None
+        for ipaddr in list(self._ipqueues.keys()):
+            head = self._get_head_of_queue(ipaddr)
+            if head is None:
                 continue
-            for subentry in os.listdir(fp):
-                subfp = os.path.join(fp, subentry)
-                if os.path.isdir(subfp):
-                    tjson = os.path.join(subfp, ddot_rest_server.TASK_JSON)
-                    if os.path.isfile(tjson):
-                        try:
-                            with open(tjson, 'r') as f:
-                                jsondata = json.load(f)
-                            return FileBasedTask(subfp, jsondata)
-                        except Exception as e:
-                            if subfp not in self._problemlist:
-                                logger.info('Skipping task: ' + subfp +
-                                            ' due to error reading json' +
-                                            ' file: ' + str(e))
-                                self._problemlist.append(subfp)
-        return None
+            # least recently served ip address, then oldest task
+            key = (self._lastserved.get(ipaddr, -1), head[0])
+            if bestkey is None or key < bestkey:
+                bestkey = key
+                best = (ipaddr, head[1])
+        if best is None:
+            return None
+        self._servecount += 1
+        self._lastserved[best[0]] = self._servecount
+        # task json is read again since the task may have been claimed
+        # and put back, for example by the abandoned task reclaimer,
+        # since it was cached
+        try:
+            with open(os.path.join(best[1],
+                                   ddot_rest_server.TASK_JSON), 'r') as f:
+                self._taskdicts[best[1]] = json.load(f)
+        except Exception as e:
+            logger.debug('Unable to reread json for task ' + best[1] +
+                         ' using cached copy: ' + str(e))
+        return FileBasedTask(best[1], dict(self._taskdicts[best[1]]))
+
+    def claim_failed(self, task):
+        """
+        Drops task from its ip address queue after it could not be
+        claimed, for example due to a permission error moving it, so
+        it does not block other tasks from the same ip address. The
+        task is queued again on the next full rescan, every
+        FULL_RESCAN_INTERVAL seconds, until claiming it has failed
+        MAX_CLAIM_ATTEMPTS times after which it is added to the
+        problem list
+        :param task: task returned by :py:meth:`get_next_task`
+        :return: None
+        """
+        subfp = task.get_taskdir()
+        if subfp is None:
+            return
+        ipaddr = os.path.basename(os.path.dirname(subfp))
+        queue = self._ipqueues.get(ipaddr)
+        if queue is not None:
+            newqueue = [entry for entry in queue if entry[1] != subfp]
+            if len(newqueue) != len(queue):
+                heapq.heapify(newqueue)
+                self._ipqueues[ipaddr] = newqueue
+        self._taskdicts.pop(subfp, None)
+        failures = self._claimfailures.get(subfp, 0) + 1
+        self._claimfailures[subfp] = failures
+        if failures >= self.MAX_CLAIM_ATTEMPTS:
+            logger.error('Unable to claim task ' + subfp + ' after ' +
+                         str(failures) + ' attempts, no longer trying')
+            if subfp not in self._problemlist:
+                self._problemlist.append(subfp)
 
     def get_size_of_problem_list(self):
         """
@@ -469,8 +1250,24 @@ class FileBasedSubmittedTaskFactory(object):
 
 class DeletedFileBasedTaskFactory(object):
     """
-    Reads filesystem for tasks that should be deleted
+    Reads filesystem for tasks that should be deleted. Delete
+    requests are listed once and handed out one at a time until
+    all of them are consumed. Tasks are found via
+    :py:class:`ddot_rest_server.TaskIndex` falling back to
+    scanning the state directories if the task is not in the index.
+    Requests for tasks in BUSY_STATES, which are being run by
+    workers or upload workers, are left in place and looked at
+    again every DEFER_INTERVAL seconds until the task leaves
+    those states
     """
+
+    BUSY_STATES = (ddot_rest_server.PROCESSING_STATUS,
+                   ddot_rest_server.CLUSTERED_STATUS,
+                   ddot_rest_server.UPLOADING_STATUS)
+
+    # time in seconds before a put off delete request is looked at again
+    DEFER_INTERVAL = 5
+
     def __init__(self, taskdir):
         """
         Constructor
@@ -479,16 +1276,15 @@ class DeletedFileBasedTaskFactory(object):
         self._taskdir = taskdir
         self._delete_req_dir = None
         self._searchdirs = []
+        self._pending = []
+        self._deferred = {}
+        self._taskindex = None
         if self._taskdir is not None:
             self._delete_req_dir = os.path.join(self._taskdir,
                                                 ddot_rest_server.DELETE_REQUESTS)
-            self._searchdirs.append(os.path.join(self._taskdir,
-                                                 ddot_rest_server.
-                                                 PROCESSING_STATUS))
-            self._searchdirs.append(os.path.join(self._taskdir,
-                                                 ddot_rest_server.SUBMITTED_STATUS))
-            self._searchdirs.append(os.path.join(self._taskdir,
-                                                 ddot_rest_server.DONE_STATUS))
+            for state in ddot_rest_server.TASK_STATES:
+                self._searchdirs.append(os.path.join(self._taskdir, state))
+            self._taskindex = ddot_rest_server.TaskIndex(self._taskdir)
         else:
             logger.error('Taskdir is None')
 
@@ -500,16 +1296,35 @@ class DeletedFileBasedTaskFactory(object):
         if self._delete_req_dir is None:
             logger.error('Delete request dir is None')
             return None
-        if not os.path.isdir(self._delete_req_dir):
-            logger.error(self._delete_req_dir + ' is not a directory')
-            return None
-        logger.debug('Examining ' + self._delete_req_dir +
-                     ' for delete task requests')
-        for entry in os.listdir(self._delete_req_dir):
+        if not self._pending:
+            if not os.path.isdir(self._delete_req_dir):
+                logger.error(self._delete_req_dir + ' is not a directory')
+                return None
+            logger.debug('Examining ' + self._delete_req_dir +
+                         ' for delete task requests')
+            # reversed so pop() hands out requests in listing order
+            self._pending = sorted(os.listdir(self._delete_req_dir),
+                                   reverse=True)
+            self._deferred = {k: v for k, v in self._deferred.items()
+                              if k in self._pending}
+        now = time.time()
+        while self._pending:
+            entry = self._pending.pop()
             fp = os.path.join(self._delete_req_dir, entry)
             if not os.path.isfile(fp):
                 continue
+            deferred = self._deferred.get(entry)
+            if deferred is not None and\
+                    now - deferred < DeletedFileBasedTaskFactory.DEFER_INTERVAL:
+                continue
             task = self._get_task_with_id(entry)
+            if task is not None and task.get_state() in\
+                    DeletedFileBasedTaskFactory.BUSY_STATES:
+                logger.debug('Putting off delete of ' + task.get_taskdir() +
+                             ' until it is no longer running')
+                self._deferred[entry] = now
+                continue
+            self._deferred.pop(entry, None)
 
             logger.info('Removing delete request file: ' + fp)
             os.unlink(fp)
@@ -521,76 +1336,597 @@ class DeletedFileBasedTaskFactory(object):
 
     def _get_task_with_id(self, taskid):
         """
-        Uses glob to look for task with id under taskdir
+        Looks up task with id in task index, if not found
+        or index is out of date, uses glob to look for task
+        with id under taskdir
         :return: FileBasedTask object or None if not found
         """
+        if self._taskindex is None:
+            return None
+        if taskid.startswith('.') or os.sep in taskid:
+            logger.error('Invalid task id: ' + taskid)
+            return None
+        entry = self._taskindex.lookup(taskid)
+        if entry is not None and os.path.isdir(entry[2]):
+            return self._load_task(entry[2])
+        if entry is not None:
+            logger.debug('Index entry for ' + taskid + ' is out of date')
         for search_dir in self._searchdirs:
-            for entry in glob.glob(os.path.join(search_dir, '*', taskid)):
+            for entry in glob.glob(os.path.join(search_dir, '*',
+                                                glob.escape(taskid))):
                 if not os.path.isdir(entry):
                     logger.error('Found match (' + entry +
                                  '), but its not a directory')
                     continue
-                tjson = os.path.join(entry, ddot_rest_server.TASK_JSON)
-                if os.path.isfile(tjson):
-                    try:
-                        with open(tjson, 'r') as f:
-                            jsondata = json.load(f)
-                        return FileBasedTask(entry, jsondata)
-                    except Exception as e:
-                            logger.exception('Unable to parse json for task ' +
-                                             entry + ' going to skip json: ' +
-                                             str(e))
-                            return FileBasedTask(entry, {})
-                else:
-                    logger.error('No json for task ' + entry +
-                                 ' going to skip json')
-                    return FileBasedTask(entry, {})
+                return self._load_task(entry)
         return None
 
+    def _load_task(self, taskdir):
+        """
+        Creates task from directory loading TASK_JSON if possible
+        :param taskdir: task directory
+        :return: FileBasedTask object
+        """
+        tjson = os.path.join(taskdir, ddot_rest_server.TASK_JSON)
+        if os.path.isfile(tjson):
+            try:
+                with open(tjson, 'r') as f:
+                    jsondata = json.load(f)
+                return FileBasedTask(taskdir, jsondata)
+            except Exception as e:
+                logger.exception('Unable to parse json for task ' +
+                                 taskdir + ' going to skip json: ' +
+                                 str(e))
+                return FileBasedTask(taskdir, {})
+        logger.error('No json for task ' + taskdir +
+                     ' going to skip json')
+        return FileBasedTask(taskdir, {})
+
 
-class NetworkAttributeSetter(object):
+def _replace_with_link(srcfile, destfile):
     """
-    Sets network attributes on a network in NDEx
+    Atomically replaces destfile with a hard link to srcfile falling
+    back to a copy if hard links are not supported. Since the two
+    files can end up sharing data, destfile must be replaced rather
+    then written to if it changes later
+    :param srcfile: existing file
+    :param destfile: path of file to create or replace
+    :return: None
     """
+    tmpfile = destfile + '.' + str(os.getpid()) + '.' +\
+        str(threading.get_ident()) + '.tmp'
+    try:
+        try:
+            os.link(srcfile, tmpfile)
+        except OSError as e:
+            logger.debug('Unable to hard link ' + srcfile + ' copying '
+                         'instead: ' + str(e))
+            shutil.copyfile(srcfile, tmpfile)
+        os.replace(tmpfile, destfile)
+    finally:
+        if os.path.lexists(tmpfile):
+            os.unlink(tmpfile)
 
-    def __init__(self):
+
+class ClusterResultCache(object):
+    """
+    Content addressed cache of clustering output keyed on
+    the SHA-256 of the interaction file along with the alpha
+    and beta parameters and version of the code producing the
+    output. Entries are hard linked to the clustering output of
+    tasks when possible so caching does not copy the output.
+    Entries older then max_age seconds since last use are removed,
+    as are the least recently used entries once the cache exceeds
+    max_size bytes
+    """
+
+    # suffix of entries still being written
+    TMP_SUFFIX = '.tmp'
+
+    def __init__(self, cachedir, max_size=None, max_age=None,
+                 version=None):
         """
         Constructor
-        :param theargs: command line arguments ie theargs.name theargs.type
+        :param cachedir: directory to store cache entries in
+        :param max_size: max size of cache in bytes, None for no limit
+        :param max_age: max time in seconds since entry was last used,
+                        None for no limit
+        :param version: str identifying runddot.py and clixo, output
+                        cached with a different version is not used
+        """
+        self._cachedir = cachedir
+        self._max_size = max_size
+        self._max_age = max_age
+        self._version = version
+
+    def _get_key(self, task):
+        """
+        Gets cache key for task
+        :param task:
+        :return: key as str or None if task lacks interaction file hash
+        """
+        digest = task.get_interactionfile_sha256()
+        if digest is None:
+            return None
+        rawkey = json.dumps([digest, str(task.get_alpha()),
+                             str(task.get_beta()), self._version])
+        return hashlib.sha256(rawkey.encode('utf-8')).hexdigest()
+
+    def get(self, task):
         """
-        pass
+        Gets cached clustering output for task
+        :param task:
+        :return: path to cached clustering output or None if not found
+        """
+        key = self._get_key(task)
+        if key is None:
+            return None
+        entry = os.path.join(self._cachedir, key)
+        if not os.path.isfile(entry):
+            return None
+        try:
+            # update modification time so entry is treated as recently used
+            os.utime(entry)
+        except OSError as e:
+            logger.debug('Unable to update time on ' + entry + ' : ' +
+                         str(e))
+        return entry
+
+    def put(self, task, clusteroutput):
+        """
+        Adds clustering output for task to cache and
+        removes any expired entries
+        :param task:
+        :param clusteroutput: path to clustering output file
+        :return: None upon success or str with error message
+        """
+        key = self._get_key(task)
+        if key is None:
+            return 'Task has no interaction file hash'
+        if clusteroutput is None or not os.path.isfile(clusteroutput):
+            return 'Clustering output not found'
+        if os.path.getsize(clusteroutput) == 0:
+            return 'Clustering output is empty'
+        try:
+            if not os.path.isdir(self._cachedir):
+                ddot_rest_server.make_shared_dirs(self._cachedir)
+            entry = os.path.join(self._cachedir, key)
+            _replace_with_link(clusteroutput, entry)
+            logger.debug('Cached clustering output as ' + entry)
+        except OSError as e:
+            logger.exception('Unable to cache clustering output')
+            return str(e)
+        self.evict()
+        return None
 
-    def _get_client(self, server, user, password, altclient=None):
+    def evict(self):
         """
-        Gets Ndex2 client
-        :return: Ndex2 python client
-        :rtype: :py:class:`~ndex2.client.Ndex2`
+        Removes entries older then max age and then removes least
+        recently used entries until cache size is under max size
+        :return: number of entries removed
         """
-        return Ndex2(server, user, password)
+        if not os.path.isdir(self._cachedir):
+            return 0
+        entries = []
+        for entry in os.listdir(self._cachedir):
+            # skip entries other workers are still writing
+            if entry.endswith(ClusterResultCache.TMP_SUFFIX):
+                continue
+            fp = os.path.join(self._cachedir, entry)
+            try:
+                st = os.stat(fp)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, fp))
+        entries.sort()
+
+        now = time.time()
+        total_size = sum([e[1] for e in entries])
+        removed = 0
+        for mtime, size, fp in entries:
+            expired = (self._max_age is not None and
+                       now - mtime > self._max_age)
+            too_big = (self._max_size is not None and
+                       total_size > self._max_size)
+            if not expired and not too_big:
+                continue
+            try:
+                os.unlink(fp)
+                total_size -= size
+                removed += 1
+                logger.debug('Removed cache entry ' + fp)
+            except OSError as e:
+                logger.error('Unable to remove cache entry ' + fp +
+                             ' : ' + str(e))
+        return removed
+
+    def invalidate(self, task):
+        """
+        Removes cached clustering output for task
+        :param task:
+        :return: True if an entry was removed otherwise False
+        """
+        key = self._get_key(task)
+        if key is None:
+            return False
+        entry = os.path.join(self._cachedir, key)
+        try:
+            os.unlink(entry)
+        except FileNotFoundError:
+            return False
+        logger.info('Removed cache entry ' + entry)
+        return True
 
-    def _remove_existing_attribute(self, attrib_name, net_attribs):
+    def clear(self):
         """
-        Removes from net_attribs any dicts whose value of 'n'
-        matches self._args.name
-        :param net_attribs: network attributes
-        :type net_attribs: list of dicts
-        :return: None
+        Removes all entries from cache
+        :return: number of entries removed
         """
-        items_to_delete = []
-        for theindex, entry in enumerate(net_attribs):
-            if entry['n'] == attrib_name:
-                items_to_delete.append(theindex)
+        if not os.path.isdir(self._cachedir):
+            return 0
+        removed = 0
+        for entry in os.listdir(self._cachedir):
+            fp = os.path.join(self._cachedir, entry)
+            try:
+                os.unlink(fp)
+                removed += 1
+            except OSError as e:
+                logger.error('Unable to remove cache entry ' + fp +
+                             ' : ' + str(e))
+        logger.info('Removed ' + str(removed) + ' cache entries')
+        return removed
 
-        items_to_delete.sort(reverse=True)
-        for theindex in items_to_delete:
-            del net_attribs[theindex]
 
-    def _remove_name_description_summary(self, net_attribs):
+class RetentionSweeper(object):
+    """
+    Removes tasks in done state that violate retention policies.
+    Tasks older then max_age seconds are removed, then the oldest
+    tasks of any ip address using more then max_ip_size bytes, then
+    the oldest tasks overall while all done tasks use more then
+    max_size bytes. At most max_deletes tasks are removed per call to
+    :py:meth:`sweep` so a large backlog never stalls task processing.
+
+    Task sizes are cached and only ip address directories whose
+    modification time changed are relisted. Files hard linked into
+    several tasks, such as interaction files in
+    :py:class:`ddot_rest_server.BlobStore`, count as their size
+    divided by number of links.
+    """
+
+    # time in seconds after which all directories are relisted
+    # and task sizes are recomputed
+    FULL_RESCAN_INTERVAL = 3600
+
+    # directories modified less then this many seconds before they
+    # were listed are relisted on next refresh
+    RACY_INTERVAL = 2
+
+    AGE_REASON = 'age'
+    IP_SIZE_REASON = 'ipquota'
+    SIZE_REASON = 'totalsize'
+
+    def __init__(self, taskdir, max_age=None, max_size=None,
+                 max_ip_size=None, max_deletes=20):
         """
-        Removes from net_attribs any dicts whose value of 'n'
-        matches self._args.name
-        :param net_attribs: network attributes
-        :type net_attribs: list of dicts
+        Constructor
+        :param taskdir: base directory containing state directories
+        :param max_age: max time in seconds since task was done,
+                        None for no limit
+        :param max_size: max total size in bytes of done tasks,
+                         None for no limit
+        :param max_ip_size: max size in bytes of done tasks for
+                            each ip address, None for no limit
+        :param max_deletes: max tasks removed per sweep
+        """
+        self._donedir = None
+        if taskdir is not None:
+            self._donedir = os.path.join(taskdir,
+                                         ddot_rest_server.DONE_STATUS)
+        self._max_age = max_age
+        self._max_size = max_size
+        self._max_ip_size = max_ip_size
+        self._max_deletes = max_deletes
+        self._tasks = {}
+        self._dirmtimes = {}
+        self._last_full_rescan = 0
+        self._stats = {RetentionSweeper.AGE_REASON: 0,
+                       RetentionSweeper.IP_SIZE_REASON: 0,
+                       RetentionSweeper.SIZE_REASON: 0,
+                       'bytes': 0}
+
+    def has_policies(self):
+        """
+        Denotes if any retention policy is set
+        :return: True if at least one policy is set otherwise False
+        """
+        return (self._max_age is not None or self._max_size is not None or
+                self._max_ip_size is not None)
+
+    def get_stats(self):
+        """
+        Gets totals of what sweeper removed since it was created
+        :return: dict with number of tasks removed for each reason
+                 and bytes freed under 'bytes'
+        """
+        return dict(self._stats)
+
+    def _get_task_entry(self, taskdir):
+        """
+        Gets time task was done, based on modification time of
+        TASK_JSON file, and size of files in task directory
+        :param taskdir: task directory
+        :return: tuple (done time, size in bytes) or None
+        """
+        try:
+            donetime = os.stat(taskdir).st_ctime
+            size = 0
+            for entry in os.listdir(taskdir):
+                st = os.stat(os.path.join(taskdir, entry))
+                if entry == ddot_rest_server.TASK_JSON:
+                    donetime = st.st_mtime
+                size += st.st_size // max(st.st_nlink, 1)
+        except OSError:
+            return None
+        return donetime, size
+
+    def _refresh(self):
+        """
+        Updates cache of done tasks, only listing ip
+        address directories that changed since last refresh
+        :return: None
+        """
+        now = time.time()
+        if now - self._last_full_rescan > self.FULL_RESCAN_INTERVAL:
+            self._dirmtimes = {}
+            self._tasks = {}
+            self._last_full_rescan = now
+
+        ipaddrs = os.listdir(self._donedir)
+        for ipaddr in set(self._tasks.keys()).difference(ipaddrs):
+            del self._tasks[ipaddr]
+        for ipaddr in ipaddrs:
+            fp = os.path.join(self._donedir, ipaddr)
+            try:
+                st = os.stat(fp)
+            except OSError:
+                continue
+            if not os.path.isdir(fp):
+                continue
+            if self._dirmtimes.get(fp) == st.st_mtime_ns:
+                continue
+            oldtasks = self._tasks.get(ipaddr, {})
+            iptasks = {}
+            for subentry in os.listdir(fp):
+                subfp = os.path.join(fp, subentry)
+                if subfp in oldtasks:
+                    iptasks[subfp] = oldtasks[subfp]
+                    continue
+                taskentry = self._get_task_entry(subfp)
+                if taskentry is not None:
+                    iptasks[subfp] = taskentry
+            self._tasks[ipaddr] = iptasks
+            if now - st.st_mtime > self.RACY_INTERVAL:
+                self._dirmtimes[fp] = st.st_mtime_ns
+            else:
+                self._dirmtimes.pop(fp, None)
+
+    def _get_tasks_to_remove(self):
+        """
+        Picks up to max_deletes tasks that violate retention policies
+        :return: list of tuples (task directory, ip address, size, reason)
+        """
+        entries = []
+        ipsizes = {}
+        for ipaddr, iptasks in self._tasks.items():
+            ipsizes[ipaddr] = 0
+            for taskdir, (donetime, size) in iptasks.items():
+                entries.append((donetime, taskdir, ipaddr, size))
+                ipsizes[ipaddr] += size
+        entries.sort()
+        totalsize = sum(ipsizes.values())
+        now = time.time()
+
+        chosen = []
+        chosendirs = set()
+
+        def choose(entry, reason):
+            chosen.append((entry[1], entry[2], entry[3], reason))
+            chosendirs.add(entry[1])
+            ipsizes[entry[2]] -= entry[3]
+            return totalsize - entry[3]
+
+        for entry in entries:
+            if self._max_age is None or now - entry[0] <= self._max_age:
+                break
+            if len(chosen) >= self._max_deletes:
+                return chosen
+            totalsize = choose(entry, RetentionSweeper.AGE_REASON)
+        if self._max_ip_size is not None:
+            for entry in entries:
+                if len(chosen) >= self._max_deletes:
+                    return chosen
+                if entry[1] not in chosendirs and\
+                        ipsizes[entry[2]] > self._max_ip_size:
+                    totalsize = choose(entry,
+                                       RetentionSweeper.IP_SIZE_REASON)
+        if self._max_size is not None:
+            for entry in entries:
+                if len(chosen) >= self._max_deletes or\
+                        totalsize <= self._max_size:
+                    return chosen
+                if entry[1] not in chosendirs:
+                    totalsize = choose(entry, RetentionSweeper.SIZE_REASON)
+        return chosen
+
+    def sweep(self):
+        """
+        Removes up to max_deletes done tasks that violate
+        retention policies
+        :return: tuple (number of tasks removed, bytes freed)
+        """
+        if not self.has_policies() or self._donedir is None or\
+                not os.path.isdir(self._donedir):
+            return 0, 0
+        self._refresh()
+        numremoved = 0
+        numbytes = 0
+        reasons = {}
+        for taskdir, ipaddr, size, reason in self._get_tasks_to_remove():
+            task = FileBasedTask(taskdir, {})
+            emsg = task.delete_task_files()
+            if emsg is not None:
+                logger.error('Retention sweeper unable to remove ' +
+                             taskdir + ' : ' + emsg)
+                continue
+            self._tasks.get(ipaddr, {}).pop(taskdir, None)
+            numremoved += 1
+            numbytes += size
+            reasons[reason] = reasons.get(reason, 0) + 1
+            self._stats[reason] += 1
+        self._stats['bytes'] += numbytes
+        if numremoved > 0:
+            logger.info('Retention sweeper removed ' + str(numremoved) +
+                        ' task(s) freeing ' + str(numbytes) + ' bytes ' +
+                        str(reasons) + ' totals since start ' +
+                        str(self._stats))
+        return numremoved, numbytes
+
+
+class NdexClientCache(object):
+    """
+    Thread safe cache of :py:class:`~ndex2.client.Ndex2` clients keyed
+    by (server, user) so tasks reuse the keep alive connections held
+    in each client's :py:class:`requests.Session`. Least recently
+    used clients are dropped once there are more then max_size and
+    clients unused for max_idle seconds are dropped on next access
+    """
+    def __init__(self, max_size=NDEX_CLIENT_CACHE_SIZE,
+                 max_idle=NDEX_CLIENT_MAX_IDLE,
+                 pool_maxsize=10):
+        """
+        Constructor
+        :param max_size: max number of clients
+        :param max_idle: time in seconds an unused client is kept
+        :param pool_maxsize: max connections kept per client, should be
+                             at least number of workers
+        """
+        self._max_size = max_size
+        self._max_idle = max_idle
+        self._pool_maxsize = pool_maxsize
+        self._clients = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def _create_client(self, server, user, password):
+        """
+        Creates client whose session retries requests failing with
+        NDEX_RETRY_STATUS codes or connection errors with exponential
+        backoff. After the last retry the failed response is returned
+        :return: Ndex2 python client
+        :rtype: :py:class:`~ndex2.client.Ndex2`
+        """
+        client = Ndex2(server, user, password)
+        retry = Retry(total=NDEX_RETRIES, backoff_factor=NDEX_RETRY_BACKOFF,
+                      status_forcelist=NDEX_RETRY_STATUS,
+                      raise_on_status=False)
+        adapter = HTTPAdapter(pool_maxsize=self._pool_maxsize,
+                              max_retries=retry)
+        client.s.mount('http://', adapter)
+        client.s.mount('https://', adapter)
+        return client
+
+    def _close_client(self, client):
+        """
+        Closes connections held by client
+        :return: None
+        """
+        try:
+            client.s.close()
+        except Exception as e:
+            logger.debug('Error closing NDEx client: ' + str(e))
+
+    def get_client(self, server, user, password):
+        """
+        Gets cached client for server and user creating one if none
+        exists or password differs from that of cached client
+        :return: Ndex2 python client
+        :rtype: :py:class:`~ndex2.client.Ndex2`
+        """
+        key = (server, user)
+        now = time.time()
+        with self._lock:
+            for ckey in list(self._clients.keys()):
+                if now - self._clients[ckey][2] > self._max_idle:
+                    logger.debug('Dropping idle NDEx client: ' + str(ckey))
+                    self._close_client(self._clients.pop(ckey)[0])
+            entry = self._clients.get(key)
+            if entry is not None and entry[1] == password:
+                entry[2] = now
+                self._clients.move_to_end(key)
+                return entry[0]
+            if entry is not None:
+                self._close_client(self._clients.pop(key)[0])
+            client = self._create_client(server, user, password)
+            self._clients[key] = [client, password, now]
+            while len(self._clients) > self._max_size:
+                self._close_client(self._clients.popitem(last=False)[1][0])
+            return client
+
+    def close(self):
+        """
+        Closes and drops all clients
+        :return: None
+        """
+        with self._lock:
+            while len(self._clients) > 0:
+                self._close_client(self._clients.popitem()[1][0])
+
+
+class NetworkAttributeSetter(object):
+    """
+    Sets network attributes on a network in NDEx
+    """
+
+    def __init__(self, clientcache=None):
+        """
+        Constructor
+        :param clientcache: :py:class:`NdexClientCache` to get clients
+                            from, if None one is created
+        """
+        if clientcache is None:
+            clientcache = NdexClientCache()
+        self._clientcache = clientcache
+
+    def _get_client(self, server, user, password, altclient=None):
+        """
+        Gets Ndex2 client from cache
+        :return: Ndex2 python client
+        :rtype: :py:class:`~ndex2.client.Ndex2`
+        """
+        return self._clientcache.get_client(server, user, password)
+
+    def _remove_existing_attribute(self, attrib_name, net_attribs):
+        """
+        Removes from net_attribs any dicts whose value of 'n'
+        matches self._args.name
+        :param net_attribs: network attributes
+        :type net_attribs: list of dicts
+        :return: None
+        """
+        items_to_delete = []
+        for theindex, entry in enumerate(net_attribs):
+            if entry['n'] == attrib_name:
+                items_to_delete.append(theindex)
+
+        items_to_delete.sort(reverse=True)
+        for theindex in items_to_delete:
+            del net_attribs[theindex]
+
+    def _remove_name_description_summary(self, net_attribs):
+        """
+        Removes from net_attribs any dicts whose value of 'n'
+        matches self._args.name
+        :param net_attribs: network attributes
+        :type net_attribs: list of dicts
         :return: None
         """
         excludelist = ['name', 'description', 'version']
@@ -688,6 +2024,804 @@ class NetworkAttributeSetter(object):
         return res
 
 
+class ResourceLimits(object):
+    """
+    Limits on resources runddot.py can use for a task. A
+    limit of None means no limit
+    """
+    def __init__(self, timeout=None, memory=None, cpus=None):
+        """
+        Constructor
+        :param timeout: max wall clock time in seconds
+        :param memory: max memory in bytes
+        :param cpus: max number of CPUs, can be fractional
+        """
+        self._timeout = timeout
+        self._memory = memory
+        self._cpus = cpus
+
+    def get_timeout(self):
+        """
+        Gets max wall clock time
+        :return: time in seconds or None
+        """
+        return self._timeout
+
+    def has_limits(self):
+        """
+        Denotes if any limit is set
+        :return: True if a limit is set otherwise False
+        """
+        return (self._timeout is not None or self._memory is not None or
+                self._cpus is not None)
+
+    def get_docker_args(self):
+        """
+        Gets docker run flags enforcing memory and CPU limits. If a
+        timeout is set, --init is added so SIGTERM sent to docker on
+        timeout is passed on to runddot.py
+        :return: list of flags
+        """
+        args = []
+        if self._timeout is not None:
+            args.append('--init')
+        if self._memory is not None:
+            args.extend(['--memory', str(self._memory)])
+        if self._cpus is not None:
+            args.extend(['--cpus', str(self._cpus)])
+        return args
+
+    def set_rlimits(self, pid):
+        """
+        Sets rlimits on process with pid via prlimit, meant to be
+        called right after runddot.py is started since setting them
+        in the child before exec is unsafe in a process with threads.
+        Processes started by runddot.py, such as clixo, inherit the
+        limits. Memory limits address space size. There is no rlimit
+        equivalent of a CPU quota so if a timeout is also set, CPU
+        time is capped at timeout * cpus
+        :param pid: id of process to limit
+        :return: None
+        """
+        if self._memory is not None:
+            resource.prlimit(pid, resource.RLIMIT_AS,
+                             (self._memory, self._memory))
+        if self._cpus is not None and self._timeout is not None:
+            cputime = max(1, int(self._timeout * self._cpus))
+            resource.prlimit(pid, resource.RLIMIT_CPU, (cputime, cputime))
+
+
+def _get_timeout_message(timeout):
+    """
+    Gets error message for task that exceeded time limit
+    :param timeout: time limit in seconds
+    :return: str
+    """
+    return 'Task exceeded time limit of ' + str(timeout) + ' seconds'
+
+
+def _terminate_process_group(p, grace=None):
+    """
+    Sends SIGTERM to process group of p and SIGKILL if it has not
+    exited after grace seconds. p must have been started with
+    start_new_session=True
+    :param p: :py:class:`subprocess.Popen`
+    :param grace: time in seconds to wait before SIGKILL, if None
+                  TIMEOUT_KILL_GRACE is used
+    :return: None
+    """
+    if grace is None:
+        grace = TIMEOUT_KILL_GRACE
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        try:
+            os.killpg(p.pid, sig)
+        except OSError as e:
+            logger.debug('Unable to signal ' + str(p.pid) + ': ' + str(e))
+            return
+        try:
+            p.wait(timeout=grace)
+            return
+        except subprocess.TimeoutExpired:
+            logger.info('Process ' + str(p.pid) + ' ignored signal ' +
+                        str(sig))
+
+
+def _start_timeout_timer(p, timeout, on_timeout=None):
+    """
+    Starts timer that calls :py:func:`_terminate_process_group`
+    on p after timeout seconds. The returned timer has a timedout
+    attribute, a :py:class:`threading.Event` set if the timer fired
+    :param p: :py:class:`subprocess.Popen`
+    :param timeout: time in seconds, if None no timer is started
+    :param on_timeout: function called with no arguments before p is
+                       signalled, for work that signalling p does not
+                       stop, or None
+    :return: :py:class:`threading.Timer` or None
+    """
+    if timeout is None:
+        return None
+    timedout = threading.Event()
+
+    def _on_timeout():
+        logger.info('Process ' + str(p.pid) + ' exceeded time limit of ' +
+                    str(timeout) + ' seconds')
+        timedout.set()
+        if on_timeout is not None:
+            try:
+                on_timeout()
+            except Exception:
+                logger.exception('Caught exception handling timeout of ' +
+                                 str(p.pid))
+        _terminate_process_group(p)
+
+    timer = threading.Timer(timeout, _on_timeout)
+    timer.timedout = timedout
+    timer.daemon = True
+    timer.start()
+    return timer
+
+
+class WarmDDotContainer(object):
+    """
+    Long running docker container running runddot.py in
+    worker mode. Jobs are sent as json lines to standard input
+    and output of each job is read from standard output until the
+    DONE:<job id> line written by runddot.py. Standard error of the
+    container is written to the log at debug level
+    """
+    DONE_PREFIX = 'DONE:'
+
+    def __init__(self, cmd):
+        """
+        Constructor
+        :param cmd: command to run container as list
+        """
+        self._cmd = cmd
+        self._proc = None
+        self._jobcounter = 0
+
+    def start(self):
+        """
+        Starts container
+        :return: None
+        """
+        logger.info('Starting warm container: ' + ' '.join(self._cmd))
+        self._proc = subprocess.Popen(self._cmd,
+                                      stdin=subprocess.PIPE,
+                                      stdout=subprocess.PIPE,
+                                      stderr=subprocess.PIPE,
+                                      start_new_session=True)
+        errthread = threading.Thread(target=self._log_stderr,
+                                     args=(self._proc.stderr,),
+                                     name='warmcontainer-stderr')
+        errthread.daemon = True
+        errthread.start()
+
+    def _log_stderr(self, stderr):
+        """
+        Logs lines from standard error until it is closed
+        :param stderr: standard error of container process
+        :return: None
+        """
+        for line in iter(stderr.readline, b''):
+            logger.debug('warm container: ' +
+                         line.decode('utf-8', 'replace').rstrip())
+
+    def is_alive(self):
+        """
+        Denotes if container is running
+        :return: True if running otherwise False
+        """
+        return self._proc is not None and self._proc.poll() is None
+
+    def run_job(self, args, timeout=None):
+        """
+        Runs job in container
+        :param args: arguments to pass to runddot.py as list
+        :param timeout: if set, container is stopped if job does not
+                        complete within this many seconds
+        :raises TimeoutError: if job exceeded timeout
+        :raises OSError: if container exits before job completes
+        :return: tuple (exit code, standard output, standard error)
+                 standard error is always empty since it is logged
+        """
+        self._jobcounter += 1
+        jobid = str(self._jobcounter)
+        self._proc.stdin.write((json.dumps({'id': jobid, 'args': args}) +
+                                '\n').encode('utf-8'))
+        self._proc.stdin.flush()
+        sentinel = (WarmDDotContainer.DONE_PREFIX + jobid +
+                    '\n').encode('utf-8')
+        timer = _start_timeout_timer(self._proc, timeout)
+        out = []
+        try:
+            for line in iter(self._proc.stdout.readline, b''):
+                if line == sentinel:
+                    return 0, b''.join(out), b''
+                out.append(line)
+        finally:
+            if timer is not None:
+                timer.cancel()
+        if timer is not None and timer.timedout.is_set():
+            raise TimeoutError(_get_timeout_message(timeout))
+        raise OSError('Warm container exited with code ' +
+                      str(self._proc.wait()) + ' while running job')
+
+    def stop(self, timeout=30):
+        """
+        Stops container by closing its standard input
+        and killing it if it does not exit within timeout
+        :param timeout: time in seconds to wait for container to exit
+        :return: None
+        """
+        if self._proc is None:
+            return
+        try:
+            self._proc.stdin.close()
+            self._proc.wait(timeout=timeout)
+        except (OSError, ValueError, subprocess.TimeoutExpired):
+            logger.info('Killing warm container')
+            self._proc.kill()
+            self._proc.wait()
+        self._proc.stdout.close()
+
+
+class WarmContainerPool(object):
+    """
+    Pool of up to size :py:class:`WarmDDotContainer` objects.
+    Containers are started when first needed and restarted if they
+    exit. Callers block if all containers are busy
+    """
+    def __init__(self, cmd, size):
+        """
+        Constructor
+        :param cmd: command to run container as list
+        :param size: max number of containers
+        """
+        self._cmd = cmd
+        self._size = size
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._containers = []
+
+    def _acquire(self):
+        """
+        Gets an idle container starting a new one if
+        pool is not at capacity
+        :return: container
+        """
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if len(self._containers) < self._size:
+                container = WarmDDotContainer(self._cmd)
+                self._containers.append(container)
+                return container
+        return self._idle.get()
+
+    def run_job(self, args, timeout=None):
+        """
+        Runs job on a container from the pool
+        :param args: arguments to pass to runddot.py as list
+        :param timeout: max time in seconds for job or None for no limit
+        :raises TimeoutError: if job exceeded timeout
+        :raises OSError: if container fails while running job
+        :return: tuple (exit code, standard output, standard error)
+        """
+        container = self._acquire()
+        try:
+            if not container.is_alive():
+                container.start()
+            return container.run_job(args, timeout=timeout)
+        except (OSError, ValueError):
+            logger.exception('Warm container failed, it will be '
+                             'restarted on next use')
+            container.stop()
+            raise
+        finally:
+            self._idle.put(container)
+
+    def close(self):
+        """
+        Stops all containers
+        :return: None
+        """
+        with self._lock:
+            for container in self._containers:
+                container.stop()
+            self._containers = []
+
+
+class RunddotOutputParser(object):
+    """
+    Parses standard output of runddot.py a line at a time as it
+    arrives keeping only the first RESULT: or ERROR: line
+    """
+    def __init__(self):
+        """
+        Constructor
+        """
+        self._result = None
+        self._error = None
+        self._usage = None
+        self._clustered = False
+
+    def add_line(self, line):
+        """
+        Parses line of output
+        :param line: line of standard output as str
+        :return: None
+        """
+        if self._result is not None or self._error is not None:
+            return
+        line = line.rstrip('\r\n')
+        if line.startswith(USAGE_PREFIX):
+            try:
+                self._usage = json.loads(line[len(USAGE_PREFIX):])
+            except ValueError as e:
+                logger.info('Unable to parse resource usage: ' + str(e))
+        elif line.startswith(RESULT_PREFIX):
+            self._result = line[len(RESULT_PREFIX):]
+        elif line.startswith(ERROR_PREFIX):
+            self._error = line[len(ERROR_PREFIX):]
+        elif line.startswith(CLUSTERED_PREFIX):
+            self._result = line[len(CLUSTERED_PREFIX):]
+            self._clustered = True
+
+    def get_result(self, p_exit, stderr_tail=''):
+        """
+        Gets result once runddot.py has exited
+        :param p_exit: exit code
+        :param stderr_tail: end of standard error as str, used in
+                            error message if no result was seen
+        :return: tuple ({NDEXURL_KEY: url}, None) if successful, ({}, None)
+                 if runddot.py was run with --clusteronly, otherwise
+                 ({}, 'str containing error message'). If runddot.py
+                 wrote a USAGE: line, it is in the dict under
+                 RESOURCE_USAGE_PARAM
+        """
+        logger.debug('Exit code: ' + str(p_exit))
+        res = {}
+        if self._usage is not None:
+            res[ddot_rest_server.RESOURCE_USAGE_PARAM] = self._usage
+        if p_exit != 0 and self._error is None:
+            # a result is only trusted from a run that exited cleanly
+            emsg = 'runddot.py exited with code ' + str(p_exit)
+            if self._result is None:
+                emsg += ' without a result'
+            if stderr_tail is not None and len(stderr_tail.strip()) > 0:
+                emsg += ': ' + stderr_tail.strip()[-STDERR_TAIL_LEN:]
+            return res, emsg
+        if self._clustered is True:
+            return res, None
+        if self._result is not None:
+            res[ddot_rest_server.NDEXURL_KEY] = self._result
+            return res, None
+        if self._error is not None:
+            return res, self._error
+        emsg = 'runddot.py exited with code 0 without a result'
+        if stderr_tail is not None and len(stderr_tail.strip()) > 0:
+            emsg += ': ' + stderr_tail.strip()[-STDERR_TAIL_LEN:]
+        return res, emsg
+
+
+class StreamTail(object):
+    """
+    Reads lines from a stream in a separate thread, logging
+    them at debug level and keeping only the last maxlines
+    """
+    def __init__(self, stream, maxlines=STDERR_TAIL_LINES):
+        """
+        Constructor, starts reading immediately
+        :param stream: binary stream to read
+        :param maxlines: number of lines to keep
+        """
+        self._lines = collections.deque(maxlen=maxlines)
+        self._thread = threading.Thread(target=self._read, args=(stream,),
+                                        name='stream-tail')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _read(self, stream):
+        """
+        Reads stream until it is closed
+        :param stream: binary stream to read
+        :return: None
+        """
+        for line in iter(lambda: stream.readline(MAX_LINE_LEN), b''):
+            decoded = line.decode('utf-8', 'replace').rstrip()
+            logger.debug('Standard error: ' + decoded)
+            self._lines.append(decoded)
+        stream.close()
+
+    def get_tail(self, timeout=None):
+        """
+        Waits for stream to be closed and gets last lines read
+        :param timeout: time in seconds to wait for stream to be closed
+        :return: lines joined with newline
+        """
+        self._thread.join(timeout)
+        return '\n'.join(self._lines)
+
+
+def _parse_runddot_output(p_exit, p_out, p_err):
+    """
+    Parses output of runddot.py looking for RESULT: or ERROR: line
+    :param p_exit: exit code
+    :param p_out: standard output as bytes
+    :param p_err: standard error as bytes
+    :return: tuple ({NDEXURL_KEY: url}, None) if successful otherwise
+             ({}, 'str containing error message')
+    """
+    parser = RunddotOutputParser()
+    for line in p_out.decode('utf-8', 'replace').split('\n'):
+        parser.add_line(line)
+    return parser.get_result(p_exit, p_err.decode('utf-8', 'replace'))
+
+
+class DDotExecutor(object):
+    """
+    Base class for backends that run runddot.py for a task
+    """
+    def __init__(self, limits=None):
+        """
+        Constructor
+        :param limits: :py:class:`ResourceLimits` or None for no limits
+        """
+        if limits is None:
+            limits = ResourceLimits()
+        self._limits = limits
+
+    def run(self, task, args):
+        """
+        Runs runddot.py
+        :param task: task being processed
+        :param args: arguments for runddot.py as list
+        :return: tuple ({NDEXURL_KEY: url}, None) if successful
+                 otherwise ({}, 'str containing error message'). Resource
+                 usage, if known, is in the dict under RESOURCE_USAGE_PARAM
+        """
+        raise NotImplementedError('subclasses must implement run')
+
+    def close(self):
+        """
+        Releases any resources held by executor
+        :return: None
+        """
+        pass
+
+
+class CommandExecutor(DDotExecutor):
+    """
+    Base class for executors that run runddot.py in a separate
+    process and parse its standard output
+    """
+    def run_cmd(self, cmd_to_run, timeout=None, on_timeout=None):
+        """
+        Runs command parsing its standard output as it arrives. Only
+        the last lines of standard error are kept so memory use does
+        not grow with output size. The command is run in a new session
+        so on timeout it and any children can be signalled
+        :param cmd_to_run: command to run as list
+        :param timeout: max time in seconds to let command run or None
+                        for no limit
+        :param on_timeout: function called with no arguments on timeout
+                           before command is signalled or None
+        :return: tuple ({NDEXURL_KEY: url}, None) if successful
+                 otherwise ({}, 'str containing error message')
+        """
+        logger.info('Running command: ' + str(' '.join(cmd_to_run)))
+        p = subprocess.Popen(cmd_to_run,
+                             stdout=subprocess.PIPE,
+                             stderr=subprocess.PIPE,
+                             start_new_session=True)
+        try:
+            self.apply_limits(p.pid)
+        except Exception as e:
+            logger.exception('Unable to set limits on ' + str(p.pid))
+            _terminate_process_group(p)
+            p.stdout.close()
+            p.stderr.close()
+            return {}, 'Unable to set resource limits: ' + str(e)
+        timer = _start_timeout_timer(p, timeout, on_timeout=on_timeout)
+        try:
+            errtail = StreamTail(p.stderr)
+            parser = RunddotOutputParser()
+            with p.stdout:
+                for line in iter(lambda: p.stdout.readline(MAX_LINE_LEN),
+                                 b''):
+                    decoded = line.decode('utf-8', 'replace')
+                    logger.debug('Standard output: ' + decoded.rstrip())
+                    parser.add_line(decoded)
+            p_exit = p.wait()
+        finally:
+            if timer is not None:
+                timer.cancel()
+        res, emsg = parser.get_result(p_exit, errtail.get_tail())
+        if timer is not None and timer.timedout.is_set():
+            return res, _get_timeout_message(timeout)
+        return res, emsg
+
+    def apply_limits(self, pid):
+        """
+        Applies resource limits to command just started
+        :param pid: id of process running command
+        :return: None
+        """
+        pass
+
+    def get_cmd(self, task, args):
+        """
+        Gets command to run
+        :param task: task being processed
+        :param args: arguments for runddot.py as list
+        :return: command as list
+        """
+        raise NotImplementedError('subclasses must implement get_cmd')
+
+    def run(self, task, args):
+        """
+        Runs command from :py:meth:`get_cmd` and parses
+        its output
+        """
+        return self.run_cmd(self.get_cmd(task, args),
+                            timeout=self._limits.get_timeout())
+
+
+class DockerExecutor(CommandExecutor):
+    """
+    Runs runddot.py in a new docker container for each task
+    """
+    def __init__(self, docker, dockerimagename, runddotpath, limits=None):
+        """
+        Constructor
+        :param docker: path to docker
+        :param dockerimagename: docker image with ddot installed
+        :param runddotpath: path to runddot.py
+        :param limits: :py:class:`ResourceLimits` enforced via docker
+        """
+        super(DockerExecutor, self).__init__(limits=limits)
+        self.docker = docker
+        self.dockerimagename = dockerimagename
+        self.runddotpath = runddotpath
+
+    def get_container_name(self, task):
+        """
+        Gets name of container running task
+        :param task: task being processed
+        :return: container name as str
+        """
+        return 'ddot_' + str(task.get_task_uuid())
+
+    def get_cmd(self, task, args):
+        """
+        Gets docker command that mounts the task directory and the
+        directory holding runddot.py. The container is named
+        after the task so it can be killed on timeout and is
+        removed when it exits
+        """
+        runddot_dir = os.path.dirname(self.runddotpath)
+        cmd = [self.docker, 'run', '--rm', '--name',
+               self.get_container_name(task)]
+        cmd.extend(self._limits.get_docker_args())
+        cmd.extend(['-v',
+                    task.get_taskdir() + ':' + task.get_taskdir(),
+                    '-v',
+                    runddot_dir + ':' + runddot_dir + ':ro',
+                    self.dockerimagename,
+                    self.runddotpath])
+        cmd.extend(args)
+        return cmd
+
+    def kill_container(self, task):
+        """
+        Kills container running task. Signalling the docker client
+        does not stop the container so this is done on timeout
+        :param task: task being processed
+        :return: None upon success or str with error message
+        """
+        name = self.get_container_name(task)
+        logger.info('Killing container ' + name)
+        try:
+            p = subprocess.run([self.docker, 'kill', name],
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               timeout=60)
+        except (OSError, subprocess.SubprocessError) as e:
+            return 'Unable to kill container ' + name + ' : ' + str(e)
+        if p.returncode != 0:
+            return ('Unable to kill container ' + name + ' : ' +
+                    p.stderr.decode('utf-8', 'replace').strip())
+        return None
+
+    def run(self, task, args):
+        """
+        Runs command from :py:meth:`get_cmd` killing
+        the container if it exceeds the time limit
+        """
+        def _kill():
+            emsg = self.kill_container(task)
+            if emsg is not None:
+                logger.error(emsg)
+        return self.run_cmd(self.get_cmd(task, args),
+                            timeout=self._limits.get_timeout(),
+                            on_timeout=_kill)
+
+
+class WarmDockerExecutor(DDotExecutor):
+    """
+    Runs runddot.py jobs on a :py:class:`WarmContainerPool`
+    """
+    def __init__(self, docker, dockerimagename, runddotpath, size,
+                 limits=None):
+        """
+        Constructor
+        :param docker: path to docker
+        :param dockerimagename: docker image with ddot installed
+        :param runddotpath: path to runddot.py
+        :param size: max number of containers
+        :param limits: :py:class:`ResourceLimits`, memory and CPU limits
+                       apply to each container as a whole
+        """
+        super(WarmDockerExecutor, self).__init__(limits=limits)
+        self.docker = docker
+        self.dockerimagename = dockerimagename
+        self.runddotpath = runddotpath
+        self._pool = WarmContainerPool(self.get_container_cmd(), size)
+
+    def get_container_cmd(self):
+        """
+        Gets command to run a container running runddot.py in worker
+        mode. Unlike a per task container, the whole directory holding
+        runddot.py and the tasks is mounted
+        :return: command as list
+        """
+        runddot_dir = os.path.dirname(self.runddotpath)
+        cmd = [self.docker, 'run', '-i', '--rm']
+        cmd.extend(self._limits.get_docker_args())
+        cmd.extend(['-v', runddot_dir + ':' + runddot_dir,
+                    self.dockerimagename,
+                    self.runddotpath, '--worker'])
+        return cmd
+
+    def run(self, task, args):
+        """
+        Runs job on warm container
+        """
+        logger.info('Running job on warm container: ' +
+                    str(' '.join(args)))
+        return _parse_runddot_output(*self._pool.run_job(
+            args, timeout=self._limits.get_timeout()))
+
+    def close(self):
+        """
+        Stops containers
+        :return: None
+        """
+        self._pool.close()
+
+
+class LocalExecutor(CommandExecutor):
+    """
+    Runs runddot.py as a subprocess on this host which
+    must have ddot, pandas, and clixo installed
+    """
+    def __init__(self, runddotpath, python=sys.executable, clixopath=None,
+                 limits=None):
+        """
+        Constructor
+        :param runddotpath: path to runddot.py
+        :param python: python used to run runddot.py
+        :param clixopath: path to clixo, if None runddot.py default is used
+        :param limits: :py:class:`ResourceLimits` enforced via rlimits
+        """
+        super(LocalExecutor, self).__init__(limits=limits)
+        self.runddotpath = runddotpath
+        self._python = python
+        self._clixopath = clixopath
+
+    def get_cmd(self, task, args):
+        """
+        Gets command running runddot.py with python
+        """
+        cmd = [self._python, self.runddotpath]
+        if self._clixopath is not None:
+            cmd.extend(['--clixopath', self._clixopath])
+        cmd.extend(args)
+        return cmd
+
+    def apply_limits(self, pid):
+        """
+        Sets rlimits for limits passed to constructor on process
+        :param pid: id of process running command
+        :return: None
+        """
+        if self._limits.has_limits():
+            self._limits.set_rlimits(pid)
+
+
+class InProcessExecutor(DDotExecutor):
+    """
+    Imports runddot.py and calls its get_ddot_result() function
+    directly. This host must have ddot, pandas, and clixo installed
+    """
+    def __init__(self, runddotpath, clixopath=None, limits=None):
+        """
+        Constructor
+        :param runddotpath: path to runddot.py
+        :param clixopath: path to clixo, if None runddot.py default is used
+        :param limits: ignored since a task running in this process
+                       cannot be limited or stopped, a warning is logged
+                       if any limit is set
+        """
+        super(InProcessExecutor, self).__init__(limits=limits)
+        if self._limits.has_limits():
+            logger.warning('Resource limits are not enforced by in '
+                           'process executor')
+        self.runddotpath = runddotpath
+        self._clixopath = clixopath
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _get_module(self):
+        """
+        Imports runddot.py the first time it is needed
+        :return: runddot module
+        """
+        with self._lock:
+            if self._module is None:
+                spec = importlib.util.spec_from_file_location('runddot',
+                                                              self.runddotpath)
+                module = importlib.util.module_from_spec(spec)
+                spec.loader.exec_module(module)
+                self._module = module
+            return self._module
+
+    def run(self, task, args):
+        """
+        Runs runddot.get_ddot_result() in this process
+        """
+        fullargs = []
+        if self._clixopath is not None:
+            fullargs.extend(['--clixopath', self._clixopath])
+        fullargs.extend(args)
+        logger.info('Running runddot in process: ' + str(' '.join(fullargs)))
+        try:
+            runddot = self._get_module()
+            theargs = runddot._parse_arguments('runddot', fullargs)
+        except SystemExit as se:
+            return {}, 'Invalid arguments for runddot: ' + str(se)
+        except Exception as e:
+            logger.exception('Unable to load ' + str(self.runddotpath))
+            return {}, 'Unable to load runddot: ' + str(e)
+        start = self._get_cputime()
+        ndexurl, emsg = runddot.get_ddot_result(theargs)
+        # peak resident set size is left out since for this long
+        # running process it is not specific to the task
+        res = {ddot_rest_server.RESOURCE_USAGE_PARAM: {
+            ddot_rest_server.CPUTIME_KEY: round(self._get_cputime() -
+                                                start, 3)}}
+        if emsg is not None:
+            return res, emsg
+        if ndexurl is not None:
+            res[ddot_rest_server.NDEXURL_KEY] = ndexurl
+        return res, None
+
+    def _get_cputime(self):
+        """
+        Gets CPU time of calling thread, if supported, otherwise
+        this process, plus that of waited for children. With multiple
+        workers, children of other tasks can be counted
+        :return: time in seconds
+        """
+        who = getattr(resource, 'RUSAGE_THREAD', resource.RUSAGE_SELF)
+        ru = resource.getrusage(who)
+        childru = resource.getrusage(resource.RUSAGE_CHILDREN)
+        return (ru.ru_utime + ru.ru_stime +
+                childru.ru_utime + childru.ru_stime)
+
+
 class DDotTaskRunner(object):
     """
     Runs tasks created by DDOT REST service
@@ -698,14 +2832,47 @@ class DDotTaskRunner(object):
                  docker=None,
                  dockerimagename=None,
                  runddotpath=None,
-                 netattribsetter=None):
+                 netattribsetter=None,
+                 clustercache=None,
+                 workers=1,
+                 reclaimer=None,
+                 watchpaths=None,
+                 warmcontainers=0,
+                 executor=None,
+                 uploadtaskfactory=None,
+                 uploadworkers=0,
+                 compressdone=False,
+                 sweeper=None,
+                 sweep_interval=60,
+                 delete_batch_size=50):
         self._taskfactory = taskfactory
+        self._delete_batch_size = max(delete_batch_size, 1)
+        self._sweeper = sweeper
+        self._sweep_interval = sweep_interval
+        self._last_sweep_time = 0
+        self._compressdone = compressdone
+        self._uploadtaskfactory = uploadtaskfactory
+        self._uploadworkers = uploadworkers
+        self._upload_event = threading.Event()
+        self._upload_stop_event = threading.Event()
+        self._upload_thread = None
+        self._watchpaths = watchpaths
+        self._watcher = None
+        self._workers = workers
+        self._reclaimer = reclaimer
+        self._last_reclaim_time = 0
+        self._clustercache = clustercache
         self._wait_time = wait_time
         self._deletetaskfactory = deletetaskfactory
         self._netattribsetter = netattribsetter
-        self.docker = docker
-        self.dockerimagename = dockerimagename
-        self.runddotpath = runddotpath
+        if executor is None:
+            if warmcontainers > 0:
+                executor = WarmDockerExecutor(docker, dockerimagename,
+                                              runddotpath, warmcontainers)
+            else:
+                executor = DockerExecutor(docker, dockerimagename,
+                                          runddotpath)
+        self._executor = executor
 
     def _process_task(self, task, delete_temp_files=True):
         """
@@ -714,10 +2881,35 @@ class DDotTaskRunner(object):
         :return:
         """
         logger.info('Task dir: ' + task.get_taskdir())
-        task.move_task(ddot_rest_server.PROCESSING_STATUS)
-
-        result, emsg = self._run_ddot(task)
+        emsg = task.move_task(ddot_rest_server.PROCESSING_STATUS)
+        if emsg is not None:
+            logger.info('Unable to claim task, skipping: ' + str(emsg))
+            return
 
+        with TaskLeaseHeartbeat(task, self._get_heartbeat_interval()):
+            if self._is_upload_separate():
+                result, emsg = self._run_clustering(task)
+            else:
+                result, emsg = self._run_ddot(task)
+
+        if emsg is None and self._is_upload_separate():
+            logger.info('Task clustering completed')
+            task.save_task()
+            emsg = task.move_task(ddot_rest_server.CLUSTERED_STATUS)
+            if emsg is not None:
+                logger.error('Unable to move task to clustered: ' + emsg)
+            self._upload_event.set()
+            return
+        self._finish_task(task, result, emsg)
+
+    def _finish_task(self, task, result, emsg):
+        """
+        Saves result of task and moves it to done or error state
+        :param task: task
+        :param result: result data
+        :param emsg: error message or None if task was successful
+        :return: None
+        """
         if emsg is not None:
             logger.error('Task had error: ' + emsg)
         else:
@@ -729,10 +2921,86 @@ class DDotTaskRunner(object):
             status = ddot_rest_server.ERROR_STATUS
         else:
             status = ddot_rest_server.DONE_STATUS
-        task.move_task(status,
-                       error_message=emsg)
+        if task.move_task(status,
+                          error_message=emsg) is None and\
+                self._compressdone is True:
+            cmsg = task.compress_task_files()
+            if cmsg is not None:
+                logger.error('Unable to compress task files: ' + cmsg)
         return
 
+    def _wait_for_work(self):
+        """
+        Waits up to wait time seconds for new work. If watch
+        paths were set the wait ends as soon as one of them changes
+        :return: None
+        """
+        if self._watchpaths is None:
+            time.sleep(self._wait_time)
+            return
+        if self._watcher is None:
+            self._watcher = FileSystemWatcher()
+        # paths may not exist until first task or
+        # delete request is created so retry each time
+        for path in self._watchpaths:
+            self._watcher.add_watch(path)
+        self._watcher.wait(self._wait_time)
+
+    def _close_watcher(self):
+        """
+        Closes filesystem watcher
+        :return: None
+        """
+        if self._watcher is not None:
+            self._watcher.close()
+            self._watcher = None
+
+    def _get_heartbeat_interval(self):
+        """
+        Gets time in seconds between lease renewals which is a
+        quarter of the lease time
+        :return: interval or None if leases are not used
+        """
+        if self._reclaimer is None:
+            return None
+        return self._reclaimer.get_lease_time() / 4.0
+
+    def _reclaim_abandoned_tasks(self):
+        """
+        Reclaims abandoned tasks, but no more often then
+        every half lease time
+        :return: number of tasks reclaimed
+        """
+        if self._reclaimer is None:
+            return 0
+        now = time.time()
+        if now - self._last_reclaim_time < self._reclaimer.get_lease_time() / 2.0:
+            return 0
+        self._last_reclaim_time = now
+        try:
+            return self._reclaimer.reclaim_tasks()
+        except Exception:
+            logger.exception('Caught exception reclaiming abandoned tasks')
+            return 0
+
+    def _sweep_done_tasks(self):
+        """
+        Removes done tasks violating retention policies, but no
+        more often then every sweep interval seconds
+        :return: number of tasks removed
+        """
+        if self._sweeper is None:
+            return 0
+        now = time.time()
+        if now - self._last_sweep_time < self._sweep_interval:
+            return 0
+        self._last_sweep_time = now
+        try:
+            return self._sweeper.sweep()[0]
+        except Exception:
+            logger.exception('Caught exception removing expired tasks')
+            return 0
+
     def _get_uuid_of_network(self, ndexurl):
         """
 
@@ -756,18 +3024,127 @@ class DDotTaskRunner(object):
         splitlink = ndexurl.split('/#/network/')
         return task.get_hiviewurl() + '/' + splitlink[1] + '?type=test&server=' + splitlink[0]
 
-    def run_dockercmd(self, cmd_to_run):
+    def _get_ddot_args(self, task, clusterargs):
         """
-        Runs docker
-        :param cmd_to_run: command to run as list
-        :return:
+        Gets arguments for runddot.py
+        :param task: The task to process
+        :param clusterargs: arguments denoting where clustering
+                            output is read from or written to
+        :return: list of arguments
+        """
+        ddotargs = ['--alpha', str(task.get_alpha()),
+                    '--beta', str(task.get_beta()),
+                    '--ndexname', str(task.get_ndexname()),
+                    '--ndexserver', str(task.get_ndexserver()),
+                    '--ndexuser', str(task.get_ndexuser()),
+                    '--ndexpass', str(task.get_ndexpass())]
+        ddotargs.extend(clusterargs)
+        ddotargs.append(task.get_interactionfile())
+        return ddotargs
+
+    def _run_executor(self, task, ddotargs, addusage=False):
+        """
+        Runs runddot.py via executor recording resource usage in task
+        :param task: The task to process
+        :param ddotargs: arguments for runddot.py
+        :param addusage: If True, resource usage is added to usage
+                         already in task, such as from clustering stage
+        :return: tuple (dict of result, None) or
+                 (dict, 'str containing error message')
         """
-        p = subprocess.Popen(cmd_to_run,
-                             stdout=subprocess.PIPE,
-                             stderr=subprocess.PIPE)
+        start = time.time()
+        try:
+            self._link_batch_parsed_input(task)
+        except Exception:
+            logger.exception('Caught exception looking for parsed '
+                             'interaction file from batch')
+        try:
+            res_json, emsg = self._executor.run(task, ddotargs)
+        except Exception as e:
+            logger.exception('Caught exception running runddot')
+            res_json, emsg = {}, str(e)
+        usage = res_json.pop(ddot_rest_server.RESOURCE_USAGE_PARAM, {})
+        usage[ddot_rest_server.WALLTIME_KEY] = round(time.time() - start,
+                                                     3)
+        if addusage is True:
+            prev = task.get_taskdict().get(ddot_rest_server.
+                                           RESOURCE_USAGE_PARAM)
+            if isinstance(prev, dict):
+                for key in [ddot_rest_server.WALLTIME_KEY,
+                            ddot_rest_server.CPUTIME_KEY]:
+                    if key in prev and key in usage:
+                        usage[key] = round(usage[key] + prev[key], 3)
+                if ddot_rest_server.MAXRSS_KEY in prev:
+                    usage[ddot_rest_server.MAXRSS_KEY] =\
+                        max(usage.get(ddot_rest_server.MAXRSS_KEY, 0),
+                            prev[ddot_rest_server.MAXRSS_KEY])
+        task.set_resource_usage(usage)
+        logger.debug('res_json: ' + str(res_json))
+        return res_json, emsg
+
+    def _link_batch_parsed_input(self, task):
+        """
+        If task was submitted in a batch, looks for another task in the
+        batch that has run and left a parsed copy of their shared
+        interaction file (INTERACTION_FILE_SIDECAR) and hard links it
+        into this task so runddot.py does not parse the file again
+        :param task: The task to process
+        :return: True if parsed copy was linked otherwise False
+        """
+        batchid = task.get_batchid()
+        digest = task.get_interactionfile_sha256()
+        if batchid is None or digest is None or\
+                task.get_interactionfile() is None:
+            return False
+        sidecar = os.path.join(task.get_taskdir(),
+                               ddot_rest_server.INTERACTION_FILE_SIDECAR)
+        if os.path.isfile(sidecar):
+            return False
+        basedir = task.get_basedir()
+        batchfile = os.path.join(basedir, ddot_rest_server.BATCHES,
+                                 batchid + '.json')
+        try:
+            with open(batchfile, 'r') as f:
+                taskids = json.load(f)[ddot_rest_server.BATCH_TASKS_KEY]
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.debug('Unable to read ' + batchfile + ' : ' + str(e))
+            return False
+        taskindex = ddot_rest_server.TaskIndex(basedir)
+        for taskid in taskids:
+            entry = taskindex.lookup(taskid)
+            # parsed copy is only complete once task has left
+            # submitted and processing states
+            if entry is None or entry[0] not in ddot_rest_server.\
+                    CLUSTERED_STATES:
+                continue
+            othersidecar = os.path.join(entry[2], ddot_rest_server.
+                                        INTERACTION_FILE_SIDECAR)
+            try:
+                with open(os.path.join(entry[2],
+                                       ddot_rest_server.TASK_JSON), 'r') as f:
+                    if json.load(f).get(ddot_rest_server.
+                                        INTERACTION_FILE_SHA256_PARAM) != digest:
+                        continue
+                os.link(othersidecar, sidecar)
+            except (OSError, ValueError, AttributeError):
+                continue
+            logger.info('Using parsed interaction file from task ' +
+                        taskid + ' in batch ' + batchid)
+            return True
+        return False
 
-        out, err = p.communicate()
-        return p.returncode, out, err
+    def _update_ndex_result(self, task, res_json):
+        """
+        Adds hiview link to res_json and updates attributes
+        of network on NDEx
+        :param task: The task to process
+        :param res_json: result containing NDEXURL_KEY
+        :return: None
+        """
+        res_json[ddot_rest_server.HIVIEWURL_KEY] = self._generate_hiview_link(task,
+                                                                              res_json[ddot_rest_server.NDEXURL_KEY])
+        netuuid = self._get_uuid_of_network(res_json[ddot_rest_server.NDEXURL_KEY])
+        self._netattribsetter.update_network_attributes(task, netuuid)
 
     def _run_ddot(self, task):
         """
@@ -779,44 +3156,24 @@ class DDotTaskRunner(object):
         """
         logger.info('Running ddot')
         try:
-            runddot_dir = os.path.dirname(self.runddotpath)
-            cmd = [self.docker, 'run', '-v',
-                   task.get_taskdir() + ':' + task.get_taskdir(),
-                   '-v',
-                   runddot_dir + ':' + runddot_dir + ':ro',
-                   self.dockerimagename,
-                   self.runddotpath,
-                   '--alpha', str(task.get_alpha()),
-                   '--beta', str(task.get_beta()),
-                   '--ndexname', str(task.get_ndexname()),
-                   '--ndexserver', str(task.get_ndexserver()),
-                   '--ndexuser', str(task.get_ndexuser()),
-                   '--ndexpass', str(task.get_ndexpass()),
-                   '--output', os.path.join(task.get_taskdir(),
-                                            ddot_rest_server.CLUSTEROUT),
-                   task.get_interactionfile()]
-
-            logger.info('Running command: ' + str(' '.join(cmd)))
-
-            p_exit, p_out, p_err = self.run_dockercmd(cmd)
-
-            decoded_res = p_out.decode('utf-8')
-            logger.debug('Exit code: ' + str(p_exit))
-            logger.debug('Done running output (' + decoded_res + ')')
-            logger.debug('Standard error (' + p_err.decode('utf-8') + ')')
-            res_json = {}
-            for line in decoded_res.split('\n'):
-                if line.startswith('RESULT:'):
-                    res_json[ddot_rest_server.NDEXURL_KEY] = line[len('RESULT:'):]
-                    break
-
-            logger.debug('res_json: ' + str(res_json))
+            clusterout = os.path.join(task.get_taskdir(),
+                                      ddot_rest_server.CLUSTEROUT)
+            cached = self._get_cached_clustering_output(task, clusterout)
+            if cached is not None:
+                clusterargs = ['--clusteroutput', clusterout]
+            else:
+                clusterargs = ['--output', clusterout]
+
+            res_json, emsg = self._run_executor(task,
+                                                self._get_ddot_args(task,
+                                                                    clusterargs))
+            if emsg is not None:
+                return {'error': emsg}, emsg
 
             if ddot_rest_server.NDEXURL_KEY in res_json:
-                res_json[ddot_rest_server.HIVIEWURL_KEY] = self._generate_hiview_link(task,
-                                                                                      res_json[ddot_rest_server.NDEXURL_KEY])
-                netuuid = self._get_uuid_of_network(res_json[ddot_rest_server.NDEXURL_KEY])
-                self._netattribsetter.update_network_attributes(task, netuuid)
+                if cached is None and self._clustercache is not None:
+                    self._clustercache.put(task, clusterout)
+                self._update_ndex_result(task, res_json)
 
             return res_json, None
         except Exception as e:
@@ -825,6 +3182,181 @@ class DDotTaskRunner(object):
 
         return {'error': 'unknown error'}, 'unknown error'
 
+    def _get_cached_clustering_output(self, task, clusterout):
+        """
+        Links cached clustering output for task to clusterout. If
+        there is none, any clusterout left by an earlier run is removed
+        since it may be linked to a cache entry and must not be written
+        to by clixo
+        :param task: The task to process
+        :param clusterout: path to CLUSTEROUT file in task directory
+        :return: path to cached clustering output or None if not cached
+        """
+        cached = None
+        if self._clustercache is not None:
+            cached = self._clustercache.get(task)
+        if cached is not None:
+            logger.info('Using cached clustering output: ' + cached)
+            _replace_with_link(cached, clusterout)
+            return cached
+        if os.path.lexists(clusterout):
+            os.unlink(clusterout)
+        return None
+
+    def _run_clustering(self, task):
+        """
+        Runs only clustering part of ddot processing writing output
+        to CLUSTEROUT file in task directory. Used when upload to
+        NDEx is done separately by upload workers
+        :param task: The task to process
+        :return: tuple ({}, None) if successful otherwise
+                 ({'error': msg}, 'str containing error message')
+        """
+        logger.info('Running clustering')
+        try:
+            clusterout = os.path.join(task.get_taskdir(),
+                                      ddot_rest_server.CLUSTEROUT)
+            cached = self._get_cached_clustering_output(task, clusterout)
+            if cached is not None:
+                return {}, None
+
+            res_json, emsg = self._run_executor(task,
+                                                self._get_ddot_args(task,
+                                                                    ['--clusteronly',
+                                                                     '--output',
+                                                                     clusterout]))
+            if emsg is not None:
+                return {'error': emsg}, emsg
+            if self._clustercache is not None:
+                self._clustercache.put(task, clusterout)
+            return res_json, None
+        except Exception as e:
+            logger.exception('Caught exception')
+            return {'error': str(e)}, str(e)
+
+    def _run_upload(self, task):
+        """
+        Uploads ontology built from CLUSTEROUT file in task directory
+        to NDEx and updates network attributes
+        :param task: The task to process
+        :return: tuple (dict of result, None) if successful otherwise
+                 ({'error': msg}, 'str containing error message')
+        """
+        logger.info('Running upload to NDEx')
+        try:
+            clusterout = os.path.join(task.get_taskdir(),
+                                      ddot_rest_server.CLUSTEROUT)
+            if not os.path.isfile(clusterout):
+                emsg = 'No output found from clustering algorithm'
+                return {'error': emsg}, emsg
+            res_json, emsg = self._run_executor(task,
+                                                self._get_ddot_args(task,
+                                                                    ['--clusteroutput',
+                                                                     clusterout]),
+                                                addusage=True)
+            if emsg is not None:
+                return {'error': emsg}, emsg
+            if ddot_rest_server.NDEXURL_KEY in res_json:
+                self._update_ndex_result(task, res_json)
+            return res_json, None
+        except Exception as e:
+            logger.exception('Caught exception')
+            return {'error': str(e)}, str(e)
+
+    def _is_upload_separate(self):
+        """
+        Denotes if upload to NDEx is done by separate upload workers
+        :return: True if it is otherwise False
+        """
+        return self._uploadtaskfactory is not None and self._uploadworkers > 0
+
+    def _start_uploader(self):
+        """
+        Starts thread running :py:meth:`_run_uploads` if upload to
+        NDEx is done separately
+        :return: None
+        """
+        if not self._is_upload_separate():
+            return
+        self._upload_stop_event.clear()
+        self._upload_thread = threading.Thread(target=self._run_uploads,
+                                               name='uploader')
+        self._upload_thread.daemon = True
+        self._upload_thread.start()
+
+    def _stop_uploader(self):
+        """
+        Tells upload thread to stop and waits for it to
+        finish running uploads
+        :return: None
+        """
+        if self._upload_thread is None:
+            return
+        self._upload_stop_event.set()
+        self._upload_event.set()
+        self._upload_thread.join()
+        self._upload_thread = None
+
+    def _run_uploads(self):
+        """
+        Loops looking for tasks in clustered state and runs up to
+        uploadworkers of them at once in a pool of threads. Tasks are
+        claimed by moving them to uploading state. Runs until
+        :py:meth:`_stop_uploader` is called, after which running
+        uploads are allowed to complete
+        :return: None
+        """
+        logger.info('Running uploads with ' + str(self._uploadworkers) +
+                    ' upload workers')
+        running = set()
+        with ThreadPoolExecutor(max_workers=self._uploadworkers,
+                                thread_name_prefix='upload') as executor:
+            while not self._upload_stop_event.is_set():
+                running = set([f for f in running if not f.done()])
+                if len(running) >= self._uploadworkers:
+                    wait_for_futures(running, timeout=self._wait_time,
+                                     return_when=FIRST_COMPLETED)
+                    continue
+
+                # cleared before looking so a task clustered while
+                # looking wakes up the wait below
+                self._upload_event.clear()
+                try:
+                    task = self._uploadtaskfactory.get_next_task()
+                except Exception:
+                    logger.exception('Caught exception looking for tasks '
+                                     'to upload')
+                    task = None
+                if task is None:
+                    self._upload_event.wait(self._wait_time)
+                    continue
+
+                if not self._claim_task(self._uploadtaskfactory, task,
+                                        ddot_rest_server.UPLOADING_STATUS):
+                    continue
+                running.add(executor.submit(self._run_upload_task, task))
+            logger.info('Waiting for ' + str(len(running)) +
+                        ' running upload(s) to complete')
+
+    def _run_upload_task(self, task):
+        """
+        Uploads task to NDEx moving it to done state or to error
+        state if upload failed or an exception is raised
+        :param task: task in uploading state
+        :return: None
+        """
+        logger.info('Uploading task: ' + str(task.get_taskdir()))
+        try:
+            with TaskLeaseHeartbeat(task, self._get_heartbeat_interval()):
+                result, emsg = self._run_upload(task)
+            self._finish_task(task, result, emsg)
+        except Exception as e:
+            emsg = ('Caught exception uploading task: ' +
+                    task.get_taskdir() + ' : ' + str(e))
+            logger.exception('Skipping task cause - ' + emsg)
+            task.move_task(ddot_rest_server.ERROR_STATUS,
+                           error_message=emsg)
+
     def run_tasks(self, keep_looping=lambda: True):
         """
         Main entry point, this function loops looking for
@@ -834,25 +3366,121 @@ class DDotTaskRunner(object):
                              for new Tasks or False to exit
         :return:
         """
-        while keep_looping():
+        try:
+            self._start_uploader()
+            if self._workers > 1:
+                return self._run_tasks_in_parallel(keep_looping=keep_looping)
 
-            while self._remove_deleted_task() is True:
-                pass
+            while keep_looping():
 
-            task = self._taskfactory.get_next_task()
-            if task is None:
-                time.sleep(self._wait_time)
-                continue
+                moredeletes = self._remove_deleted_tasks()
 
-            logger.info('Found a task: ' + str(task.get_taskdir()))
-            try:
-                self._process_task(task)
-            except Exception as e:
-                emsg = ('Caught exception processing task: ' +
-                        task.get_taskdir() + ' : ' + str(e))
-                logger.exception('Skipping task cause - ' + emsg)
-                task.move_task(ddot_rest_server.ERROR_STATUS,
-                               error_message=emsg)
+                self._reclaim_abandoned_tasks()
+                self._sweep_done_tasks()
+
+                task = self._taskfactory.get_next_task()
+                if task is None:
+                    if moredeletes is False:
+                        self._wait_for_work()
+                    continue
+
+                if self._claim_task(self._taskfactory, task,
+                                    ddot_rest_server.PROCESSING_STATUS):
+                    self._run_task(task)
+        finally:
+            self._stop_uploader()
+            self._close_watcher()
+            self._executor.close()
+
+    def _run_tasks_in_parallel(self, keep_looping=lambda: True):
+        """
+        Like :py:meth:`run_tasks` except up to workers tasks are
+        run at once in a pool of threads. Tasks are claimed by moving
+        them to processing state before being handed to a worker so
+        a task is never given to two workers. Once keep_looping
+        returns False no new tasks are started and this method
+        returns after running tasks complete.
+        :param keep_looping: Function that should return True to
+                             denote this method should keep waiting
+                             for new Tasks or False to exit
+        :return:
+        """
+        logger.info('Running tasks with ' + str(self._workers) +
+                    ' workers')
+        running = set()
+        with ThreadPoolExecutor(max_workers=self._workers,
+                                thread_name_prefix='worker') as executor:
+            while keep_looping():
+
+                moredeletes = self._remove_deleted_tasks()
+
+                self._reclaim_abandoned_tasks()
+                self._sweep_done_tasks()
+
+                running = set([f for f in running if not f.done()])
+                if len(running) >= self._workers:
+                    if moredeletes is False:
+                        wait_for_futures(running, timeout=self._wait_time,
+                                         return_when=FIRST_COMPLETED)
+                    continue
+
+                task = self._taskfactory.get_next_task()
+                if task is None:
+                    if moredeletes is False:
+                        self._wait_for_work()
+                    continue
+
+                if not self._claim_task(self._taskfactory, task,
+                                        ddot_rest_server.PROCESSING_STATUS):
+                    continue
+                running.add(executor.submit(self._run_task, task))
+            logger.info('Waiting for ' + str(len(running)) +
+                        ' running task(s) to complete')
+
+    def _claim_task(self, taskfactory, task, state):
+        """
+        Claims task by moving it to state. If the move fails the
+        task is handed back to taskfactory so it can be skipped
+        :param taskfactory: factory that returned task
+        :param task: task to claim
+        :param state: state to move task to
+        :return: True if task was claimed otherwise False
+        """
+        emsg = task.move_task(state)
+        if emsg is None:
+            return True
+        logger.info('Unable to claim task, skipping: ' + str(emsg))
+        taskfactory.claim_failed(task)
+        return False
+
+    def _run_task(self, task):
+        """
+        Processes task moving it to error state if
+        an exception is raised
+        :param task: task to process
+        :return: None
+        """
+        logger.info('Found a task: ' + str(task.get_taskdir()))
+        try:
+            self._process_task(task)
+        except Exception as e:
+            emsg = ('Caught exception processing task: ' +
+                    task.get_taskdir() + ' : ' + str(e))
+            logger.exception('Skipping task cause - ' + emsg)
+            task.move_task(ddot_rest_server.ERROR_STATUS,
+                           error_message=emsg)
+
+    def _remove_deleted_tasks(self):
+        """
+        Handles up to delete batch size delete task requests
+        so a burst of requests does not hold up running tasks
+        :return: True if batch was full and more requests may
+                 be waiting otherwise False
+        """
+        for x in range(self._delete_batch_size):
+            if self._remove_deleted_task() is False:
+                return False
+        return True
 
     def _remove_deleted_task(self):
         """
@@ -879,6 +3507,87 @@ class DDotTaskRunner(object):
             return False
 
 
+def _get_executor(theargs, taskdir):
+    """
+    Creates executor selected by --executor
+    :param theargs: parsed command line arguments
+    :param taskdir: absolute path to base task directory
+    :return: :py:class:`DDotExecutor`
+    """
+    runddotpath = os.path.join(taskdir, RUNDDOT)
+    limits = ResourceLimits(timeout=theargs.tasktimeout or None,
+                            memory=theargs.taskmemory or None,
+                            cpus=theargs.taskcpus or None)
+    if theargs.executor == LOCAL_EXECUTOR:
+        return LocalExecutor(runddotpath, python=theargs.python,
+                             clixopath=theargs.clixopath, limits=limits)
+    if theargs.executor == INPROCESS_EXECUTOR:
+        return InProcessExecutor(runddotpath, clixopath=theargs.clixopath,
+                                 limits=limits)
+    if theargs.warmcontainers > 0:
+        return WarmDockerExecutor(theargs.docker, theargs.dockerimagename,
+                                  runddotpath, theargs.warmcontainers,
+                                  limits=limits)
+    return DockerExecutor(theargs.docker, theargs.dockerimagename,
+                          runddotpath, limits=limits)
+
+
+def _get_docker_image_id(docker, dockerimagename):
+    """
+    Gets id of docker image which, unlike its name,
+    changes when the image is rebuilt
+    :param docker: path to docker
+    :param dockerimagename: name of docker image
+    :return: image id or dockerimagename if it cannot be found
+    """
+    try:
+        p = subprocess.run([docker, 'image', 'inspect', '--format',
+                            '{{.Id}}', dockerimagename],
+                           stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                           timeout=60)
+        if p.returncode == 0:
+            return p.stdout.decode('utf-8').strip()
+        logger.warning('Unable to get id of docker image ' +
+                       dockerimagename + ' : ' +
+                       p.stderr.decode('utf-8', 'replace').strip())
+    except (OSError, subprocess.SubprocessError) as e:
+        logger.warning('Unable to get id of docker image ' +
+                       dockerimagename + ' : ' + str(e))
+    return dockerimagename
+
+
+def _get_cluster_cache_version(theargs, taskdir):
+    """
+    Gets version of the code producing clustering output, made up
+    of the SHA-256 of runddot.py and the id of the docker image
+    holding clixo or, for the other executors, the path, size and
+    modification time of clixo
+    :param theargs: parsed command line arguments
+    :param taskdir: absolute path to base task directory
+    :return: version as str
+    """
+    version = []
+    runddotpath = os.path.join(taskdir, RUNDDOT)
+    try:
+        with open(runddotpath, 'rb') as f:
+            version.append(hashlib.sha256(f.read()).hexdigest())
+    except OSError as e:
+        logger.warning('Unable to read ' + runddotpath + ' : ' + str(e))
+        version.append(None)
+    if theargs.executor == DOCKER_EXECUTOR:
+        version.append(_get_docker_image_id(theargs.docker,
+                                            theargs.dockerimagename))
+    elif theargs.clixopath is not None:
+        version.append(theargs.clixopath)
+        try:
+            st = os.stat(theargs.clixopath)
+            version.extend([st.st_size, st.st_mtime_ns])
+        except OSError as e:
+            logger.warning('Unable to stat ' + theargs.clixopath + ' : ' +
+                           str(e))
+    return json.dumps(version)
+
+
 def run(theargs, keep_looping=lambda: True):
     """
 
@@ -898,21 +3607,99 @@ def run(theargs, keep_looping=lambda: True):
         ab_tdir = os.path.abspath(theargs.taskdir)
         logger.debug('Task directory set to: ' + ab_tdir)
 
+        numtasks = ddot_rest_server.TaskIndex(ab_tdir).rebuild()
+        logger.info('Rebuilt task index with ' + str(numtasks) + ' tasks')
+        numblobs, numbytes = ddot_rest_server.BlobStore(ab_tdir).\
+            remove_unreferenced()
+        logger.info('Removed ' + str(numblobs) + ' unreferenced interaction '
+                    'files freeing ' + str(numbytes) + ' bytes')
+
         tfac = FileBasedSubmittedTaskFactory(ab_tdir)
+        if theargs.uploadworkers > 0:
+            ddot_rest_server.make_shared_dirs(os.path.join(
+                ab_tdir, ddot_rest_server.CLUSTERED_STATUS))
+            uploadfac = FileBasedSubmittedTaskFactory(ab_tdir,
+                                                      state=ddot_rest_server.
+                                                      CLUSTERED_STATUS)
+        else:
+            uploadfac = None
         if theargs.disabledelete is True:
             logger.info('Deletion of tasks disabled')
             dfac = None
         else:
             dfac = DeletedFileBasedTaskFactory(ab_tdir)
+        if theargs.disablecache is True:
+            logger.info('Caching of clustering output disabled')
+            ccache = None
+        else:
+            cacheversion = _get_cluster_cache_version(theargs, ab_tdir)
+            logger.info('Clustering output cache version: ' + cacheversion)
+            ccache = ClusterResultCache(os.path.join(ab_tdir,
+                                                     CLUSTER_CACHE_DIR),
+                                        max_size=theargs.cachemaxsize,
+                                        max_age=theargs.cachemaxage,
+                                        version=cacheversion)
+            if theargs.clearcache is True:
+                ccache.clear()
+        if theargs.leasetime > 0:
+            reclaimer = AbandonedTaskReclaimer(ab_tdir, theargs.leasetime,
+                                               max_reclaims=theargs.
+                                               maxreclaims)
+        else:
+            logger.info('Reclaiming of abandoned tasks disabled')
+            reclaimer = None
+        sweeper = RetentionSweeper(ab_tdir,
+                                   max_age=theargs.retentionmaxage or None,
+                                   max_size=theargs.retentionmaxsize or None,
+                                   max_ip_size=theargs.retentionmaxipsize or
+                                   None,
+                                   max_deletes=theargs.retentionmaxdeletes)
+        if not sweeper.has_policies():
+            logger.info('Removal of done tasks by retention policy '
+                        'disabled')
+            sweeper = None
+        if theargs.disableinotify is True:
+            logger.info('Using inotify to detect new tasks disabled')
+            watchpaths = None
+        else:
+            watchpaths = [ddot_rest_server.TaskIndex(ab_tdir).get_dbfile(),
+                          os.path.join(ab_tdir,
+                                       ddot_rest_server.SUBMITTED_STATUS),
+                          os.path.join(ab_tdir,
+                                       ddot_rest_server.DELETE_REQUESTS)]
         runner = DDotTaskRunner(taskfactory=tfac,
                                 wait_time=theargs.wait_time,
                                 deletetaskfactory=dfac,
-                                dockerimagename=theargs.dockerimagename,
-                                docker=theargs.docker,
-                                runddotpath=os.path.join(ab_tdir, RUNDDOT),
-                                netattribsetter=NetworkAttributeSetter())
-
-        runner.run_tasks(keep_looping=keep_looping)
+                                netattribsetter=NetworkAttributeSetter(
+                                    clientcache=NdexClientCache(
+                                        pool_maxsize=max(theargs.workers +
+                                                         theargs.uploadworkers,
+                                                         10))),
+                                clustercache=ccache,
+                                workers=theargs.workers,
+                                reclaimer=reclaimer,
+                                watchpaths=watchpaths,
+                                executor=_get_executor(theargs, ab_tdir),
+                                uploadtaskfactory=uploadfac,
+                                uploadworkers=theargs.uploadworkers,
+                                compressdone=not theargs.disablecompression,
+                                sweeper=sweeper,
+                                sweep_interval=theargs.retentioninterval,
+                                delete_batch_size=theargs.deletebatchsize)
+
+        stop_event = threading.Event()
+
+        def _handle_sigterm(signum, frame):
+            logger.info('Received signal ' + str(signum) +
+                        ' exiting once running tasks complete')
+            stop_event.set()
+
+        prev_handler = signal.signal(signal.SIGTERM, _handle_sigterm)
+        try:
+            runner.run_tasks(keep_looping=lambda: (not stop_event.is_set() and
+                                                   keep_looping()))
+        finally:
+            signal.signal(signal.SIGTERM, prev_handler)
     except Exception:
         logger.exception("Error caught exception")
         return 2
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+
+"""Minimal Linux inotify wrapper used to wake up on filesystem changes"""
+
+import os
+import time
+import errno
+import select
+import ctypes
+import ctypes.util
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+# event masks from sys/inotify.h
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+
+# flags for inotify_init1()
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+DEFAULT_MASK = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM |
+                IN_MOVED_TO | IN_CREATE | IN_DELETE)
+
+READ_SIZE = 65536
+
+_libc = None
+
+
+def _get_libc():
+    """
+    Loads libc with inotify functions
+    :return: libc or None if inotify is not available
+    """
+    global _libc
+    if _libc is not None:
+        return _libc if _libc is not False else None
+    _libc = False
+    try:
+        libname = ctypes.util.find_library('c')
+        libc = ctypes.CDLL(libname, use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p,
+                                           ctypes.c_uint32]
+        _libc = libc
+    except (OSError, AttributeError, TypeError) as e:
+        logger.info('inotify not available: ' + str(e))
+        return None
+    return _libc
+
+
+class FileSystemWatcher(object):
+    """
+    Watches files and directories for changes via inotify. If
+    inotify is unavailable, for example on a platform other than
+    Linux, :py:meth:`wait` simply sleeps for the timeout. Note inotify
+    does NOT see changes made by other hosts on network filesystems
+    such as NFS so callers should always pass a finite timeout and
+    recheck state after :py:meth:`wait` returns.
+    """
+    def __init__(self, paths=None, mask=DEFAULT_MASK):
+        """
+        Constructor
+        :param paths: list of paths to watch
+        :param mask: inotify event mask
+        """
+        self._fd = None
+        self._mask = mask
+        self._watches = {}
+        libc = _get_libc()
+        if libc is None:
+            return
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            logger.info('inotify_init1 failed: ' +
+                        os.strerror(ctypes.get_errno()))
+            return
+        self._fd = fd
+        if paths is not None:
+            for path in paths:
+                self.add_watch(path)
+
+    def add_watch(self, path):
+        """
+        Adds path to set of watched paths
+        :param path: file or directory to watch
+        :return: True if path is being watched otherwise False
+        """
+        if self._fd is None or path is None:
+            return False
+        if path in self._watches:
+            return True
+        wd = _get_libc().inotify_add_watch(self._fd, os.fsencode(path),
+                                           self._mask)
+        if wd < 0:
+            logger.debug('Unable to watch ' + path + ' : ' +
+                         os.strerror(ctypes.get_errno()))
+            return False
+        self._watches[path] = wd
+        return True
+
+    def is_watching(self):
+        """
+        Denotes if any path is being watched
+        :return: True if at least one path is watched
+        """
+        return self._fd is not None and len(self._watches) > 0
+
+    def wait(self, timeout):
+        """
+        Blocks until a watched path changes or timeout
+        seconds elapse
+        :param timeout: time in seconds to wait
+        :return: True if a change was seen otherwise False
+        """
+        if timeout is None or timeout < 0:
+            timeout = 0
+        if not self.is_watching():
+            if timeout > 0:
+                time.sleep(timeout)
+            return False
+        try:
+            readable, _, _ = select.select([self._fd], [], [], timeout)
+        except (OSError, ValueError) as e:
+            logger.debug('select failed: ' + str(e))
+            return False
+        if not readable:
+            return False
+        self._drain()
+        return True
+
+    def _drain(self):
+        """
+        Reads and discards any pending events
+        :return: None
+        """
+        while True:
+            try:
+                if not os.read(self._fd, READ_SIZE):
+                    return
+            except OSError as e:
+                if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    logger.debug('Error reading inotify events: ' + str(e))
+                return
+
+    def close(self):
+        """
+        Closes inotify file descriptor
+        :return: None
+        """
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+            self._watches = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -28,6 +28,11 @@ requirements = [
     'ndex2'
 ]
 
+# zstandard is only needed to accept zstd compressed interaction files
+extras_requirements = {
+    'zstd': ['zstandard']
+}
+
 setup_requirements = [ ]
 
 test_requirements = [
@@ -50,6 +55,7 @@ setup(
     ],
     description="DDOT REST service",
     install_requires=requirements,
+    extras_require=extras_requirements,
     license="BSD license",
     long_description=readme + '\n\n' + history,
     include_package_data=True,
@@ -4,13 +4,19 @@
 """Tests for `ddot_rest_server` package."""
 
 import os
+import stat
 import json
 import unittest
+from unittest import mock
 import shutil
 import tempfile
 import io
 import uuid
 import re
+import time
+import threading
+import gzip
+import hashlib
 from werkzeug.datastructures import FileStorage
 import ddot_rest_server
 from ddot_rest_server import ErrorResponse
@@ -58,7 +64,7 @@ class TestDdot_rest(unittest.TestCase):
         pdict['remoteip'] = '1.2.3.4'
         pdict[ddot_rest_server.ALPHA_PARAM] = 0.01
         pdict[ddot_rest_server.BETA_PARAM] = 0.5
-        intfile = FileStorage(stream=io.BytesIO(b'hi there'),
+        intfile = FileStorage(stream=io.BytesIO(b'hi\tthere\t1\n'),
                               filename='yo.txt')
         pdict[ddot_rest_server.INTERACTION_FILE_PARAM] = intfile
         res = ddot_rest_server.create_task(pdict)
@@ -68,6 +74,220 @@ class TestDdot_rest(unittest.TestCase):
                                 pdict['remoteip'], res,
                                 ddot_rest_server.INTERACTION_FILE_PARAM)
         self.assertTrue(os.path.isfile(snp_path))
+        tjson = os.path.join(os.path.dirname(snp_path),
+                             ddot_rest_server.TASK_JSON)
+        with open(tjson, 'r') as f:
+            jdata = json.load(f)
+        self.assertEqual(jdata[ddot_rest_server.INTERACTION_FILE_SHA256_PARAM],
+                         hashlib.sha256(b'hi\tthere\t1\n').hexdigest())
+        self.assertEqual(jdata[ddot_rest_server.INTERACTION_FILE_SIZE_PARAM], 11)
+        self.assertEqual(jdata[ddot_rest_server.INTERACTION_FILE_STATS_PARAM],
+                         {ddot_rest_server.NODE_COUNT_KEY: 2,
+                          ddot_rest_server.EDGE_COUNT_KEY: 1,
+                          ddot_rest_server.MIN_WEIGHT_KEY: 1.0,
+                          ddot_rest_server.MAX_WEIGHT_KEY: 1.0})
+        self.assertEqual(ddot_rest_server.get_task_index().lookup(res),
+                         (ddot_rest_server.SUBMITTED_STATUS, '1.2.3.4',
+                          os.path.dirname(snp_path)))
+
+    def test_save_interaction_file(self):
+        data = b'A\tB\t0.5\nB\tC\t0.25\n' * 1000
+        digest = hashlib.sha256(data).hexdigest()
+        destfile = os.path.join(self._temp_dir, 'interactionfile')
+
+        # uncompressed
+        res = ddot_rest_server.save_interaction_file(io.BytesIO(data),
+                                                     destfile)
+        self.assertEqual(res, (digest, len(data)))
+        with open(destfile, 'rb') as f:
+            self.assertEqual(f.read(), data)
+
+        # multi member gzip
+        gzdata = gzip.compress(data[:5000]) + gzip.compress(data[5000:])
+        res = ddot_rest_server.save_interaction_file(io.BytesIO(gzdata),
+                                                     destfile)
+        self.assertEqual(res, (digest, len(data)))
+        with open(destfile, 'rb') as f:
+            self.assertEqual(f.read(), data)
+
+        # zstd if available
+        if ddot_rest_server.zstandard is not None:
+            zdata = ddot_rest_server.zstandard.ZstdCompressor().compress(data)
+            res = ddot_rest_server.save_interaction_file(io.BytesIO(zdata),
+                                                         destfile)
+            self.assertEqual(res, (digest, len(data)))
+
+        # empty file
+        res = ddot_rest_server.save_interaction_file(io.BytesIO(b''),
+                                                     destfile)
+        self.assertEqual(res, (hashlib.sha256(b'').hexdigest(), 0))
+
+    def test_save_interaction_file_too_large_and_corrupt(self):
+        destfile = os.path.join(self._temp_dir, 'interactionfile')
+        data = b'A\tB\t0.5\n' * 1000
+        try:
+            ddot_rest_server.save_interaction_file(io.BytesIO(data),
+                                                   destfile,
+                                                   maxsize=len(data) - 1)
+            self.fail('Expected InteractionFileTooLargeError')
+        except ddot_rest_server.InteractionFileTooLargeError:
+            pass
+
+        # limit applies to decompressed size
+        try:
+            ddot_rest_server.save_interaction_file(io.BytesIO(gzip.compress(data)),
+                                                   destfile,
+                                                   maxsize=len(data) - 1)
+            self.fail('Expected InteractionFileTooLargeError')
+        except ddot_rest_server.InteractionFileTooLargeError:
+            pass
+
+        try:
+            ddot_rest_server.save_interaction_file(io.BytesIO(b'\x1f\x8bfoo'),
+                                                   destfile)
+            self.fail('Expected InteractionFileError')
+        except ddot_rest_server.InteractionFileError as e:
+            self.assertTrue('Unable to decompress' in str(e))
+
+    def test_stream_decompressor_bounded_chunks(self):
+        data = b'\0' * (ddot_rest_server.UPLOAD_CHUNK_SIZE * 5 + 7)
+        compressed = {'gzip': gzip.compress(data[:100]) +
+                      gzip.compress(data[100:])}
+        if ddot_rest_server.zstandard is not None:
+            zc = ddot_rest_server.zstandard.ZstdCompressor()
+            compressed['zstd'] = zc.compress(data[:100]) +\
+                zc.compress(data[100:])
+        for compression, zdata in compressed.items():
+            decomp = ddot_rest_server.StreamDecompressor(compression,
+                                                         io.BytesIO(zdata))
+            total = 0
+            while True:
+                chunk = decomp.read()
+                if not chunk:
+                    break
+                self.assertTrue(len(chunk) <=
+                                ddot_rest_server.UPLOAD_CHUNK_SIZE)
+                total += len(chunk)
+            self.assertEqual(total, len(data))
+
+        try:
+            ddot_rest_server.StreamDecompressor('bzip2', io.BytesIO(b''))
+            self.fail('Expected InteractionFileError')
+        except ddot_rest_server.InteractionFileError as e:
+            self.assertEqual('Unsupported compression: bzip2', str(e))
+
+    def test_save_interaction_file_truncated(self):
+        destfile = os.path.join(self._temp_dir, 'interactionfile')
+        data = b'A\tB\t0.5\nB\tC\t0.25\n' * 10000
+        compressed = {'gzip': gzip.compress(data)}
+        if ddot_rest_server.zstandard is not None:
+            zc = ddot_rest_server.zstandard.ZstdCompressor(write_checksum=True)
+            # skippable frame, as written by pzstd, then two frames
+            compressed['zstd'] = b'\x50\x2a\x4d\x18\x02\x00\x00\x00hi' +\
+                zc.compress(data[:5000]) + zc.compress(data[5000:])
+        for compression, zdata in compressed.items():
+            res = ddot_rest_server.save_interaction_file(io.BytesIO(zdata),
+                                                         destfile)
+            self.assertEqual(res, (hashlib.sha256(data).hexdigest(),
+                                   len(data)))
+            for cut in [1, 4, len(zdata) // 2]:
+                try:
+                    ddot_rest_server.save_interaction_file(io.BytesIO(zdata[:-cut]),
+                                                           destfile)
+                    self.fail('Expected InteractionFileError for ' +
+                              compression + ' cut by ' + str(cut))
+                except ddot_rest_server.InteractionFileError as e:
+                    self.assertEqual('Unable to decompress interaction '
+                                     'file: ' + compression +
+                                     ' data is truncated', str(e))
+
+    def test_upload_file(self):
+        data = b'A\tB\t0.5\n' * 1000
+        destfile = os.path.join(self._temp_dir, 'interactionfile')
+        upload = ddot_rest_server.UploadFile(self._temp_dir)
+        upload.write(data[:3])
+        upload.write(data[3:])
+        upload.seek(0)
+        res = ddot_rest_server.save_interaction_file(upload, destfile)
+        self.assertEqual(res, (hashlib.sha256(data).hexdigest(), len(data)))
+        # uncompressed upload is linked, not written again
+        self.assertTrue(os.path.samefile(upload.name, destfile))
+        upload.close()
+        self.assertFalse(os.path.exists(upload.name))
+        with open(destfile, 'rb') as f:
+            self.assertEqual(f.read(), data)
+
+        # uncompressed data past maxsize is discarded
+        upload = ddot_rest_server.UploadFile(self._temp_dir, maxsize=10)
+        upload.write(data)
+        upload.write(data)
+        self.assertTrue(upload.too_large)
+        self.assertEqual(os.path.getsize(upload.name), 0)
+        try:
+            ddot_rest_server.save_interaction_file(upload, destfile)
+            self.fail('Expected InteractionFileTooLargeError')
+        except ddot_rest_server.InteractionFileTooLargeError:
+            pass
+        upload.close()
+
+        # compressed data is kept since limit is on decompressed size
+        gzdata = gzip.compress(data)
+        upload = ddot_rest_server.UploadFile(self._temp_dir,
+                                             maxsize=len(gzdata) - 1)
+        upload.write(gzdata)
+        self.assertFalse(upload.too_large)
+        upload.seek(0)
+        res = ddot_rest_server.save_interaction_file(upload, destfile)
+        self.assertEqual(res, (hashlib.sha256(data).hexdigest(), len(data)))
+        self.assertFalse(os.path.samefile(upload.name, destfile))
+        upload.close()
+        self.assertEqual(os.listdir(self._temp_dir), ['interactionfile'])
+
+    def test_interaction_file_validator(self):
+        # valid file split across chunks with comments,
+        # windows line endings, and no trailing newline
+        validator = ddot_rest_server.InteractionFileValidator()
+        for chunk in [b'# header\nA\tB\t0.', b'5\r\nB\tC\t-2 # hi\n\n',
+                      b'C\tA\t1e3']:
+            validator.add_chunk(chunk)
+        validator.finish()
+        self.assertEqual(validator.get_stats(),
+                         {ddot_rest_server.NODE_COUNT_KEY: 3,
+                          ddot_rest_server.EDGE_COUNT_KEY: 3,
+                          ddot_rest_server.MIN_WEIGHT_KEY: -2.0,
+                          ddot_rest_server.MAX_WEIGHT_KEY: 1000.0})
+
+        for data, emsg in [(b'A\tB\n', 'Line 1 has 2 tab delimited columns'),
+                           (b'A\tB\t1\nA B 1\n',
+                            'Line 2 has 1 tab delimited columns'),
+                           (b'A\tB\tx\n', 'Line 1 has non numeric weight: x'),
+                           (b'A\tB\tnan\n', 'Line 1 has non numeric'),
+                           (b'\tB\t1\n', 'Line 1 has empty gene name'),
+                           (b'# only a comment\n', 'has no edges'),
+                           (b'A' * (ddot_rest_server.MAX_INTERACTION_LINE_LEN +
+                                    1), 'Line 1 exceeds')]:
+            validator = ddot_rest_server.InteractionFileValidator()
+            try:
+                validator.add_chunk(data)
+                validator.finish()
+                self.fail('Expected InteractionFileError for ' + str(data))
+            except ddot_rest_server.InteractionFileError as e:
+                self.assertTrue(emsg in str(e), str(e))
+
+    def test_create_task_invalid_interaction_file(self):
+        pdict = {}
+        pdict['remoteip'] = '1.2.3.4'
+        intfile = FileStorage(stream=io.BytesIO(b'hi there'),
+                              filename='yo.txt')
+        pdict[ddot_rest_server.INTERACTION_FILE_PARAM] = intfile
+        try:
+            ddot_rest_server.create_task(pdict)
+            self.fail('Expected InteractionFileError')
+        except ddot_rest_server.InteractionFileError as e:
+            self.assertTrue('expected 3' in str(e))
+        self.assertEqual(os.listdir(os.path.join(ddot_rest_server.
+                                                 get_submit_dir(),
+                                                 '1.2.3.4')), [])
 
     def test_create_task_submitdir_is_a_file(self):
         open(ddot_rest_server.get_submit_dir(), 'a').close()
@@ -75,7 +295,7 @@ class TestDdot_rest(unittest.TestCase):
         pdict['remoteip'] = '1.2.3.4'
         pdict[ddot_rest_server.ALPHA_PARAM] = 0.01
         pdict[ddot_rest_server.BETA_PARAM] = 0.5
-        intfile = FileStorage(stream=io.BytesIO(b'hi there'),
+        intfile = FileStorage(stream=io.BytesIO(b'hi\tthere\t1\n'),
                               filename='yo.txt')
         pdict[ddot_rest_server.INTERACTION_FILE_PARAM] = intfile
         try:
@@ -112,6 +332,117 @@ class TestDdot_rest(unittest.TestCase):
                                               basedir=self._temp_dir),
                          theuuid_dir)
 
+    def test_task_index_update_lookup_remove(self):
+        tindex = ddot_rest_server.get_task_index()
+        self.assertEqual(tindex.get_dbfile(),
+                         os.path.join(self._temp_dir,
+                                      ddot_rest_server.TASK_INDEX))
+        self.assertEqual(tindex.lookup('1234'), None)
+        self.assertEqual(tindex.update('1234', 'submitted', '1.2.3.4',
+                                       '/foo/1234'), None)
+        self.assertEqual(tindex.lookup('1234'),
+                         ('submitted', '1.2.3.4', '/foo/1234'))
+        self.assertEqual(tindex.update('1234', 'done', '1.2.3.4',
+                                       '/blah/1234'), None)
+        self.assertEqual(tindex.lookup('1234'),
+                         ('done', '1.2.3.4', '/blah/1234'))
+        self.assertEqual(tindex.remove('1234'), None)
+        self.assertEqual(tindex.lookup('1234'), None)
+
+    def test_task_index_lookup_many(self):
+        tindex = ddot_rest_server.get_task_index()
+        self.assertEqual(tindex.lookup_many(['1', '2']), {})
+        for i in range(ddot_rest_server.TaskIndex.LOOKUP_BATCH_SIZE + 2):
+            tindex.update(str(i), 'submitted', '1.2.3.4', '/foo/' + str(i))
+        uuids = [str(i) for i in range(0, ddot_rest_server.TaskIndex.LOOKUP_BATCH_SIZE + 5, 2)]
+        res = tindex.lookup_many(uuids)
+        self.assertEqual(len(res),
+                         ddot_rest_server.TaskIndex.LOOKUP_BATCH_SIZE // 2 + 1)
+        self.assertEqual(res['2'], ('submitted', '1.2.3.4', '/foo/2'))
+        self.assertFalse(str(ddot_rest_server.TaskIndex.LOOKUP_BATCH_SIZE + 4) in res)
+
+    def test_task_index_dbfile_is_group_writable(self):
+        tindex = ddot_rest_server.get_task_index()
+        original_umask = os.umask(0o022)
+        try:
+            self.assertEqual(tindex.update('1234', 'submitted', '1.2.3.4',
+                                           '/foo/1234'), None)
+        finally:
+            os.umask(original_umask)
+        self.assertEqual(stat.S_IMODE(os.stat(tindex.get_dbfile()).st_mode),
+                         0o664)
+
+        # database file created without group write is fixed
+        os.chmod(tindex.get_dbfile(), 0o644)
+        ddot_rest_server.TaskIndex._initialized.clear()
+        self.assertEqual(tindex.lookup('1234'),
+                         ('submitted', '1.2.3.4', '/foo/1234'))
+        self.assertEqual(stat.S_IMODE(os.stat(tindex.get_dbfile()).st_mode),
+                         0o664)
+
+    def test_task_index_rebuild(self):
+        tindex = ddot_rest_server.TaskIndex(os.path.join(self._temp_dir,
+                                                         'doesnotexist'))
+        self.assertEqual(tindex.rebuild(), None)
+
+        taskdir = os.path.join(ddot_rest_server.get_done_dir(),
+                               '1.2.3.4', 'abcd')
+        os.makedirs(taskdir, mode=0o755)
+        subtaskdir = os.path.join(ddot_rest_server.get_submit_dir(),
+                                  '5.6.7.8', 'efgh')
+        os.makedirs(subtaskdir, mode=0o755)
+        tindex = ddot_rest_server.get_task_index()
+        tindex.update('stale', 'done', '1.2.3.4', '/foo/stale')
+        self.assertEqual(tindex.rebuild(), 2)
+        self.assertEqual(tindex.lookup('abcd'),
+                         ('done', '1.2.3.4', taskdir))
+        self.assertEqual(tindex.lookup('efgh'),
+                         ('submitted', '5.6.7.8', subtaskdir))
+        self.assertEqual(tindex.lookup('stale'), None)
+
+    def test_get_task_uses_index(self):
+        taskdir = os.path.join(ddot_rest_server.get_done_dir(),
+                               '1.2.3.4', 'abcd')
+        os.makedirs(taskdir, mode=0o755)
+        os.makedirs(ddot_rest_server.get_submit_dir(), mode=0o755)
+
+        # first lookup falls back to scan and populates index
+        self.assertEqual(ddot_rest_server.get_task('abcd',
+                                                   basedir=ddot_rest_server.get_done_dir()),
+                         taskdir)
+        tindex = ddot_rest_server.get_task_index()
+        self.assertEqual(tindex.lookup('abcd'), ('done', '1.2.3.4', taskdir))
+
+        # task indexed in done so submitted lookup is None
+        self.assertEqual(ddot_rest_server.get_task('abcd',
+                                                   basedir=ddot_rest_server.get_submit_dir()),
+                         None)
+
+        # stale entry falls back to scan and index is corrected
+        newtaskdir = os.path.join(ddot_rest_server.get_submit_dir(),
+                                  '1.2.3.4', 'abcd')
+        shutil.move(taskdir, newtaskdir)
+        self.assertEqual(ddot_rest_server.get_task('abcd',
+                                                   basedir=ddot_rest_server.get_submit_dir()),
+                         newtaskdir)
+        self.assertEqual(tindex.lookup('abcd'),
+                         ('submitted', '1.2.3.4', newtaskdir))
+
+    def test_get_task_with_iphintlist(self):
+        theuuid_dir = os.path.join(self._temp_dir, '1.2.3.4', '1234')
+        os.makedirs(theuuid_dir, mode=0o755)
+        self.assertEqual(ddot_rest_server.get_task('1234',
+                                                   iphintlist=[None, '5.6.7.8',
+                                                               '1.2.3.4'],
+                                                   basedir=self._temp_dir),
+                         theuuid_dir)
+
+        # wrong hint falls back to scan
+        self.assertEqual(ddot_rest_server.get_task('1234',
+                                                   iphintlist=['5.6.7.8'],
+                                                   basedir=self._temp_dir),
+                         theuuid_dir)
+
     def test_wait_for_task_uuid_none(self):
         self.assertEqual(ddot_rest_server.wait_for_task(None), None)
 
@@ -123,6 +454,66 @@ class TestDdot_rest(unittest.TestCase):
         os.makedirs(taskdir, mode=0o755)
         self.assertEqual(ddot_rest_server.wait_for_task('haha'), taskdir)
 
+    def test_wait_for_task_wakes_on_index_change(self):
+        ddot_rest_server.app.config[ddot_rest_server.SLEEP_TIME_KEY] = 1
+        tindex = ddot_rest_server.get_task_index()
+        procdir = os.path.join(ddot_rest_server.get_processing_dir(),
+                               '1.2.3.4', 'haha')
+        os.makedirs(procdir, mode=0o755)
+        tindex.update('haha', ddot_rest_server.PROCESSING_STATUS,
+                      '1.2.3.4', procdir)
+        donedir = os.path.join(ddot_rest_server.get_done_dir(),
+                               '1.2.3.4', 'haha')
+
+        def finish_task():
+            shutil.move(procdir, donedir)
+            tindex.update('haha', ddot_rest_server.DONE_STATUS,
+                          '1.2.3.4', donedir)
+
+        timer = threading.Timer(0.2, finish_task)
+        timer.start()
+        try:
+            start = time.time()
+            self.assertEqual(ddot_rest_server.wait_for_task('haha',
+                                                            timeout=5),
+                             donedir)
+            self.assertTrue(time.time() - start < 5)
+        finally:
+            timer.join()
+
+    def test_wait_for_task_timeout(self):
+        start = time.time()
+        self.assertEqual(ddot_rest_server.wait_for_task('haha',
+                                                        timeout=0.2), None)
+        self.assertTrue(time.time() - start >= 0.2)
+
+    def test_get_task_state(self):
+        self.assertEqual(ddot_rest_server.get_task_state('haha'),
+                         (None, None))
+        taskdir = os.path.join(ddot_rest_server.get_processing_dir(),
+                               '1.2.3.4', 'haha')
+        os.makedirs(taskdir, mode=0o755)
+        self.assertEqual(ddot_rest_server.get_task_state('haha'),
+                         (ddot_rest_server.PROCESSING_STATUS, taskdir))
+
+        # indexed task is found with a single lookup
+        with mock.patch('ddot_rest_server.TaskIndex.lookup',
+                        side_effect=ddot_rest_server.TaskIndex(
+                            self._temp_dir).lookup) as mocklookup:
+            self.assertEqual(ddot_rest_server.get_task_state('haha'),
+                             (ddot_rest_server.PROCESSING_STATUS, taskdir))
+            self.assertEqual(mocklookup.call_count, 1)
+
+        # out of date index falls back to scanning state directories
+        donedir = os.path.join(ddot_rest_server.get_done_dir(),
+                               '1.2.3.4', 'haha')
+        os.makedirs(os.path.dirname(donedir), mode=0o755)
+        os.rename(taskdir, donedir)
+        self.assertEqual(ddot_rest_server.get_task_state('haha'),
+                         (ddot_rest_server.DONE_STATUS, donedir))
+        self.assertEqual(ddot_rest_server.get_task_index().lookup('haha'),
+                         (ddot_rest_server.DONE_STATUS, '1.2.3.4', donedir))
+
     def test_baseurl(self):
         """Test something."""
         rv = self._app.get('/')
@@ -172,7 +563,7 @@ class TestDdot_rest(unittest.TestCase):
         pdict = {}
         pdict[ddot_rest_server.ALPHA_PARAM] = 0.5
         pdict[ddot_rest_server.BETA_PARAM] = 1.0
-        pdict[ddot_rest_server.INTERACTION_FILE_PARAM] = (io.BytesIO(b'hi there'),
+        pdict[ddot_rest_server.INTERACTION_FILE_PARAM] = (io.BytesIO(b'hi\tthere\t1\n'),
                                                       'yo.txt')
         rv = self._app.post(ddot_rest_server.ONTOLOGY_NS,
                             data=pdict,
@@ -180,11 +571,49 @@ class TestDdot_rest(unittest.TestCase):
         self.assertEqual(rv.status_code, 500)
         self.assertTrue('Error' in rv.json['message'])
 
+    def test_post_interaction_file_too_large_or_corrupt(self):
+        ddot_rest_server.app.config[ddot_rest_server.MAX_INTERACTION_FILE_SIZE_KEY] = 4
+        try:
+            pdict = {}
+            pdict[ddot_rest_server.INTERACTION_FILE_PARAM] = (io.BytesIO(b'hi\tthere\t1\n'),
+                                                              'yo.txt')
+            rv = self._app.post(ddot_rest_server.ONTOLOGY_NS,
+                                data=pdict,
+                                follow_redirects=True)
+            self.assertEqual(rv.status_code, 413)
+            self.assertEqual(rv.json['message'],
+                             'Interaction file is too large')
+        finally:
+            ddot_rest_server.app.config[ddot_rest_server.MAX_INTERACTION_FILE_SIZE_KEY] = None
+
+        pdict = {}
+        pdict[ddot_rest_server.INTERACTION_FILE_PARAM] = (io.BytesIO(b'\x1f\x8bxx'),
+                                                          'yo.txt.gz')
+        rv = self._app.post(ddot_rest_server.ONTOLOGY_NS,
+                            data=pdict,
+                            follow_redirects=True)
+        self.assertEqual(rv.status_code, 400)
+        self.assertEqual(rv.json['message'], 'Invalid interaction file')
+
+        pdict = {}
+        pdict[ddot_rest_server.INTERACTION_FILE_PARAM] = (io.BytesIO(b'A\tB\tC\n'),
+                                                          'yo.txt')
+        rv = self._app.post(ddot_rest_server.ONTOLOGY_NS,
+                            data=pdict,
+                            follow_redirects=True)
+        self.assertEqual(rv.status_code, 400)
+        self.assertEqual(rv.json['message'], 'Invalid interaction file')
+        self.assertTrue('non numeric weight' in rv.json['description'])
+
+        # task directories should have been removed
+        ipdir = os.path.join(ddot_rest_server.get_submit_dir(), '127.0.0.1')
+        self.assertEqual(os.listdir(ipdir), [])
+
     def test_post_ndex(self):
         pdict = {}
         pdict[ddot_rest_server.ALPHA_PARAM] = 0.5
         pdict[ddot_rest_server.BETA_PARAM] = 1.0
-        pdict[ddot_rest_server.INTERACTION_FILE_PARAM] = (io.BytesIO(b'hi there'),
+        pdict[ddot_rest_server.INTERACTION_FILE_PARAM] = (io.BytesIO(b'hi\tthere\t1\n'),
                                                       'yo.txt')
         rv = self._app.post(ddot_rest_server.ONTOLOGY_NS,
                             data=pdict,
@@ -211,6 +640,203 @@ class TestDdot_rest(unittest.TestCase):
         self.assertEqual(jdata[ddot_rest_server.ALPHA_PARAM], 0.5)
         self.assertEqual(jdata[ddot_rest_server.BETA_PARAM], 1.0)
 
+    def test_parse_alpha_beta_list(self):
+        self.assertEqual(ddot_rest_server.parse_alpha_beta_list('[{"alpha": 0.1, '
+                                                                '"beta": "0.5"}]'),
+                         [(0.1, 0.5)])
+        for rawlist in ['notjson', '{}', '[]', '[1]', '[{"alpha": 1}]',
+                        '[{"alpha": "x", "beta": 1}]',
+                        '[{"alpha": NaN, "beta": 1}]']:
+            with self.assertRaises(ValueError):
+                ddot_rest_server.parse_alpha_beta_list(rawlist)
+        try:
+            ddot_rest_server.parse_alpha_beta_list('[{"alpha": 1, "beta": 1},'
+                                                   '{"alpha": 2, "beta": 1}]',
+                                                   maxsize=1)
+            self.fail('Expected ValueError')
+        except ValueError as e:
+            self.assertEqual(str(e), 'alphabetalist has 2 entries, max '
+                                     'allowed is 1')
+
+    def test_post_batch(self):
+        pdict = {}
+        pdict[ddot_rest_server.ALPHA_BETA_LIST_PARAM] = json.dumps([{'alpha': 0.1,
+                                                                     'beta': 0.5},
+                                                                    {'alpha': 0.2,
+                                                                     'beta': 0.6}])
+        pdict[ddot_rest_server.INTERACTION_FILE_PARAM] = (io.BytesIO(b'hi\tthere\t1\n'),
+                                                          'yo.txt')
+        rv = self._app.post(ddot_rest_server.ONTOLOGY_NS + '/batch',
+                            data=pdict,
+                            follow_redirects=True)
+        self.assertEqual(rv.status_code, 202)
+        data = json.loads(rv.data)
+        batchid = data[ddot_rest_server.TASKID_KEY]
+        self.assertTrue(rv.headers['Location'].endswith('/batch/' + batchid))
+        self.assertEqual(len(data[ddot_rest_server.LOCATIONS_KEY]), 2)
+
+        inodes = set()
+        alphabeta = []
+        for loc in data[ddot_rest_server.LOCATIONS_KEY]:
+            uuidstr = re.sub('^.*/', '', loc)
+            tpath = ddot_rest_server.get_task(uuidstr,
+                                              basedir=ddot_rest_server.get_submit_dir())
+            ifile = os.path.join(tpath, ddot_rest_server.INTERACTION_FILE_PARAM)
+            inodes.add(os.stat(ifile).st_ino)
+            with open(os.path.join(tpath, ddot_rest_server.TASK_JSON),
+                      'r') as f:
+                jdata = json.load(f)
+            self.assertEqual(jdata[ddot_rest_server.BATCH_ID_PARAM], batchid)
+            self.assertEqual(jdata[ddot_rest_server.INTERACTION_FILE_PARAM],
+                             ddot_rest_server.INTERACTION_FILE_PARAM)
+            self.assertEqual(jdata[ddot_rest_server.INTERACTION_FILE_STATS_PARAM]
+                             [ddot_rest_server.EDGE_COUNT_KEY], 1)
+            alphabeta.append((jdata[ddot_rest_server.ALPHA_PARAM],
+                              jdata[ddot_rest_server.BETA_PARAM]))
+        # interaction file is stored once
+        self.assertEqual(len(inodes), 1)
+        self.assertEqual(alphabeta, [(0.1, 0.5), (0.2, 0.6)])
+        self.assertEqual(stat.S_IMODE(os.stat(ddot_rest_server.
+                                              get_batch_dir()).st_mode),
+                         0o775)
+
+        rv = self._app.get(ddot_rest_server.ONTOLOGY_NS + '/batch/' + batchid)
+        self.assertEqual(rv.status_code, 200)
+        data = json.loads(rv.data)
+        self.assertEqual([t[ddot_rest_server.STATUS_RESULT_KEY]
+                          for t in data[ddot_rest_server.BATCH_TASKS_KEY]],
+                         [ddot_rest_server.SUBMITTED_STATUS,
+                          ddot_rest_server.SUBMITTED_STATUS])
+
+        rv = self._app.get(ddot_rest_server.ONTOLOGY_NS + '/batch/nope')
+        self.assertEqual(rv.status_code, 410)
+
+    def test_post_batch_invalid(self):
+        pdict = {}
+        pdict[ddot_rest_server.ALPHA_BETA_LIST_PARAM] = '[]'
+        pdict[ddot_rest_server.INTERACTION_FILE_PARAM] = (io.BytesIO(b'hi\tthere\t1\n'),
+                                                          'yo.txt')
+        rv = self._app.post(ddot_rest_server.ONTOLOGY_NS + '/batch',
+                            data=pdict,
+                            follow_redirects=True)
+        self.assertEqual(rv.status_code, 400)
+        self.assertFalse(os.path.isdir(ddot_rest_server.get_submit_dir()))
+
+        # invalid interaction file leaves no tasks behind
+        pdict[ddot_rest_server.ALPHA_BETA_LIST_PARAM] = '[{"alpha": 1, "beta": 1}]'
+        pdict[ddot_rest_server.INTERACTION_FILE_PARAM] = (io.BytesIO(b'hi\n'),
+                                                          'yo.txt')
+        rv = self._app.post(ddot_rest_server.ONTOLOGY_NS + '/batch',
+                            data=pdict,
+                            follow_redirects=True)
+        self.assertEqual(rv.status_code, 400)
+        self.assertEqual(ddot_rest_server.TaskIndex(self._temp_dir).rebuild(), 0)
+
+    def test_create_batch_failure_releases_blob(self):
+        params = {ddot_rest_server.REMOTEIP_PARAM: '1.2.3.4',
+                  ddot_rest_server.INTERACTION_FILE_PARAM:
+                      FileStorage(stream=io.BytesIO(b'hi\tthere\t1\n'),
+                                  filename='yo.txt')}
+        digest = hashlib.sha256(b'hi\tthere\t1\n').hexdigest()
+        blob = ddot_rest_server.get_blob_store().get_blob_path(digest)
+        with mock.patch('ddot_rest_server._write_json_file',
+                        side_effect=OSError('disk full')):
+            with self.assertRaises(OSError):
+                ddot_rest_server.create_batch(params, [(0.1, 0.5),
+                                                       (0.2, 0.6)])
+        self.assertFalse(os.path.isfile(blob))
+        self.assertEqual(os.listdir(os.path.join(ddot_rest_server.
+                                                 get_submit_dir(),
+                                                 '1.2.3.4')), [])
+
+    def test_blob_store(self):
+        store = ddot_rest_server.get_blob_store()
+        self.assertEqual(ddot_rest_server.BlobStore(None).get_blob_path('a' * 64),
+                         None)
+        self.assertEqual(store.get_blob_path(None), None)
+        self.assertEqual(store.get_blob_path('abc'), None)
+        self.assertEqual(store.get_blob_path('z' * 64), None)
+        self.assertFalse(store.add('/foo', 'abc'))
+        self.assertFalse(store.release('abc'))
+        self.assertEqual(store.remove_unreferenced(), (0, 0))
+
+        digest = hashlib.sha256(b'data').hexdigest()
+        blob = store.get_blob_path(digest)
+        self.assertEqual(blob, os.path.join(self._temp_dir,
+                                            ddot_rest_server.BLOBS,
+                                            digest[:2], digest))
+        files = []
+        for name in ['one', 'two']:
+            fname = os.path.join(self._temp_dir, name)
+            with open(fname, 'wb') as f:
+                f.write(b'data')
+            self.assertTrue(store.add(fname, digest))
+            files.append(fname)
+        self.assertTrue(os.path.samefile(files[0], blob))
+        self.assertTrue(os.path.samefile(files[1], blob))
+        self.assertEqual(os.stat(blob).st_nlink, 3)
+        self.assertEqual(os.listdir(os.path.dirname(blob)), [digest])
+
+        # blob is kept until last file linked to it is removed
+        os.unlink(files[0])
+        self.assertFalse(store.release(digest))
+        self.assertEqual(store.remove_unreferenced(), (0, 0))
+        os.unlink(files[1])
+        self.assertTrue(store.release(digest))
+        self.assertFalse(os.path.isfile(blob))
+        self.assertFalse(store.release(digest))
+
+        # unreferenced blobs are removed
+        self.assertTrue(store.add(os.path.join(self._temp_dir, 'three'),
+                                  digest) is False)
+        with open(files[0], 'wb') as f:
+            f.write(b'data')
+        self.assertTrue(store.add(files[0], digest))
+        os.unlink(files[0])
+        self.assertEqual(store.remove_unreferenced(), (1, 4))
+        self.assertFalse(os.path.isfile(blob))
+
+    def test_blob_store_dirs_are_group_writable(self):
+        store = ddot_rest_server.get_blob_store()
+        digest = hashlib.sha256(b'data').hexdigest()
+        fname = os.path.join(self._temp_dir, 'one')
+        with open(fname, 'wb') as f:
+            f.write(b'data')
+        original_umask = os.umask(0o022)
+        try:
+            self.assertTrue(store.add(fname, digest))
+            self.assertTrue(store.add_compressed(fname, digest,
+                                                 fname + '.gz'))
+        finally:
+            os.umask(original_umask)
+        self.assertEqual(os.umask(original_umask), original_umask)
+        blobdir = os.path.dirname(store.get_blob_path(digest))
+        for path in [blobdir, os.path.dirname(blobdir)]:
+            self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o775)
+
+    def test_post_same_file_twice_is_stored_once(self):
+        ifiles = []
+        for i in range(2):
+            pdict = {ddot_rest_server.INTERACTION_FILE_PARAM:
+                     (io.BytesIO(b'hi\tthere\t1\n'), 'yo.txt')}
+            rv = self._app.post(ddot_rest_server.ONTOLOGY_NS,
+                                data=pdict,
+                                follow_redirects=True)
+            self.assertEqual(rv.status_code, 202)
+            uuidstr = re.sub('^.*/', '', rv.headers['Location'])
+            tpath = ddot_rest_server.get_task(uuidstr,
+                                              basedir=ddot_rest_server.get_submit_dir())
+            ifiles.append(os.path.join(tpath,
+                                       ddot_rest_server.INTERACTION_FILE_PARAM))
+        self.assertTrue(os.path.samefile(ifiles[0], ifiles[1]))
+        # uploads are removed once request completes
+        self.assertEqual(os.listdir(ddot_rest_server.get_upload_dir()), [])
+        digest = hashlib.sha256(b'hi\tthere\t1\n').hexdigest()
+        blob = ddot_rest_server.get_blob_store().get_blob_path(digest)
+        self.assertTrue(os.path.samefile(ifiles[0], blob))
+        with open(ifiles[1], 'rb') as f:
+            self.assertEqual(f.read(), b'hi\tthere\t1\n')
+
     def test_get_status_no_submidir(self):
         rv = self._app.get(ddot_rest_server.ONTOLOGY_NS + '/status')
         data = json.loads(rv.data)
@@ -272,6 +898,97 @@ class TestDdot_rest(unittest.TestCase):
                          ddot_rest_server.PROCESSING_STATUS)
         self.assertEqual(rv.status_code, 200)
 
+    def test_get_id_and_raw_output_found_in_clustered_status(self):
+        task_dir = os.path.join(self._temp_dir,
+                                ddot_rest_server.CLUSTERED_STATUS,
+                                '127.0.0.1', 'qazxsw')
+        os.makedirs(task_dir, mode=0o755)
+        rv = self._app.get(ddot_rest_server.ONTOLOGY_NS +
+                           '/qazxsw/rawclusteringoutput')
+        self.assertEqual(rv.status_code, 500)
+        with open(os.path.join(task_dir, ddot_rest_server.CLUSTEROUT),
+                  'w') as f:
+            f.write('clusters\n')
+        rv = self._app.get(ddot_rest_server.ONTOLOGY_NS +
+                           '/qazxsw/rawclusteringoutput')
+        self.assertEqual(rv.status_code, 200)
+        self.assertEqual(rv.data, b'clusters\n')
+        rv.close()
+
+        rv = self._app.get(ddot_rest_server.ONTOLOGY_NS +
+                           '/qazxsw')
+        data = json.loads(rv.data)
+        self.assertEqual(data[ddot_rest_server.STATUS_RESULT_KEY],
+                         ddot_rest_server.CLUSTERED_STATUS)
+        self.assertEqual(rv.status_code, 200)
+
+        # not available before clustering completes
+        procdir = os.path.join(self._temp_dir,
+                               ddot_rest_server.PROCESSING_STATUS,
+                               '127.0.0.1')
+        os.makedirs(procdir, mode=0o755)
+        shutil.move(task_dir, procdir)
+        rv = self._app.get(ddot_rest_server.ONTOLOGY_NS +
+                           '/qazxsw/rawclusteringoutput')
+        self.assertEqual(rv.status_code, 404)
+
+    def test_get_raw_output_compressed(self):
+        task_dir = os.path.join(self._temp_dir,
+                                ddot_rest_server.DONE_STATUS,
+                                '127.0.0.1', 'qazxsw')
+        os.makedirs(task_dir, mode=0o755)
+        rawfile = os.path.join(task_dir, ddot_rest_server.CLUSTEROUT)
+        with open(rawfile, 'wb') as f:
+            f.write(b'clusters\n' * 1000)
+        ddot_rest_server.compress_file(rawfile, rawfile +
+                                       ddot_rest_server.COMPRESSED_SUFFIX)
+        os.unlink(rawfile)
+        self.assertEqual(os.listdir(task_dir),
+                         [ddot_rest_server.CLUSTEROUT +
+                          ddot_rest_server.COMPRESSED_SUFFIX])
+
+        rv = self._app.get(ddot_rest_server.ONTOLOGY_NS +
+                           '/qazxsw/rawclusteringoutput',
+                           headers={'Accept-Encoding': 'gzip, deflate'})
+        self.assertEqual(rv.status_code, 200)
+        self.assertEqual(rv.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(rv.mimetype, 'text/plain')
+        self.assertEqual(gzip.decompress(rv.data), b'clusters\n' * 1000)
+        rv.close()
+
+        for headers in [{}, {'Accept-Encoding': 'gzip;q=0'}]:
+            rv = self._app.get(ddot_rest_server.ONTOLOGY_NS +
+                               '/qazxsw/rawclusteringoutput',
+                               headers=headers)
+            self.assertEqual(rv.status_code, 200)
+            self.assertFalse('Content-Encoding' in rv.headers)
+            self.assertEqual(rv.data, b'clusters\n' * 1000)
+            rv.close()
+
+    def test_get_raw_output_compressed_while_sending(self):
+        task_dir = os.path.join(self._temp_dir,
+                                ddot_rest_server.DONE_STATUS,
+                                '127.0.0.1', 'qazxsw')
+        os.makedirs(task_dir, mode=0o755)
+        rawfile = os.path.join(task_dir, ddot_rest_server.CLUSTEROUT)
+        with open(rawfile, 'wb') as f:
+            f.write(b'clusters\n')
+
+        def compress_then_send(path, **kwargs):
+            # task runner compresses output between check and open
+            ddot_rest_server.compress_file(rawfile, rawfile +
+                                           ddot_rest_server.COMPRESSED_SUFFIX)
+            os.unlink(rawfile)
+            raise FileNotFoundError(path)
+
+        with mock.patch.object(ddot_rest_server.flask, 'send_file',
+                               side_effect=compress_then_send):
+            rv = self._app.get(ddot_rest_server.ONTOLOGY_NS +
+                               '/qazxsw/rawclusteringoutput')
+            self.assertEqual(rv.status_code, 200)
+            self.assertEqual(rv.data, b'clusters\n')
+            rv.close()
+
     def test_get_id_found_in_done_status_no_result_file(self):
         task_dir = os.path.join(self._temp_dir,
                                 ddot_rest_server.DONE_STATUS,
@@ -324,5 +1041,278 @@ class TestDdot_rest(unittest.TestCase):
         self.assertEqual(data[ddot_rest_server.RESULT_KEY]['hello'], 'there')
         self.assertEqual(rv.status_code, 200)
 
+    def test_get_id_with_wait_task_completes(self):
+        ddot_rest_server.app.config[ddot_rest_server.SLEEP_TIME_KEY] = 1
+        procdir = os.path.join(ddot_rest_server.get_processing_dir(),
+                               '127.0.0.1', 'qazxsw')
+        os.makedirs(procdir, mode=0o755)
+        donedir = os.path.join(ddot_rest_server.get_done_dir(),
+                               '127.0.0.1', 'qazxsw')
+
+        def finish_task():
+            with open(os.path.join(procdir, ddot_rest_server.RESULT),
+                      'w') as f:
+                f.write('{ "hello": "there"}')
+            shutil.move(procdir, donedir)
+            ddot_rest_server.get_task_index().update('qazxsw', 'done',
+                                                     '127.0.0.1', donedir)
+
+        timer = threading.Timer(0.2, finish_task)
+        timer.start()
+        try:
+            rv = self._app.get(ddot_rest_server.ONTOLOGY_NS +
+                               '/qazxsw?wait=5')
+        finally:
+            timer.join()
+        data = json.loads(rv.data)
+        self.assertEqual(data[ddot_rest_server.STATUS_RESULT_KEY],
+                         ddot_rest_server.DONE_STATUS)
+        self.assertEqual(data[ddot_rest_server.RESULT_KEY]['hello'], 'there')
+        self.assertEqual(rv.status_code, 200)
+
+    def test_get_id_with_wait_timeout_and_invalid_wait(self):
+        ddot_rest_server.app.config[ddot_rest_server.MAX_WAIT_KEY] = 0.2
+        task_dir = os.path.join(self._temp_dir,
+                                ddot_rest_server.SUBMITTED_STATUS,
+                                '45.67.54.33', 'qazxsw')
+        os.makedirs(task_dir, mode=0o755)
+        try:
+            rv = self._app.get(ddot_rest_server.ONTOLOGY_NS +
+                               '/qazxsw?wait=100')
+            data = json.loads(rv.data)
+            self.assertEqual(data[ddot_rest_server.STATUS_RESULT_KEY],
+                             ddot_rest_server.SUBMITTED_STATUS)
+            self.assertEqual(rv.status_code, 200)
+
+            rv = self._app.get(ddot_rest_server.ONTOLOGY_NS +
+                               '/qazxsw?wait=foo')
+            data = json.loads(rv.data)
+            self.assertEqual(data[ddot_rest_server.STATUS_RESULT_KEY],
+                             ddot_rest_server.SUBMITTED_STATUS)
+        finally:
+            ddot_rest_server.app.config[ddot_rest_server.MAX_WAIT_KEY] = 30
+
+    def test_get_id_with_wait_max_waits(self):
+        task_dir = os.path.join(self._temp_dir,
+                                ddot_rest_server.SUBMITTED_STATUS,
+                                '127.0.0.1', 'qazxsw')
+        os.makedirs(task_dir, mode=0o755)
+        ddot_rest_server.app.config[ddot_rest_server.MAX_WAITS_KEY] = 1
+        try:
+            self.assertTrue(ddot_rest_server.acquire_wait())
+            try:
+                self.assertFalse(ddot_rest_server.acquire_wait())
+                # limit reached so status is returned without waiting
+                start = time.time()
+                rv = self._app.get(ddot_rest_server.ONTOLOGY_NS +
+                                   '/qazxsw?wait=5')
+                self.assertTrue(time.time() - start < 4)
+                self.assertEqual(rv.status_code, 200)
+                self.assertEqual(rv.json[ddot_rest_server.STATUS_RESULT_KEY],
+                                 ddot_rest_server.SUBMITTED_STATUS)
+            finally:
+                ddot_rest_server.release_wait()
+
+            ddot_rest_server.app.config[ddot_rest_server.MAX_WAIT_KEY] = 0.1
+            rv = self._app.get(ddot_rest_server.ONTOLOGY_NS +
+                               '/qazxsw?wait=5')
+            self.assertEqual(rv.status_code, 200)
+            self.assertEqual(ddot_rest_server._open_requests[ddot_rest_server.MAX_WAITS_KEY], 0)
+        finally:
+            ddot_rest_server.app.config[ddot_rest_server.MAX_WAITS_KEY] = 2
+            ddot_rest_server.app.config[ddot_rest_server.MAX_WAIT_KEY] = 30
+
+    def test_get_events_task_not_found(self):
+        rv = self._app.get(ddot_rest_server.ONTOLOGY_NS + '/1234/events')
+        self.assertEqual(rv.status_code, 200)
+        self.assertEqual(rv.mimetype, 'text/event-stream')
+        data = rv.data.decode('utf-8')
+        self.assertTrue(data.startswith('retry: '))
+        self.assertTrue('event: notfound\n' in data)
+
+    def test_get_events_max_streams(self):
+        ddot_rest_server.app.config[ddot_rest_server.MAX_STREAMS_KEY] = 1
+        try:
+            self.assertTrue(ddot_rest_server.acquire_event_stream())
+            try:
+                self.assertFalse(ddot_rest_server.acquire_event_stream())
+                rv = self._app.get(ddot_rest_server.ONTOLOGY_NS +
+                                   '/1234/events')
+                self.assertEqual(rv.status_code, 503)
+                data = json.loads(rv.data)
+                self.assertEqual(data['message'],
+                                 'Too many open event streams')
+            finally:
+                ddot_rest_server.release_event_stream()
+
+            # stream is released once response is closed
+            for x in range(2):
+                rv = self._app.get(ddot_rest_server.ONTOLOGY_NS +
+                                   '/1234/events')
+                self.assertEqual(rv.status_code, 200)
+                self.assertTrue('event: notfound\n' in
+                                rv.data.decode('utf-8'))
+                rv.close()
+            self.assertEqual(ddot_rest_server._open_requests[ddot_rest_server.MAX_STREAMS_KEY], 0)
+        finally:
+            ddot_rest_server.app.config[ddot_rest_server.MAX_STREAMS_KEY] = 2
+
+    def test_get_events_task_transitions(self):
+        ddot_rest_server.app.config[ddot_rest_server.SLEEP_TIME_KEY] = 1
+        tindex = ddot_rest_server.get_task_index()
+        subdir = os.path.join(ddot_rest_server.get_submit_dir(),
+                              '127.0.0.1', 'qazxsw')
+        os.makedirs(subdir, mode=0o755)
+        tindex.update('qazxsw', ddot_rest_server.SUBMITTED_STATUS,
+                      '127.0.0.1', subdir)
+        procdir = os.path.join(ddot_rest_server.get_processing_dir(),
+                               '127.0.0.1', 'qazxsw')
+        donedir = os.path.join(ddot_rest_server.get_done_dir(),
+                               '127.0.0.1', 'qazxsw')
+
+        def process_task():
+            shutil.move(subdir, procdir)
+            tindex.update('qazxsw', ddot_rest_server.PROCESSING_STATUS,
+                          '127.0.0.1', procdir)
+            time.sleep(0.2)
+            with open(os.path.join(procdir, ddot_rest_server.TASK_JSON),
+                      'w') as f:
+                json.dump({ddot_rest_server.ERROR_PARAM: 'bad'}, f)
+            shutil.move(procdir, donedir)
+            tindex.update('qazxsw', ddot_rest_server.DONE_STATUS,
+                          '127.0.0.1', donedir)
+
+        timer = threading.Timer(0.2, process_task)
+        timer.start()
+        try:
+            rv = self._app.get(ddot_rest_server.ONTOLOGY_NS +
+                               '/qazxsw/events')
+            data = rv.data.decode('utf-8')
+        finally:
+            timer.join()
+        events = [line[len('event: '):] for line in data.split('\n')
+                  if line.startswith('event: ')]
+        self.assertEqual(events, [ddot_rest_server.SUBMITTED_STATUS,
+                                  ddot_rest_server.PROCESSING_STATUS,
+                                  ddot_rest_server.ERROR_STATUS])
+        self.assertTrue('"id": "qazxsw"' in data)
+
+    def test_get_events_many_tasks(self):
+        ddot_rest_server.app.config[ddot_rest_server.SLEEP_TIME_KEY] = 1
+        tindex = ddot_rest_server.get_task_index()
+        subdir = os.path.join(ddot_rest_server.get_submit_dir(),
+                              '127.0.0.1', 'qazxsw')
+        os.makedirs(subdir, mode=0o755)
+        tindex.update('qazxsw', ddot_rest_server.SUBMITTED_STATUS,
+                      '127.0.0.1', subdir)
+        donedir = os.path.join(ddot_rest_server.get_done_dir(),
+                               '127.0.0.1', 'edcrfv')
+        os.makedirs(donedir, mode=0o755)
+        tindex.update('edcrfv', ddot_rest_server.DONE_STATUS,
+                      '127.0.0.1', donedir)
+        qdonedir = os.path.join(ddot_rest_server.get_done_dir(),
+                                '127.0.0.1', 'qazxsw')
+
+        def finish_task():
+            shutil.move(subdir, qdonedir)
+            tindex.update('qazxsw', ddot_rest_server.DONE_STATUS,
+                          '127.0.0.1', qdonedir)
+
+        timer = threading.Timer(0.2, finish_task)
+        timer.start()
+        try:
+            rv = self._app.get(ddot_rest_server.ONTOLOGY_NS +
+                               '/events?ids=qazxsw,edcrfv,,nope,qazxsw')
+            self.assertEqual(rv.status_code, 200)
+            data = rv.data.decode('utf-8')
+            rv.close()
+        finally:
+            timer.join()
+        events = [json.loads(line[len('data: '):])
+                  for line in data.split('\n')
+                  if line.startswith('data: ')]
+        self.assertEqual(events[:3],
+                         [{'status': 'submitted', 'id': 'qazxsw'},
+                          {'status': 'done', 'id': 'edcrfv'},
+                          {'status': 'notfound', 'id': 'nope'}])
+        self.assertEqual(events[3:], [{'status': 'done', 'id': 'qazxsw'}])
+
+    def test_get_events_many_tasks_invalid(self):
+        rv = self._app.get(ddot_rest_server.ONTOLOGY_NS + '/events')
+        self.assertEqual(rv.status_code, 400)
+        rv = self._app.get(ddot_rest_server.ONTOLOGY_NS + '/events?ids=,')
+        self.assertEqual(rv.status_code, 400)
+        ddot_rest_server.app.config[ddot_rest_server.MAX_STREAM_TASKS_KEY] = 2
+        try:
+            rv = self._app.get(ddot_rest_server.ONTOLOGY_NS +
+                               '/events?ids=a,b,c')
+            self.assertEqual(rv.status_code, 400)
+            self.assertEqual(json.loads(rv.data)['message'], 'Invalid ids')
+        finally:
+            ddot_rest_server.app.config[ddot_rest_server.MAX_STREAM_TASKS_KEY] = 1000
+
+    def test_generate_task_events_timeout(self):
+        task_dir = os.path.join(ddot_rest_server.get_submit_dir(),
+                                '1.2.3.4', 'qazxsw')
+        os.makedirs(task_dir, mode=0o755)
+        res = list(ddot_rest_server.generate_task_events(['qazxsw'],
+                                                         timeout=0.1))
+        self.assertEqual(len(res), 3)
+        self.assertTrue(res[1].startswith('event: submitted\n'))
+        self.assertEqual(res[2], ': keepalive\n\n')
+
+    def test_get_id_found_in_done_status_conditional_requests(self):
+        task_dir = os.path.join(self._temp_dir,
+                                ddot_rest_server.DONE_STATUS,
+                                '45.67.54.33', 'qazxsw')
+        os.makedirs(task_dir, mode=0o755)
+        resfile = os.path.join(task_dir, ddot_rest_server.RESULT)
+        with open(resfile, 'w') as f:
+            json.dump({'ndexurl': 'http://foo', 'list': [1, 2, 3]}, f)
+        tfile = os.path.join(task_dir, ddot_rest_server.TASK_JSON)
+        with open(tfile, 'w') as f:
+            json.dump({'alpha': 0.1, 'remoteip': '45.67.54.33'}, f)
+
+        rv = self._app.get(ddot_rest_server.ONTOLOGY_NS + '/qazxsw')
+        self.assertEqual(rv.status_code, 200)
+        self.assertEqual(rv.mimetype, 'application/json')
+        self.assertEqual(int(rv.headers['Content-Length']), len(rv.data))
+        data = json.loads(rv.data)
+        self.assertEqual(data, {ddot_rest_server.STATUS_RESULT_KEY:
+                                ddot_rest_server.DONE_STATUS,
+                                ddot_rest_server.PARAMETERS_KEY:
+                                    {'alpha': 0.1},
+                                ddot_rest_server.RESULT_KEY:
+                                    {'ndexurl': 'http://foo',
+                                     'list': [1, 2, 3]}})
+        etag = rv.headers['ETag']
+        last_modified = rv.headers['Last-Modified']
+        self.assertTrue(etag is not None)
+        self.assertTrue(last_modified is not None)
+
+        rv = self._app.get(ddot_rest_server.ONTOLOGY_NS + '/qazxsw',
+                           headers={'If-None-Match': etag})
+        self.assertEqual(rv.status_code, 304)
+        self.assertEqual(rv.data, b'')
+
+        rv = self._app.get(ddot_rest_server.ONTOLOGY_NS + '/qazxsw',
+                           headers={'If-Modified-Since': last_modified})
+        self.assertEqual(rv.status_code, 304)
+
+        rv = self._app.get(ddot_rest_server.ONTOLOGY_NS + '/qazxsw',
+                           headers={'If-None-Match': '"foo"'})
+        self.assertEqual(rv.status_code, 200)
+
+    def test_get_id_found_in_done_status_empty_result_file(self):
+        task_dir = os.path.join(self._temp_dir,
+                                ddot_rest_server.DONE_STATUS,
+                                '45.67.54.33', 'qazxsw')
+        os.makedirs(task_dir, mode=0o755)
+        open(os.path.join(task_dir, ddot_rest_server.RESULT), 'a').close()
+        rv = self._app.get(ddot_rest_server.ONTOLOGY_NS + '/qazxsw')
+        self.assertEqual(rv.status_code, 200)
+        data = json.loads(rv.data)
+        self.assertEqual(data[ddot_rest_server.RESULT_KEY], None)
+
     def test_log_task_json_file_with_none(self):
         self.assertEqual(ddot_rest_server.log_task_json_file(None), None)
@@ -4,10 +4,17 @@
 """Tests for `ddot_taskrunner` script."""
 
 import os
+import stat
 import json
+import hashlib
 import unittest
 import shutil
 import tempfile
+import time
+import sys
+import gzip
+import threading
+import requests
 from unittest.mock import MagicMock
 
 
@@ -17,6 +24,71 @@ from ddot_rest_server.ddot_taskrunner import FileBasedTask
 from ddot_rest_server.ddot_taskrunner import FileBasedSubmittedTaskFactory
 from ddot_rest_server.ddot_taskrunner import DeletedFileBasedTaskFactory
 from ddot_rest_server.ddot_taskrunner import DDotTaskRunner
+from ddot_rest_server.ddot_taskrunner import ClusterResultCache
+from ddot_rest_server.ddot_taskrunner import TaskLeaseHeartbeat
+from ddot_rest_server.ddot_taskrunner import AbandonedTaskReclaimer
+from ddot_rest_server.ddot_taskrunner import WarmDDotContainer
+from ddot_rest_server.ddot_taskrunner import WarmContainerPool
+
+
+# stands in for runddot.py --worker, echos the last argument of each
+# job as the result and exits if that argument is 'die'
+FAKE_WORKER = """
+import sys
+import json
+for line in sys.stdin:
+    job = json.loads(line)
+    sys.stderr.write('running ' + str(job['id']) + '\\n')
+    if job['args'][-1] == 'die':
+        sys.exit(1)
+    sys.stdout.write('RESULT:' + job['args'][-1] + '\\n')
+    sys.stdout.write('DONE:' + str(job['id']) + '\\n')
+    sys.stdout.flush()
+"""
+
+# stands in for runddot.py for local and in process executors
+FAKE_RUNDDOT = """
+import sys
+import argparse
+
+
+def _parse_arguments(desc, args):
+    parser = argparse.ArgumentParser(description=desc)
+    parser.add_argument('input')
+    parser.add_argument('--alpha', type=float, default=0.05)
+    parser.add_argument('--clixopath')
+    parser.add_argument('--output')
+    parser.add_argument('--beta')
+    parser.add_argument('--ndexname')
+    parser.add_argument('--ndexserver')
+    parser.add_argument('--ndexuser')
+    parser.add_argument('--ndexpass')
+    parser.add_argument('--clusteroutput')
+    parser.add_argument('--clusteronly', action='store_true')
+    return parser.parse_args(args)
+
+
+def get_ddot_result(theargs):
+    if theargs.alpha == 0:
+        return None, 'alpha is 0'
+    if theargs.clusteronly:
+        with open(theargs.output, 'w') as f:
+            f.write('clusters\\n')
+        return None, None
+    return ('http://ndex/#/network/' + theargs.input + '-' +
+            str(theargs.clixopath)), None
+
+
+if __name__ == '__main__':
+    theargs = _parse_arguments('', sys.argv[1:])
+    url, emsg = get_ddot_result(theargs)
+    if emsg is not None:
+        sys.stdout.write('ERROR:' + emsg + '\\n')
+    elif url is None:
+        sys.stdout.write('CLUSTERED:' + theargs.output + '\\n')
+    else:
+        sys.stdout.write('RESULT:' + url + '\\n')
+"""
 
 
 class TestDdotTaskRunner(unittest.TestCase):
@@ -186,6 +258,10 @@ class TestDdotTaskRunner(unittest.TestCase):
             self.assertTrue(os.path.isdir(task.get_taskdir()))
             self.assertTrue(ddot_rest_server.PROCESSING_STATUS in
                             task.get_taskdir())
+            self.assertEqual(ddot_rest_server.TaskIndex(temp_dir).
+                             lookup('qwerty-qwerty'),
+                             (ddot_rest_server.PROCESSING_STATUS,
+                              '192.168.1.1', task.get_taskdir()))
 
             # try a move from process to done
             self.assertEqual(task.move_task(ddot_rest_server.DONE_STATUS),
@@ -225,6 +301,176 @@ class TestDdotTaskRunner(unittest.TestCase):
         finally:
             shutil.rmtree(temp_dir)
 
+    def test_move_task_already_moved(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            ataskdir = os.path.join(temp_dir,
+                                    ddot_rest_server.SUBMITTED_STATUS,
+                                    '192.168.1.1', 'qwerty')
+            os.makedirs(ataskdir)
+            task = FileBasedTask(ataskdir, {})
+            othertask = FileBasedTask(ataskdir, {})
+            self.assertEqual(task.move_task(ddot_rest_server.
+                                            PROCESSING_STATUS), None)
+            res = othertask.move_task(ddot_rest_server.PROCESSING_STATUS)
+            self.assertTrue('no longer exists' in res)
+            self.assertEqual(othertask.get_taskdir(), ataskdir)
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_move_task_os_error(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            ataskdir = os.path.join(temp_dir,
+                                    ddot_rest_server.SUBMITTED_STATUS,
+                                    '192.168.1.1', 'qwerty')
+            os.makedirs(ataskdir)
+            task = FileBasedTask(ataskdir, {})
+            task._rename_taskdir = MagicMock(side_effect=PermissionError('no'))
+            res = task.move_task(ddot_rest_server.PROCESSING_STATUS)
+            self.assertTrue(res.startswith('Unable to move task'))
+            self.assertEqual(task.get_taskdir(), ataskdir)
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_claim_task_failure_reported_to_factory(self):
+        mocktaskfac = MagicMock()
+        task = MagicMock()
+        task.move_task = MagicMock(return_value='error')
+        runner = DDotTaskRunner(wait_time=0, taskfactory=mocktaskfac)
+        self.assertFalse(runner._claim_task(mocktaskfac, task,
+                                            ddot_rest_server.
+                                            PROCESSING_STATUS))
+        mocktaskfac.claim_failed.assert_called_once_with(task)
+
+        task.move_task = MagicMock(return_value=None)
+        self.assertTrue(runner._claim_task(mocktaskfac, task,
+                                           ddot_rest_server.
+                                           PROCESSING_STATUS))
+        self.assertEqual(mocktaskfac.claim_failed.call_count, 1)
+
+    def test_filebasedtask_lease(self):
+        task = FileBasedTask(None, None)
+        self.assertEqual(task.write_lease(), 'Task dir is None')
+        self.assertEqual(task.renew_lease(), 'Task dir is None')
+        self.assertEqual(task.remove_lease(), None)
+        self.assertEqual(task.get_lease_age(), None)
+        temp_dir = tempfile.mkdtemp()
+        try:
+            task = FileBasedTask(os.path.join(temp_dir, 'nope'), {})
+            self.assertEqual(task.get_lease_age(), None)
+            self.assertTrue(task.renew_lease() is not None)
+
+            task = FileBasedTask(temp_dir, {})
+            # no lease so age of directory is used
+            self.assertTrue(task.get_lease_age() < 60)
+            self.assertEqual(task.write_lease(), None)
+            leasefile = os.path.join(temp_dir, dt.LEASE_FILE)
+            os.utime(leasefile, (time.time() - 100, time.time() - 100))
+            self.assertTrue(task.get_lease_age() >= 100)
+            self.assertEqual(task.renew_lease(), None)
+            self.assertTrue(task.get_lease_age() < 60)
+            self.assertEqual(task.remove_lease(), None)
+            self.assertFalse(os.path.isfile(leasefile))
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_task_lease_heartbeat(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            task = FileBasedTask(temp_dir, {})
+            leasefile = os.path.join(temp_dir, dt.LEASE_FILE)
+            with TaskLeaseHeartbeat(task, None):
+                self.assertFalse(os.path.isfile(leasefile))
+
+            with TaskLeaseHeartbeat(task, 0.05):
+                self.assertTrue(os.path.isfile(leasefile))
+                os.utime(leasefile, (time.time() - 100, time.time() - 100))
+                time.sleep(0.3)
+                self.assertTrue(task.get_lease_age() < 60)
+            self.assertFalse(os.path.isfile(leasefile))
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_abandoned_task_reclaimer(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            reclaimer = AbandonedTaskReclaimer(None, 10)
+            self.assertEqual(reclaimer.reclaim_tasks(), 0)
+            reclaimer = AbandonedTaskReclaimer(temp_dir, 10, max_reclaims=1)
+            self.assertEqual(reclaimer.get_lease_time(), 10)
+            self.assertEqual(reclaimer.reclaim_tasks(), 0)
+
+            procdir = os.path.join(temp_dir,
+                                   ddot_rest_server.PROCESSING_STATUS)
+            livetask = os.path.join(procdir, '1.2.3.4', 'live')
+            deadtask = os.path.join(procdir, '1.2.3.4', 'dead')
+            for tdir in [livetask, deadtask]:
+                os.makedirs(tdir)
+                with open(os.path.join(tdir, ddot_rest_server.TASK_JSON),
+                          'w') as f:
+                    json.dump({'hi': 'there'}, f)
+                FileBasedTask(tdir, {}).write_lease()
+            open(os.path.join(procdir, 'somefile'), 'a').close()
+            open(os.path.join(procdir, '1.2.3.4', 'somefile'), 'a').close()
+            deadlease = os.path.join(deadtask, dt.LEASE_FILE)
+            os.utime(deadlease, (time.time() - 100, time.time() - 100))
+
+            # dead task goes back to submitted
+            self.assertEqual(reclaimer.reclaim_tasks(), 1)
+            self.assertTrue(os.path.isdir(livetask))
+            subtask = os.path.join(temp_dir,
+                                   ddot_rest_server.SUBMITTED_STATUS,
+                                   '1.2.3.4', 'dead')
+            self.assertFalse(os.path.isfile(os.path.join(subtask,
+                                                         dt.LEASE_FILE)))
+            with open(os.path.join(subtask, ddot_rest_server.TASK_JSON),
+                      'r') as f:
+                data = json.load(f)
+            self.assertEqual(data[dt.RECLAIM_COUNT_KEY], 1)
+            self.assertEqual(data['hi'], 'there')
+
+            # abandoned again it goes to error
+            task = FileBasedTask(subtask, data)
+            task.move_task(ddot_rest_server.PROCESSING_STATUS)
+            task.write_lease()
+            os.utime(os.path.join(task.get_taskdir(), dt.LEASE_FILE),
+                     (time.time() - 100, time.time() - 100))
+            self.assertEqual(reclaimer.reclaim_tasks(), 1)
+            donetask = os.path.join(temp_dir, ddot_rest_server.DONE_STATUS,
+                                    '1.2.3.4', 'dead')
+            with open(os.path.join(donetask, ddot_rest_server.TASK_JSON),
+                      'r') as f:
+                data = json.load(f)
+            self.assertEqual(data[ddot_rest_server.ERROR_PARAM],
+                             'Task abandoned by task runner 2 times')
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_abandoned_task_reclaimer_uploading_task(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            reclaimer = AbandonedTaskReclaimer(temp_dir, 10)
+            deadtask = os.path.join(temp_dir,
+                                    ddot_rest_server.UPLOADING_STATUS,
+                                    '1.2.3.4', 'dead')
+            os.makedirs(deadtask)
+            with open(os.path.join(deadtask, ddot_rest_server.TASK_JSON),
+                      'w') as f:
+                json.dump({'hi': 'there'}, f)
+            FileBasedTask(deadtask, {}).write_lease()
+            os.utime(os.path.join(deadtask, dt.LEASE_FILE),
+                     (time.time() - 100, time.time() - 100))
+
+            # dead upload goes back to clustered, not submitted
+            self.assertEqual(reclaimer.reclaim_tasks(), 1)
+            self.assertTrue(os.path.isdir(os.path.join(temp_dir,
+                                                       ddot_rest_server.
+                                                       CLUSTERED_STATUS,
+                                                       '1.2.3.4', 'dead')))
+        finally:
+            shutil.rmtree(temp_dir)
+
     def test_filebasedtask_delete_task_files(self):
         temp_dir = tempfile.mkdtemp()
         try:
@@ -256,6 +502,9 @@ class TestDdotTaskRunner(unittest.TestCase):
             open(os.path.join(valid_dir,
                               ddot_rest_server.INTERACTION_FILE_PARAM),
                  'a').close()
+            open(os.path.join(valid_dir,
+                              ddot_rest_server.INTERACTION_FILE_SIDECAR),
+                 'a').close()
 
             task = FileBasedTask(valid_dir, {})
             self.assertEqual(task.delete_task_files(), None)
@@ -279,6 +528,143 @@ class TestDdotTaskRunner(unittest.TestCase):
         finally:
             shutil.rmtree(temp_dir)
 
+    def test_filebasedtask_delete_task_files_releases_blob(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            store = ddot_rest_server.BlobStore(temp_dir)
+            digest = 'a' * 64
+            taskdirs = []
+            for taskid in ['one', 'two']:
+                taskdir = os.path.join(temp_dir,
+                                       ddot_rest_server.DONE_STATUS,
+                                       '1.2.3.4', taskid)
+                os.makedirs(taskdir)
+                ifile = os.path.join(taskdir,
+                                     ddot_rest_server.INTERACTION_FILE_PARAM)
+                with open(ifile, 'w') as f:
+                    f.write('data')
+                with open(os.path.join(taskdir, ddot_rest_server.TASK_JSON),
+                          'w') as f:
+                    json.dump({ddot_rest_server.
+                               INTERACTION_FILE_SHA256_PARAM: digest}, f)
+                self.assertTrue(store.add(ifile, digest))
+                taskdirs.append(taskdir)
+            blob = store.get_blob_path(digest)
+
+            # digest is read from task json if not in task dict
+            self.assertEqual(FileBasedTask(taskdirs[0], {}).delete_task_files(),
+                             None)
+            self.assertTrue(os.path.isfile(blob))
+            task = FileBasedTask(taskdirs[1],
+                                 {ddot_rest_server.
+                                  INTERACTION_FILE_SHA256_PARAM: digest})
+            self.assertEqual(task.delete_task_files(), None)
+            self.assertFalse(os.path.isfile(blob))
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_filebasedtask_delete_task_files_removes_batch(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            batchdir = os.path.join(temp_dir, ddot_rest_server.BATCHES)
+            os.makedirs(batchdir)
+            batchfile = os.path.join(batchdir, 'batch1.json')
+            with open(batchfile, 'w') as f:
+                json.dump({ddot_rest_server.TASKID_KEY: 'batch1',
+                           ddot_rest_server.REMOTEIP_PARAM: '1.2.3.4',
+                           ddot_rest_server.BATCH_TASKS_KEY: ['one',
+                                                              'two']}, f)
+            taskdirs = []
+            for taskid, state in [('one', ddot_rest_server.DONE_STATUS),
+                                  ('two', ddot_rest_server.SUBMITTED_STATUS)]:
+                taskdir = os.path.join(temp_dir, state, '1.2.3.4', taskid)
+                os.makedirs(taskdir)
+                with open(os.path.join(taskdir, ddot_rest_server.TASK_JSON),
+                          'w') as f:
+                    json.dump({ddot_rest_server.BATCH_ID_PARAM: 'batch1'}, f)
+                taskdirs.append(taskdir)
+
+            # batch id is read from task json if not in task dict
+            self.assertEqual(FileBasedTask(taskdirs[0], {}).delete_task_files(),
+                             None)
+            self.assertTrue(os.path.isfile(batchfile))
+
+            task = FileBasedTask(taskdirs[1],
+                                 {ddot_rest_server.BATCH_ID_PARAM: 'batch1'})
+            self.assertEqual(task.delete_task_files(), None)
+            self.assertFalse(os.path.isfile(batchfile))
+
+            # missing batch file is fine
+            self.assertFalse(dt._remove_batch_if_done(temp_dir, 'batch1'))
+            self.assertFalse(dt._remove_batch_if_done(temp_dir, None))
+
+            # unreadable batch file is left alone
+            with open(batchfile, 'w') as f:
+                f.write('{')
+            self.assertFalse(dt._remove_batch_if_done(temp_dir, 'batch1'))
+            self.assertTrue(os.path.isfile(batchfile))
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_filebasedtask_compress_task_files(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            self.assertEqual(FileBasedTask(None, {}).compress_task_files(),
+                             'Task dir is None')
+            store = ddot_rest_server.BlobStore(temp_dir)
+            digest = 'b' * 64
+            tasks = []
+            for taskid in ['one', 'two']:
+                task = self._make_task(temp_dir, taskid=taskid,
+                                       digest=digest)
+                ifile = task.get_interactionfile()
+                with open(ifile, 'w') as f:
+                    f.write('a\tb\t1\n')
+                self.assertTrue(store.add(ifile, digest))
+                with open(os.path.join(task.get_taskdir(),
+                                       ddot_rest_server.CLUSTEROUT),
+                          'w') as f:
+                    f.write('clusters\n')
+                open(os.path.join(task.get_taskdir(),
+                                  ddot_rest_server.INTERACTION_FILE_SIDECAR),
+                     'w').close()
+                task.move_task(ddot_rest_server.DONE_STATUS)
+                tasks.append(task)
+
+            self.assertEqual(tasks[0].compress_task_files(), None)
+            self.assertTrue(os.path.isfile(store.get_blob_path(digest)))
+            self.assertEqual(tasks[1].compress_task_files(), None)
+            # plain blob is released once no task uses it
+            self.assertFalse(os.path.isfile(store.get_blob_path(digest)))
+            gzblob = store.get_blob_path(digest, compressed=True)
+            gzfiles = []
+            for task in tasks:
+                self.assertEqual(sorted(os.listdir(task.get_taskdir())),
+                                 [ddot_rest_server.INTERACTION_FILE_PARAM +
+                                  ddot_rest_server.COMPRESSED_SUFFIX,
+                                  ddot_rest_server.CLUSTEROUT +
+                                  ddot_rest_server.COMPRESSED_SUFFIX])
+                gzfile = os.path.join(task.get_taskdir(),
+                                      ddot_rest_server.
+                                      INTERACTION_FILE_PARAM +
+                                      ddot_rest_server.COMPRESSED_SUFFIX)
+                self.assertTrue(os.path.samefile(gzfile, gzblob))
+                gzfiles.append(gzfile)
+                with gzip.open(os.path.join(task.get_taskdir(),
+                                            ddot_rest_server.CLUSTEROUT +
+                                            ddot_rest_server.
+                                            COMPRESSED_SUFFIX), 'rb') as f:
+                    self.assertEqual(f.read(), b'clusters\n')
+            with gzip.open(gzfiles[0], 'rb') as f:
+                self.assertEqual(f.read(), b'a\tb\t1\n')
+
+            # deleting tasks releases compressed blob
+            for task in tasks:
+                self.assertEqual(task.delete_task_files(), None)
+            self.assertFalse(os.path.isfile(gzblob))
+        finally:
+            shutil.rmtree(temp_dir)
+
     def test_filebasedsubmittedtaskfactory_get_next_task_taskdirnone(self):
         fac = FileBasedSubmittedTaskFactory(None)
         self.assertEqual(fac.get_next_task(), None)
@@ -333,17 +719,149 @@ class TestDdotTaskRunner(unittest.TestCase):
             with open(goodjson, 'w') as f:
                 json.dump({'hi': 'there'}, f)
 
+            # the older task with empty json is skipped
             res = fac.get_next_task()
             self.assertEqual(res.get_taskdict(), {'hi': 'there'})
-            self.assertEqual(fac.get_size_of_problem_list(), 0)
+            self.assertEqual(fac.get_size_of_problem_list(), 1)
 
             # try again since we didn't move it
             res = fac.get_next_task()
             self.assertEqual(res.get_taskdict(), {'hi': 'there'})
+            self.assertEqual(fac.get_size_of_problem_list(), 1)
+
+            # fix the json and task should be picked up
+            with open(taskjsonfile, 'w') as f:
+                json.dump({'fixed': 'task'}, f)
+            os.utime(taskjsonfile, (0, 0))
+            res = fac.get_next_task()
+            self.assertEqual(res.get_taskdict(), {'fixed': 'task'})
             self.assertEqual(fac.get_size_of_problem_list(), 0)
         finally:
             shutil.rmtree(temp_dir)
 
+    def test_filebasedsubmittedtaskfactory_fair_share(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            sdir = os.path.join(temp_dir, ddot_rest_server.SUBMITTED_STATUS)
+
+            def add_task(ipaddr, taskid, submittime):
+                tdir = os.path.join(sdir, ipaddr, taskid)
+                os.makedirs(tdir)
+                tdict = {ddot_rest_server.SUBMITTIME_PARAM: submittime}
+                with open(os.path.join(tdir, ddot_rest_server.TASK_JSON),
+                          'w') as f:
+                    json.dump(tdict, f)
+
+            # heavy user floods queue before light users submit
+            for i in range(5):
+                add_task('1.1.1.1', 'heavy' + str(i), 100 + i)
+            add_task('2.2.2.2', 'light0', 200)
+            add_task('3.3.3.3', 'light1', 300)
+            add_task('3.3.3.3', 'light2', 400)
+            add_task('2.2.2.2', 'light3', 500)
+
+            fac = FileBasedSubmittedTaskFactory(temp_dir)
+            order = []
+            while True:
+                task = fac.get_next_task()
+                if task is None:
+                    break
+                order.append(task.get_task_uuid())
+                # simulate runner moving task out of submitted
+                task.move_task(ddot_rest_server.PROCESSING_STATUS)
+                if len(order) == 2:
+                    # new task arriving later is still picked up
+                    add_task('4.4.4.4', 'late', 600)
+            self.assertEqual(order, ['heavy0', 'light0', 'light1', 'late',
+                                     'heavy1', 'light3', 'light2',
+                                     'heavy2', 'heavy3', 'heavy4'])
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_filebasedsubmittedtaskfactory_claim_failed(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            sdir = os.path.join(temp_dir, ddot_rest_server.SUBMITTED_STATUS,
+                                '1.2.3.4')
+            for taskid, submittime in [('stuck', 100), ('next', 200)]:
+                tdir = os.path.join(sdir, taskid)
+                os.makedirs(tdir)
+                with open(os.path.join(tdir, ddot_rest_server.TASK_JSON),
+                          'w') as f:
+                    json.dump({ddot_rest_server.SUBMITTIME_PARAM:
+                               submittime}, f)
+            fac = FileBasedSubmittedTaskFactory(temp_dir)
+            fac.MAX_CLAIM_ATTEMPTS = 2
+            task = fac.get_next_task()
+            self.assertEqual(task.get_task_uuid(), 'stuck')
+
+            # failed claim no longer blocks other tasks from ip
+            fac.claim_failed(task)
+            task = fac.get_next_task()
+            self.assertEqual(task.get_task_uuid(), 'next')
+            self.assertEqual(task.move_task(ddot_rest_server.
+                                            PROCESSING_STATUS), None)
+            self.assertEqual(fac.get_size_of_problem_list(), 0)
+
+            # stuck task is only queued again on full rescan
+            self.assertEqual(fac.get_next_task(), None)
+            fac._last_full_rescan = 0
+            task = fac.get_next_task()
+            self.assertEqual(task.get_task_uuid(), 'stuck')
+            fac.claim_failed(task)
+            self.assertEqual(fac.get_problem_list(),
+                             [os.path.join(sdir, 'stuck')])
+
+            # but not after failing MAX_CLAIM_ATTEMPTS times
+            fac._last_full_rescan = 0
+            self.assertEqual(fac.get_next_task(), None)
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_filebasedsubmittedtaskfactory_missing_state_dir(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            fac = FileBasedSubmittedTaskFactory(temp_dir,
+                                                state=ddot_rest_server.
+                                                CLUSTERED_STATUS)
+            with unittest.mock.patch.object(dt.logger, 'error') as mockerr:
+                self.assertEqual(fac.get_next_task(), None)
+                self.assertEqual(mockerr.call_count, 0)
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_filebasedsubmittedtaskfactory_rereads_reclaimed_task(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            tdir = os.path.join(temp_dir, ddot_rest_server.SUBMITTED_STATUS,
+                                '1.2.3.4', 'abc')
+            os.makedirs(tdir)
+            tjson = os.path.join(tdir, ddot_rest_server.TASK_JSON)
+            with open(tjson, 'w') as f:
+                json.dump({ddot_rest_server.SUBMITTIME_PARAM: 100}, f)
+            fac = FileBasedSubmittedTaskFactory(temp_dir)
+            task = fac.get_next_task()
+            self.assertFalse(dt.RECLAIM_COUNT_KEY in task.get_taskdict())
+
+            # another host claims the task, then it is reclaimed
+            # and put back in the same submitted directory
+            procdir = os.path.join(temp_dir,
+                                   ddot_rest_server.PROCESSING_STATUS,
+                                   '1.2.3.4', 'abc')
+            os.makedirs(os.path.dirname(procdir))
+            os.rename(tdir, procdir)
+            with open(os.path.join(procdir, ddot_rest_server.TASK_JSON),
+                      'w') as f:
+                json.dump({ddot_rest_server.SUBMITTIME_PARAM: 100,
+                           dt.RECLAIM_COUNT_KEY: 1}, f)
+            os.rename(procdir, tdir)
+
+            task = fac.get_next_task()
+            self.assertEqual(task.get_taskdir(), tdir)
+            self.assertEqual(task.get_taskdict()[dt.RECLAIM_COUNT_KEY], 1)
+        finally:
+            shutil.rmtree(temp_dir)
+
     def test_nbgwastaskrunner_run_tasks_no_work(self):
         mocktaskfac = MagicMock()
         mocktaskfac.get_next_task = MagicMock(side_effect=[None, None])
@@ -377,6 +895,80 @@ class TestDdotTaskRunner(unittest.TestCase):
         finally:
             shutil.rmtree(temp_dir)
 
+    def test_run_tasks_in_parallel(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            tasks = []
+            for i in range(4):
+                taskdir = os.path.join(temp_dir,
+                                       ddot_rest_server.SUBMITTED_STATUS,
+                                       '1.2.3.4', 'task' + str(i))
+                os.makedirs(taskdir)
+                tasks.append(FileBasedTask(taskdir, {}))
+            # same task returned twice should only be run once
+            mocktaskfac = MagicMock()
+            mocktaskfac.get_next_task.side_effect = [tasks[0],
+                                                     FileBasedTask(tasks[0].
+                                                                   get_taskdir(),
+                                                                   {}),
+                                                     tasks[1], None,
+                                                     tasks[2], tasks[3]]
+            runner = DDotTaskRunner(wait_time=0, taskfactory=mocktaskfac,
+                                    workers=2)
+            started = []
+            lock = threading.Lock()
+
+            def fake_run_ddot(task):
+                with lock:
+                    started.append(task.get_task_uuid())
+                time.sleep(0.1)
+                return {}, None
+            runner._run_ddot = MagicMock(side_effect=fake_run_ddot)
+            runner.run_tasks(keep_looping=lambda: mocktaskfac.
+                             get_next_task.call_count < 6)
+            self.assertEqual(sorted(started), ['task0', 'task1',
+                                               'task2', 'task3'])
+            donedir = os.path.join(temp_dir, ddot_rest_server.DONE_STATUS,
+                                   '1.2.3.4')
+            self.assertEqual(sorted(os.listdir(donedir)),
+                             ['task0', 'task1', 'task2', 'task3'])
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_wait_for_work(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            # no watch paths just sleeps
+            runner = DDotTaskRunner(wait_time=0)
+            runner._wait_for_work()
+
+            delreqdir = os.path.join(temp_dir,
+                                     ddot_rest_server.DELETE_REQUESTS)
+            runner = DDotTaskRunner(wait_time=0.1, watchpaths=[delreqdir])
+
+            # directory does not exist so wait times out
+            start = time.time()
+            runner._wait_for_work()
+            self.assertTrue(time.time() - start >= 0.1)
+
+            os.makedirs(delreqdir)
+            runner._wait_time = 5
+
+            def add_request():
+                open(os.path.join(delreqdir, 'sometask'), 'a').close()
+
+            timer = threading.Timer(0.2, add_request)
+            timer.start()
+            try:
+                start = time.time()
+                runner._wait_for_work()
+                self.assertTrue(time.time() - start < 5)
+            finally:
+                timer.join()
+                runner._close_watcher()
+        finally:
+            shutil.rmtree(temp_dir)
+
     def test_nbgwastaskrunner_remove_deleted_task(self):
         temp_dir = tempfile.mkdtemp()
         try:
@@ -577,6 +1169,1020 @@ class TestDdotTaskRunner(unittest.TestCase):
         finally:
             shutil.rmtree(temp_dir)
 
+    def test_deletefilebasedtaskfactory_uses_task_index(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            taskid = '02e487ef-79df-4d99-8f22-1ff1d6d52a2a'
+            done_dir = os.path.join(temp_dir, ddot_rest_server.DONE_STATUS,
+                                    '1.2.3.4', taskid)
+            os.makedirs(done_dir, mode=0o755)
+            with open(os.path.join(done_dir,
+                                   ddot_rest_server.TASK_JSON), 'w') as f:
+                json.dump({'hi': 'there'}, f)
+            taskindex = ddot_rest_server.TaskIndex(temp_dir)
+            self.assertEqual(None,
+                             taskindex.update(taskid,
+                                              ddot_rest_server.DONE_STATUS,
+                                              '1.2.3.4', done_dir))
+            tfac = DeletedFileBasedTaskFactory(temp_dir)
+            tfac._searchdirs = []
+            res = tfac._get_task_with_id(taskid)
+            self.assertEqual(done_dir, res.get_taskdir())
+            self.assertEqual({'hi': 'there'}, res.get_taskdict())
+
+            # index out of date, falls back to searching
+            tfac = DeletedFileBasedTaskFactory(temp_dir)
+            self.assertEqual(None,
+                             taskindex.update(taskid,
+                                              ddot_rest_server.
+                                              PROCESSING_STATUS,
+                                              '1.2.3.4',
+                                              os.path.join(temp_dir, 'x')))
+            res = tfac._get_task_with_id(taskid)
+            self.assertEqual(done_dir, res.get_taskdir())
+
+            # ids that are not task directory names are never
+            # matched against other tasks
+            for badid in ['*', '..', '.', '*/' + taskid, '?' + taskid[1:]]:
+                self.assertEqual(None, tfac._get_task_with_id(badid))
+            self.assertTrue(os.path.isdir(done_dir))
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_deletefilebasedtaskfactory_lists_requests_once(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            del_req_dir = os.path.join(temp_dir,
+                                       ddot_rest_server.DELETE_REQUESTS)
+            os.makedirs(del_req_dir, mode=0o755)
+            taskdirs = []
+            for taskid in ['a', 'b', 'c']:
+                taskdir = os.path.join(temp_dir,
+                                       ddot_rest_server.DONE_STATUS,
+                                       '1.2.3.4', taskid)
+                os.makedirs(taskdir, mode=0o755)
+                taskdirs.append(taskdir)
+                open(os.path.join(del_req_dir, taskid), 'w').close()
+            tfac = DeletedFileBasedTaskFactory(temp_dir)
+            with unittest.mock.patch('os.listdir',
+                                     side_effect=os.listdir) as mocklist:
+                for taskdir in taskdirs:
+                    self.assertEqual(taskdir,
+                                     tfac.get_next_task().get_taskdir())
+                self.assertEqual(1, mocklist.call_count)
+            self.assertEqual(None, tfac.get_next_task())
+            self.assertEqual([], os.listdir(del_req_dir))
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_deletefilebasedtaskfactory_defers_running_tasks(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            del_req_dir = os.path.join(temp_dir,
+                                       ddot_rest_server.DELETE_REQUESTS)
+            os.makedirs(del_req_dir, mode=0o755)
+            taskid = '02e487ef-79df-4d99-8f22-1ff1d6d52a2a'
+            a_request = os.path.join(del_req_dir, taskid)
+            open(a_request, 'w').close()
+            dfac = DeletedFileBasedTaskFactory(temp_dir)
+            for state in DeletedFileBasedTaskFactory.BUSY_STATES:
+                taskdir = os.path.join(temp_dir, state, '1.2.3.4', taskid)
+                os.makedirs(taskdir, mode=0o755)
+                with unittest.mock.patch.object(DeletedFileBasedTaskFactory,
+                                                'DEFER_INTERVAL', 0):
+                    self.assertEqual(None, dfac.get_next_task())
+                self.assertTrue(os.path.isfile(a_request))
+                self.assertTrue(os.path.isdir(taskdir))
+                os.rmdir(taskdir)
+
+            # put off request is not looked at again right away
+            donedir = os.path.join(temp_dir, ddot_rest_server.DONE_STATUS,
+                                   '1.2.3.4', taskid)
+            os.makedirs(donedir, mode=0o755)
+            self.assertEqual(None, dfac.get_next_task())
+            self.assertTrue(os.path.isfile(a_request))
+
+            with unittest.mock.patch.object(DeletedFileBasedTaskFactory,
+                                            'DEFER_INTERVAL', 0):
+                self.assertEqual(donedir, dfac.get_next_task().get_taskdir())
+            self.assertFalse(os.path.isfile(a_request))
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_remove_deleted_tasks_in_batches(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            del_req_dir = os.path.join(temp_dir,
+                                       ddot_rest_server.DELETE_REQUESTS)
+            os.makedirs(del_req_dir, mode=0o755)
+            for x in range(5):
+                taskid = 'task' + str(x)
+                os.makedirs(os.path.join(temp_dir,
+                                         ddot_rest_server.DONE_STATUS,
+                                         '1.2.3.4', taskid), mode=0o755)
+                open(os.path.join(del_req_dir, taskid), 'w').close()
+            dfac = DeletedFileBasedTaskFactory(temp_dir)
+            runner = DDotTaskRunner(deletetaskfactory=dfac,
+                                    delete_batch_size=2)
+            self.assertEqual(True, runner._remove_deleted_tasks())
+            self.assertEqual(3, len(os.listdir(del_req_dir)))
+            self.assertEqual(True, runner._remove_deleted_tasks())
+            self.assertEqual(False, runner._remove_deleted_tasks())
+            self.assertEqual([], os.listdir(del_req_dir))
+            self.assertEqual([], os.listdir(os.path.join(temp_dir,
+                                                         ddot_rest_server.
+                                                         DONE_STATUS,
+                                                         '1.2.3.4')))
+
+            runner = DDotTaskRunner()
+            self.assertEqual(False, runner._remove_deleted_tasks())
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def _make_task(self, temp_dir, taskid='abc', digest='12345',
+                   alpha=0.1, beta=0.5):
+        taskdir = os.path.join(temp_dir, ddot_rest_server.PROCESSING_STATUS,
+                               '1.2.3.4', taskid)
+        os.makedirs(taskdir, mode=0o755)
+        open(os.path.join(taskdir,
+                          ddot_rest_server.INTERACTION_FILE_PARAM),
+             'a').close()
+        return FileBasedTask(taskdir,
+                             {ddot_rest_server.ALPHA_PARAM: alpha,
+                              ddot_rest_server.BETA_PARAM: beta,
+                              ddot_rest_server.HIVIEWURL_PARAM: 'http://hi',
+                              ddot_rest_server.
+                              INTERACTION_FILE_SHA256_PARAM: digest})
+
+    def test_clusterresultcache_get_put(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            cachedir = os.path.join(temp_dir, dt.CLUSTER_CACHE_DIR)
+            cache = ClusterResultCache(cachedir)
+            task = self._make_task(temp_dir)
+            self.assertEqual(cache.get(task), None)
+
+            # task without hash is never cached
+            nohash = FileBasedTask(task.get_taskdir(), {})
+            self.assertEqual(cache.get(nohash), None)
+            self.assertEqual(cache.put(nohash, None),
+                             'Task has no interaction file hash')
+
+            self.assertEqual(cache.put(task, None),
+                             'Clustering output not found')
+            cout = os.path.join(task.get_taskdir(),
+                                ddot_rest_server.CLUSTEROUT)
+            open(cout, 'w').close()
+            self.assertEqual(cache.put(task, cout),
+                             'Clustering output is empty')
+            with open(cout, 'w') as f:
+                f.write('clusters')
+            original_umask = os.umask(0o022)
+            try:
+                self.assertEqual(cache.put(task, cout), None)
+            finally:
+                os.umask(original_umask)
+            self.assertEqual(stat.S_IMODE(os.stat(cachedir).st_mode), 0o775)
+            entry = cache.get(task)
+            with open(entry, 'r') as f:
+                self.assertEqual(f.read(), 'clusters')
+            # entry is a hard link, not a copy, of clustering output
+            self.assertTrue(os.path.samefile(entry, cout))
+
+            # output cached by another version is not used
+            self.assertEqual(ClusterResultCache(cachedir,
+                                                version='2').get(task), None)
+
+            # different beta is a miss
+            other = self._make_task(temp_dir, taskid='def', beta=0.6)
+            self.assertEqual(cache.get(other), None)
+            # same parameters and hash is a hit
+            same = self._make_task(temp_dir, taskid='ghi')
+            self.assertEqual(cache.get(same), entry)
+
+            self.assertTrue(cache.invalidate(same))
+            self.assertEqual(cache.get(task), None)
+            self.assertFalse(cache.invalidate(task))
+            self.assertFalse(cache.invalidate(nohash))
+
+            self.assertEqual(cache.put(task, cout), None)
+            self.assertEqual(cache.put(other, cout), None)
+            self.assertEqual(cache.clear(), 2)
+            self.assertEqual(cache.get(task), None)
+            self.assertEqual(cache.get(other), None)
+            self.assertEqual(ClusterResultCache(os.path.join(temp_dir,
+                                                             'foo')).clear(),
+                             0)
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_clusterresultcache_evict(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            cachedir = os.path.join(temp_dir, dt.CLUSTER_CACHE_DIR)
+            cache = ClusterResultCache(cachedir)
+            self.assertEqual(cache.evict(), 0)
+            os.makedirs(cachedir)
+            now = time.time()
+            for name, age in [('old', 1000), ('mid', 500), ('new', 10)]:
+                fp = os.path.join(cachedir, name)
+                with open(fp, 'w') as f:
+                    f.write('x' * 10)
+                os.utime(fp, (now - age, now - age))
+
+            # entry another worker is still writing is left alone
+            tmpentry = os.path.join(cachedir, 'new.1.2' +
+                                    ClusterResultCache.TMP_SUFFIX)
+            with open(tmpentry, 'w') as f:
+                f.write('x' * 100)
+
+            # nothing removed without limits
+            self.assertEqual(cache.evict(), 0)
+
+            cache = ClusterResultCache(cachedir, max_age=900)
+            self.assertEqual(cache.evict(), 1)
+            self.assertEqual(sorted(os.listdir(cachedir)),
+                             ['mid', 'new', os.path.basename(tmpentry)])
+
+            cache = ClusterResultCache(cachedir, max_size=15)
+            self.assertEqual(cache.evict(), 1)
+            self.assertEqual(sorted(os.listdir(cachedir)),
+                             ['new', os.path.basename(tmpentry)])
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_run_ddot_with_cluster_cache(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            cache = ClusterResultCache(os.path.join(temp_dir,
+                                                    dt.CLUSTER_CACHE_DIR))
+            netattrib = MagicMock()
+            runner = DDotTaskRunner(wait_time=0, docker='docker',
+                                    dockerimagename='image',
+                                    runddotpath='/foo/runddot.py',
+                                    netattribsetter=netattrib,
+                                    clustercache=cache)
+            task = self._make_task(temp_dir)
+            cout = os.path.join(task.get_taskdir(),
+                                ddot_rest_server.CLUSTEROUT)
+
+            def fake_docker(cmd, timeout=None, on_timeout=None):
+                with open(cout, 'w') as f:
+                    f.write('clusters')
+                return {ddot_rest_server.NDEXURL_KEY:
+                        'http://ndex/#/network/xyz'}, None
+
+            runner._executor.run_cmd = MagicMock(side_effect=fake_docker)
+            res, emsg = runner._run_ddot(task)
+            self.assertEqual(emsg, None)
+            self.assertEqual(res[ddot_rest_server.NDEXURL_KEY],
+                             'http://ndex/#/network/xyz')
+            cmd = runner._executor.run_cmd.call_args[0][0]
+            self.assertTrue('--output' in cmd)
+            self.assertFalse('--clusteroutput' in cmd)
+            self.assertTrue(cache.get(task) is not None)
+
+            # second task with same input should use cache
+            task = self._make_task(temp_dir, taskid='def')
+            runner._executor.run_cmd = MagicMock(return_value=({
+                ddot_rest_server.NDEXURL_KEY: 'http://ndex/#/network/abc'},
+                None))
+            res, emsg = runner._run_ddot(task)
+            self.assertEqual(emsg, None)
+            cmd = runner._executor.run_cmd.call_args[0][0]
+            self.assertFalse('--output' in cmd)
+            cout = os.path.join(task.get_taskdir(),
+                                ddot_rest_server.CLUSTEROUT)
+            self.assertEqual(cmd[cmd.index('--clusteroutput') + 1], cout)
+            with open(cout, 'r') as f:
+                self.assertEqual(f.read(), 'clusters')
+            self.assertTrue(os.path.samefile(cout, cache.get(task)))
+
+            # rerun after a miss must not write into the cache entry
+            # linked to output of the earlier run
+            entry = cache.get(task)
+            cache._version = 'new'
+
+            def fake_docker_rerun(cmd, timeout=None, on_timeout=None):
+                with open(cout, 'w') as f:
+                    f.write('new clusters')
+                return {ddot_rest_server.NDEXURL_KEY:
+                        'http://ndex/#/network/xyz'}, None
+
+            runner._executor.run_cmd = MagicMock(side_effect=fake_docker_rerun)
+            res, emsg = runner._run_ddot(task)
+            self.assertEqual(emsg, None)
+            with open(entry, 'r') as f:
+                self.assertEqual(f.read(), 'clusters')
+            with open(cache.get(task), 'r') as f:
+                self.assertEqual(f.read(), 'new clusters')
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_get_cluster_cache_version(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            clixo = os.path.join(temp_dir, 'clixo')
+            with open(clixo, 'w') as f:
+                f.write('x')
+            theargs = dt._parse_arguments('hi', [temp_dir, '--executor',
+                                                 dt.LOCAL_EXECUTOR,
+                                                 '--clixopath', clixo])
+            noddot = json.loads(dt._get_cluster_cache_version(theargs,
+                                                              temp_dir))
+            self.assertEqual(noddot[:3], [None, clixo, 1])
+            with open(os.path.join(temp_dir, dt.RUNDDOT), 'w') as f:
+                f.write('print("hi")')
+            version = dt._get_cluster_cache_version(theargs, temp_dir)
+            self.assertEqual(json.loads(version)[0],
+                             hashlib.sha256(b'print("hi")').hexdigest())
+
+            # changing clixo changes version
+            with open(clixo, 'w') as f:
+                f.write('xy')
+            self.assertNotEqual(dt._get_cluster_cache_version(theargs,
+                                                              temp_dir),
+                                version)
+
+            # docker image name is used if its id cannot be found
+            theargs = dt._parse_arguments('hi', [temp_dir, '--docker',
+                                                 os.path.join(temp_dir,
+                                                              'nodocker'),
+                                                 '--dockerimagename',
+                                                 'image'])
+            version = json.loads(dt._get_cluster_cache_version(theargs,
+                                                               temp_dir))
+            self.assertEqual(version[1], 'image')
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_run_ddot_failure_not_cached(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            cache = ClusterResultCache(os.path.join(temp_dir,
+                                                    dt.CLUSTER_CACHE_DIR))
+            runner = DDotTaskRunner(wait_time=0, docker='docker',
+                                    dockerimagename='image',
+                                    runddotpath='/foo/runddot.py',
+                                    netattribsetter=MagicMock(),
+                                    clustercache=cache)
+            task = self._make_task(temp_dir)
+            cout = os.path.join(task.get_taskdir(),
+                                ddot_rest_server.CLUSTEROUT)
+
+            # partial output left by a failed run
+            def fake_docker(cmd, timeout=None, on_timeout=None):
+                with open(cout, 'w') as f:
+                    f.write('partial')
+                return {}, 'clixo exited with code 3'
+
+            runner._executor.run_cmd = MagicMock(side_effect=fake_docker)
+            res, emsg = runner._run_ddot(task)
+            self.assertEqual(emsg, 'clixo exited with code 3')
+            self.assertEqual(cache.get(task), None)
+
+            res, emsg = runner._run_clustering(task)
+            self.assertEqual(emsg, 'clixo exited with code 3')
+            self.assertEqual(cache.get(task), None)
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_warm_ddot_container(self):
+        container = WarmDDotContainer([sys.executable, '-c', FAKE_WORKER])
+        self.assertFalse(container.is_alive())
+        container.start()
+        try:
+            self.assertTrue(container.is_alive())
+            self.assertEqual(container.run_job(['--alpha', '0.1', 'x']),
+                             (0, b'RESULT:x\n', b''))
+            self.assertEqual(container.run_job(['y']),
+                             (0, b'RESULT:y\n', b''))
+            try:
+                container.run_job(['die'])
+                self.fail('Expected OSError')
+            except OSError as e:
+                self.assertTrue('exited with code 1' in str(e))
+            self.assertFalse(container.is_alive())
+        finally:
+            container.stop()
+
+    def test_warm_container_pool(self):
+        pool = WarmContainerPool([sys.executable, '-c', FAKE_WORKER], 1)
+        try:
+            self.assertEqual(pool.run_job(['a']), (0, b'RESULT:a\n', b''))
+            try:
+                pool.run_job(['die'])
+                self.fail('Expected OSError')
+            except OSError:
+                pass
+            # dead container is restarted on next job
+            self.assertEqual(pool.run_job(['b']), (0, b'RESULT:b\n', b''))
+        finally:
+            pool.close()
+
+    def test_run_ddot_with_warm_containers(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            runner = DDotTaskRunner(wait_time=0, docker='docker',
+                                    dockerimagename='image',
+                                    runddotpath=os.path.join(temp_dir,
+                                                             dt.RUNDDOT),
+                                    netattribsetter=MagicMock(),
+                                    warmcontainers=2)
+            self.assertEqual(runner._executor.get_container_cmd(),
+                             ['docker', 'run', '-i', '--rm', '-v',
+                              temp_dir + ':' + temp_dir, 'image',
+                              os.path.join(temp_dir, dt.RUNDDOT),
+                              '--worker'])
+            runner._executor._pool = MagicMock()
+            runner._executor._pool.run_job.return_value = (0, b'RESULT:http://'
+                                                              b'ndex/#/network'
+                                                              b'/abc\n', b'')
+            task = self._make_task(temp_dir)
+            res, emsg = runner._run_ddot(task)
+            self.assertEqual(emsg, None)
+            self.assertEqual(res[ddot_rest_server.NDEXURL_KEY],
+                             'http://ndex/#/network/abc')
+            args = runner._executor._pool.run_job.call_args[0][0]
+            self.assertEqual(args[:2], ['--alpha', '0.1'])
+            self.assertEqual(args[-1], task.get_interactionfile())
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_parse_runddot_output(self):
+        self.assertEqual(dt._parse_runddot_output(0, b'hi\nRESULT:http://x'
+                                                     b'\n', b''),
+                         ({ddot_rest_server.NDEXURL_KEY: 'http://x'}, None))
+        self.assertEqual(dt._parse_runddot_output(0, b'ERROR:bad\n', b''),
+                         ({}, 'bad'))
+        self.assertEqual(dt._parse_runddot_output(0, b'CLUSTERED:/out\n',
+                                                  b''),
+                         ({}, None))
+        self.assertEqual(dt._parse_runddot_output(1, b'', b'oops\n'),
+                         ({}, 'runddot.py exited with code 1 without a '
+                              'result: oops'))
+        # result from a run that did not exit cleanly is not trusted
+        self.assertEqual(dt._parse_runddot_output(-9, b'CLUSTERED:/out\n',
+                                                  b'killed\n'),
+                         ({}, 'runddot.py exited with code -9: killed'))
+        self.assertEqual(dt._parse_runddot_output(1, b'ERROR:bad\n', b''),
+                         ({}, 'bad'))
+        self.assertEqual(dt._parse_runddot_output(0, b'', b''),
+                         ({}, 'runddot.py exited with code 0 without a '
+                              'result'))
+
+    def test_command_executor_run_cmd(self):
+        executor = dt.CommandExecutor()
+        # lots of output before the result and on standard error
+        script = ('import sys\n'
+                  'for i in range(20000):\n'
+                  '    sys.stdout.write(str(i) + "\\n")\n'
+                  '    sys.stderr.write("err" + str(i) + "\\n")\n'
+                  'sys.stdout.write("RESULT:http://ndex/#/network/abc\\n")\n'
+                  'sys.stdout.write("RESULT:ignored\\n")\n')
+        self.assertEqual(executor.run_cmd([sys.executable, '-c', script]),
+                         ({ddot_rest_server.NDEXURL_KEY:
+                           'http://ndex/#/network/abc'}, None))
+
+        script = ('import sys\n'
+                  'for i in range(20000):\n'
+                  '    sys.stderr.write("err" + str(i) + "\\n")\n'
+                  'sys.exit(3)\n')
+        res, emsg = executor.run_cmd([sys.executable, '-c', script])
+        self.assertEqual(res, {})
+        self.assertTrue(emsg.startswith('runddot.py exited with code 3 '
+                                        'without a result: '))
+        self.assertTrue(emsg.endswith('err19998\nerr19999'))
+        self.assertFalse('err19000' in emsg)
+
+    def test_command_executor_timeout(self):
+        executor = dt.CommandExecutor()
+        # child ignores SIGTERM so SIGKILL is needed, and spawns a
+        # grandchild that must also be killed
+        script = ('import sys, time, signal, subprocess\n'
+                  'signal.signal(signal.SIGTERM, signal.SIG_IGN)\n'
+                  'subprocess.Popen([sys.executable, "-c",'
+                  ' "import time; time.sleep(60)"])\n'
+                  'sys.stdout.write("USAGE:{\\"cputime\\": 1}\\n")\n'
+                  'sys.stdout.flush()\n'
+                  'time.sleep(60)\n')
+        orig_grace = dt.TIMEOUT_KILL_GRACE
+        try:
+            dt.TIMEOUT_KILL_GRACE = 0.5
+            start = time.time()
+            res, emsg = executor.run_cmd([sys.executable, '-c', script],
+                                         timeout=1)
+        finally:
+            dt.TIMEOUT_KILL_GRACE = orig_grace
+        self.assertTrue(time.time() - start < 30)
+        self.assertEqual(emsg, 'Task exceeded time limit of 1 seconds')
+        self.assertEqual(res, {ddot_rest_server.RESOURCE_USAGE_PARAM:
+                               {'cputime': 1}})
+
+    def test_docker_executor_kills_container_on_timeout(self):
+        executor = dt.DockerExecutor('docker', 'image', '/foo/runddot.py',
+                                     limits=dt.ResourceLimits(timeout=1))
+        task = FileBasedTask('/foo/processing/1.2.3.4/abc', {})
+        executor.get_cmd = MagicMock(return_value=[sys.executable, '-c',
+                                                   'import time\n'
+                                                   'time.sleep(60)\n'])
+        executor.kill_container = MagicMock(return_value='error')
+        res, emsg = executor.run(task, ['input'])
+        self.assertEqual(emsg, 'Task exceeded time limit of 1 seconds')
+        executor.kill_container.assert_called_once_with(task)
+
+        with unittest.mock.patch.object(dt.subprocess, 'run') as mockrun:
+            mockrun.return_value = MagicMock(returncode=0)
+            executor = dt.DockerExecutor('/bin/docker', 'image',
+                                         '/foo/runddot.py')
+            self.assertEqual(executor.kill_container(task), None)
+            self.assertEqual(mockrun.call_args[0][0],
+                             ['/bin/docker', 'kill', 'ddot_abc'])
+
+            mockrun.return_value = MagicMock(returncode=1,
+                                             stderr=b'No such container')
+            self.assertEqual(executor.kill_container(task),
+                             'Unable to kill container ddot_abc : '
+                             'No such container')
+
+            mockrun.side_effect = OSError('no docker')
+            self.assertEqual(executor.kill_container(task),
+                             'Unable to kill container ddot_abc : '
+                             'no docker')
+
+    def test_resource_limits(self):
+        limits = dt.ResourceLimits()
+        self.assertFalse(limits.has_limits())
+        self.assertEqual(limits.get_timeout(), None)
+        self.assertEqual(limits.get_docker_args(), [])
+
+        limits = dt.ResourceLimits(timeout=10, memory=1024, cpus=1.5)
+        self.assertTrue(limits.has_limits())
+        self.assertEqual(limits.get_timeout(), 10)
+        self.assertEqual(limits.get_docker_args(),
+                         ['--init', '--memory', '1024', '--cpus', '1.5'])
+
+        executor = dt.DockerExecutor('docker', 'image', '/foo/runddot.py',
+                                     limits=limits)
+        task = FileBasedTask('/foo/processing/1.2.3.4/abc', {})
+        cmd = executor.get_cmd(task, ['input'])
+        self.assertEqual(cmd[:10], ['docker', 'run', '--rm', '--name',
+                                    'ddot_abc', '--init', '--memory',
+                                    '1024', '--cpus', '1.5'])
+        self.assertEqual(cmd[-1], 'input')
+
+        limits.set_rlimits = MagicMock()
+        executor = dt.LocalExecutor('/foo/runddot.py', limits=limits)
+        executor.apply_limits(123)
+        limits.set_rlimits.assert_called_once_with(123)
+        dt.LocalExecutor('/foo/runddot.py').apply_limits(123)
+
+    def test_local_executor_memory_limit(self):
+        executor = dt.LocalExecutor('/foo/runddot.py',
+                                    limits=dt.ResourceLimits(memory=
+                                                             1073741824))
+        # limits are set just after the process starts so
+        # wait for them to show up
+        script = ('import resource\n'
+                  'import time\n'
+                  'for x in range(500):\n'
+                  '    limit = resource.getrlimit(resource.RLIMIT_AS)[0]\n'
+                  '    if limit != resource.RLIM_INFINITY:\n'
+                  '        break\n'
+                  '    time.sleep(0.01)\n'
+                  'print("RESULT:" + str(limit))\n')
+        res, emsg = executor.run_cmd([sys.executable, '-c', script])
+        self.assertEqual(emsg, None)
+        self.assertEqual(res[ddot_rest_server.NDEXURL_KEY], '1073741824')
+
+    def test_command_executor_apply_limits_fails(self):
+        executor = dt.LocalExecutor('/foo/runddot.py',
+                                    limits=dt.ResourceLimits(memory=1024))
+        executor.apply_limits = MagicMock(side_effect=OSError('nope'))
+        res, emsg = executor.run_cmd([sys.executable, '-c',
+                                      'import time; time.sleep(30)'])
+        self.assertEqual(res, {})
+        self.assertEqual(emsg, 'Unable to set resource limits: nope')
+
+    def test_stream_tail(self):
+        rfd, wfd = os.pipe()
+        with os.fdopen(rfd, 'rb') as rstream:
+            tail = dt.StreamTail(rstream, maxlines=2)
+            with os.fdopen(wfd, 'wb') as wstream:
+                wstream.write(b'a\nb\nc\n')
+            self.assertEqual(tail.get_tail(timeout=10), 'b\nc')
+
+    def _write_fake_runddot(self, temp_dir):
+        """
+        Writes runddot.py stand in that does not need ddot or
+        pandas and fails if --alpha is 0
+        """
+        runddotpath = os.path.join(temp_dir, dt.RUNDDOT)
+        with open(runddotpath, 'w') as f:
+            f.write(FAKE_RUNDDOT)
+        return runddotpath
+
+    def test_local_executor(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            runddotpath = self._write_fake_runddot(temp_dir)
+            executor = dt.LocalExecutor(runddotpath, clixopath='/clixo')
+            task = self._make_task(temp_dir)
+            self.assertEqual(executor.get_cmd(task, ['--alpha', '0.1', 'in']),
+                             [sys.executable, runddotpath,
+                              '--clixopath', '/clixo',
+                              '--alpha', '0.1', 'in'])
+            self.assertEqual(executor.run(task, ['--alpha', '0.1', 'in']),
+                             ({ddot_rest_server.NDEXURL_KEY:
+                               'http://ndex/#/network/in-/clixo'}, None))
+            self.assertEqual(executor.run(task, ['--alpha', '0', 'in']),
+                             ({}, 'alpha is 0'))
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_inprocess_executor(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            task = self._make_task(temp_dir)
+            executor = dt.InProcessExecutor(os.path.join(temp_dir,
+                                                         'missing.py'))
+            res, emsg = executor.run(task, ['in'])
+            self.assertEqual(res, {})
+            self.assertTrue(emsg.startswith('Unable to load runddot: '))
+
+            executor = dt.InProcessExecutor(self._write_fake_runddot(temp_dir))
+            res, emsg = executor.run(task, ['--alpha', '0.1', 'in'])
+            self.assertEqual(emsg, None)
+            self.assertEqual(res[ddot_rest_server.NDEXURL_KEY],
+                             'http://ndex/#/network/in-None')
+            usage = res[ddot_rest_server.RESOURCE_USAGE_PARAM]
+            self.assertTrue(usage[ddot_rest_server.CPUTIME_KEY] >= 0)
+            # peak memory of this process is not specific to the task
+            self.assertFalse(ddot_rest_server.MAXRSS_KEY in usage)
+            res, emsg = executor.run(task, ['--alpha', '0', 'in'])
+            self.assertEqual(emsg, 'alpha is 0')
+            self.assertFalse(ddot_rest_server.NDEXURL_KEY in res)
+            res, emsg = executor.run(task, ['--badflag'])
+            self.assertTrue(emsg.startswith('Invalid arguments for runddot'))
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_process_task_with_inprocess_executor(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            executor = dt.InProcessExecutor(self._write_fake_runddot(temp_dir))
+            runner = DDotTaskRunner(wait_time=0,
+                                    netattribsetter=MagicMock(),
+                                    executor=executor)
+            task = self._make_task(temp_dir)
+            taskid = os.path.basename(task.get_taskdir())
+            task.move_task(ddot_rest_server.SUBMITTED_STATUS)
+            runner._process_task(task)
+            donedir = os.path.join(temp_dir, ddot_rest_server.DONE_STATUS,
+                                   '1.2.3.4', taskid)
+            with open(os.path.join(donedir,
+                                   ddot_rest_server.RESULT), 'r') as f:
+                res = json.load(f)
+            with open(os.path.join(donedir,
+                                   ddot_rest_server.TASK_JSON), 'r') as f:
+                usage = json.load(f)[ddot_rest_server.RESOURCE_USAGE_PARAM]
+            self.assertTrue(usage[ddot_rest_server.WALLTIME_KEY] >= 0)
+            self.assertTrue(ddot_rest_server.CPUTIME_KEY in usage)
+            self.assertFalse(ddot_rest_server.MAXRSS_KEY in usage)
+            self.assertFalse(ddot_rest_server.RESOURCE_USAGE_PARAM in res)
+            self.assertEqual(res[ddot_rest_server.NDEXURL_KEY],
+                             'http://ndex/#/network/' +
+                             os.path.join(temp_dir,
+                                          ddot_rest_server.PROCESSING_STATUS,
+                                          '1.2.3.4', taskid,
+                                          ddot_rest_server.
+                                          INTERACTION_FILE_PARAM) + '-None')
+
+            # error from runddot puts task in error
+            task = self._make_task(temp_dir, taskid='def', alpha=0)
+            task.move_task(ddot_rest_server.SUBMITTED_STATUS)
+            runner._process_task(task)
+            with open(os.path.join(temp_dir, ddot_rest_server.DONE_STATUS,
+                                   '1.2.3.4', 'def',
+                                   ddot_rest_server.TASK_JSON), 'r') as f:
+                self.assertEqual(json.load(f)['error'], 'alpha is 0')
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_process_task_with_separate_upload(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            executor = dt.InProcessExecutor(self._write_fake_runddot(temp_dir))
+            netattribsetter = MagicMock()
+            ufac = FileBasedSubmittedTaskFactory(temp_dir,
+                                                 state=ddot_rest_server.
+                                                 CLUSTERED_STATUS)
+            runner = DDotTaskRunner(wait_time=0.1,
+                                    taskfactory=FileBasedSubmittedTaskFactory(temp_dir),
+                                    netattribsetter=netattribsetter,
+                                    executor=executor,
+                                    uploadtaskfactory=ufac,
+                                    uploadworkers=2,
+                                    compressdone=True)
+            task = self._make_task(temp_dir)
+            task.move_task(ddot_rest_server.SUBMITTED_STATUS)
+
+            # clustering puts task in clustered with output available
+            runner._process_task(task)
+            clustdir = os.path.join(temp_dir,
+                                    ddot_rest_server.CLUSTERED_STATUS,
+                                    '1.2.3.4', 'abc')
+            with open(os.path.join(clustdir,
+                                   ddot_rest_server.CLUSTEROUT), 'r') as f:
+                self.assertEqual(f.read(), 'clusters\n')
+            self.assertFalse(os.path.isfile(os.path.join(clustdir,
+                                                         ddot_rest_server.
+                                                         RESULT)))
+            self.assertFalse(netattribsetter.update_network_attributes.called)
+
+            # upload workers move it to done
+            donedir = os.path.join(temp_dir, ddot_rest_server.DONE_STATUS,
+                                   '1.2.3.4', 'abc')
+            deadline = time.time() + 30
+            runner.run_tasks(keep_looping=lambda: (not os.path.isdir(donedir)
+                                                   and
+                                                   time.time() < deadline))
+            with open(os.path.join(donedir,
+                                   ddot_rest_server.RESULT), 'r') as f:
+                res = json.load(f)
+            self.assertEqual(res[ddot_rest_server.NDEXURL_KEY],
+                             'http://ndex/#/network/' +
+                             os.path.join(temp_dir,
+                                          ddot_rest_server.UPLOADING_STATUS,
+                                          '1.2.3.4', 'abc',
+                                          ddot_rest_server.
+                                          INTERACTION_FILE_PARAM) + '-None')
+            self.assertTrue(ddot_rest_server.HIVIEWURL_KEY in res)
+            self.assertEqual(netattribsetter.update_network_attributes.
+                             call_count, 1)
+            self.assertTrue(os.path.isfile(os.path.join(donedir,
+                                                        ddot_rest_server.
+                                                        CLUSTEROUT +
+                                                        ddot_rest_server.
+                                                        COMPRESSED_SUFFIX)))
+            with open(os.path.join(donedir,
+                                   ddot_rest_server.TASK_JSON), 'r') as f:
+                usage = json.load(f)[ddot_rest_server.RESOURCE_USAGE_PARAM]
+            self.assertTrue(usage[ddot_rest_server.WALLTIME_KEY] >= 0)
+            self.assertTrue(ddot_rest_server.CPUTIME_KEY in usage)
+
+            # upload without clustering output is an error
+            task = self._make_task(temp_dir, taskid='def')
+            task.move_task(ddot_rest_server.UPLOADING_STATUS)
+            runner._run_upload_task(task)
+            with open(os.path.join(temp_dir, ddot_rest_server.DONE_STATUS,
+                                   '1.2.3.4', 'def',
+                                   ddot_rest_server.TASK_JSON), 'r') as f:
+                self.assertEqual(json.load(f)['error'],
+                                 'No output found from clustering algorithm')
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_link_batch_parsed_input(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            runner = DDotTaskRunner(wait_time=0, executor=MagicMock())
+            tindex = ddot_rest_server.TaskIndex(temp_dir)
+            first = self._make_task(temp_dir, taskid='first')
+            task = self._make_task(temp_dir, taskid='second')
+            task.get_taskdict()[ddot_rest_server.BATCH_ID_PARAM] = 'b1'
+            first.save_task()
+            firstsidecar = os.path.join(first.get_taskdir(),
+                                        ddot_rest_server.
+                                        INTERACTION_FILE_SIDECAR)
+            with open(firstsidecar, 'w') as f:
+                f.write('parsed')
+            tindex.update('first', ddot_rest_server.PROCESSING_STATUS,
+                          '1.2.3.4', first.get_taskdir())
+
+            # no batch file
+            self.assertFalse(runner._link_batch_parsed_input(task))
+            os.makedirs(os.path.join(temp_dir, ddot_rest_server.BATCHES))
+            with open(os.path.join(temp_dir, ddot_rest_server.BATCHES,
+                                   'b1.json'), 'w') as f:
+                json.dump({ddot_rest_server.BATCH_TASKS_KEY: ['first',
+                                                              'second']}, f)
+
+            # first task still processing so sidecar may be incomplete
+            self.assertFalse(runner._link_batch_parsed_input(task))
+
+            first.move_task(ddot_rest_server.DONE_STATUS)
+
+            # task with different interaction file is skipped
+            first.get_taskdict()[ddot_rest_server.
+                                 INTERACTION_FILE_SHA256_PARAM] = 'other'
+            first.save_task()
+            self.assertFalse(runner._link_batch_parsed_input(task))
+
+            first.get_taskdict()[ddot_rest_server.
+                                 INTERACTION_FILE_SHA256_PARAM] = '12345'
+            first.save_task()
+            self.assertTrue(runner._link_batch_parsed_input(task))
+            sidecar = os.path.join(task.get_taskdir(),
+                                   ddot_rest_server.INTERACTION_FILE_SIDECAR)
+            self.assertTrue(os.path.samefile(sidecar,
+                                             os.path.join(first.get_taskdir(),
+                                                          ddot_rest_server.
+                                                          INTERACTION_FILE_SIDECAR)))
+            # already has sidecar
+            self.assertFalse(runner._link_batch_parsed_input(task))
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def _create_done_task(self, temp_dir, ipaddr, taskid, size, age):
+        taskdir = os.path.join(temp_dir, ddot_rest_server.DONE_STATUS,
+                               ipaddr, taskid)
+        os.makedirs(taskdir, mode=0o755)
+        tjson = os.path.join(taskdir, ddot_rest_server.TASK_JSON)
+        with open(tjson, 'w') as f:
+            f.write('x' * size)
+        donetime = time.time() - age
+        os.utime(tjson, (donetime, donetime))
+        return taskdir
+
+    def test_retention_sweeper_no_policies(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            self._create_done_task(temp_dir, '1.2.3.4', 'a', 10, 1000)
+            sweeper = dt.RetentionSweeper(temp_dir)
+            self.assertFalse(sweeper.has_policies())
+            self.assertEqual((0, 0), sweeper.sweep())
+
+            # no done directory
+            sweeper = dt.RetentionSweeper(os.path.join(temp_dir, 'foo'),
+                                          max_age=1)
+            self.assertTrue(sweeper.has_policies())
+            self.assertEqual((0, 0), sweeper.sweep())
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_retention_sweeper_max_age(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            old = self._create_done_task(temp_dir, '1.2.3.4', 'a', 10, 1000)
+            new = self._create_done_task(temp_dir, '1.2.3.4', 'b', 10, 0)
+            sweeper = dt.RetentionSweeper(temp_dir, max_age=500)
+            self.assertEqual((1, 10), sweeper.sweep())
+            self.assertFalse(os.path.isdir(old))
+            self.assertTrue(os.path.isdir(new))
+            self.assertEqual((0, 0), sweeper.sweep())
+            self.assertEqual({'age': 1, 'ipquota': 0,
+                              'totalsize': 0, 'bytes': 10},
+                             sweeper.get_stats())
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_retention_sweeper_removes_batch(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            batchdir = os.path.join(temp_dir, ddot_rest_server.BATCHES)
+            os.makedirs(batchdir)
+            batchfile = os.path.join(batchdir, 'batch1.json')
+            with open(batchfile, 'w') as f:
+                json.dump({ddot_rest_server.TASKID_KEY: 'batch1',
+                           ddot_rest_server.REMOTEIP_PARAM: '1.2.3.4',
+                           ddot_rest_server.BATCH_TASKS_KEY: ['a', 'b']}, f)
+            for taskid in ['a', 'b']:
+                taskdir = self._create_done_task(temp_dir, '1.2.3.4',
+                                                 taskid, 10, 1000)
+                tjson = os.path.join(taskdir, ddot_rest_server.TASK_JSON)
+                with open(tjson, 'w') as f:
+                    json.dump({ddot_rest_server.BATCH_ID_PARAM: 'batch1'}, f)
+                donetime = time.time() - 1000
+                os.utime(tjson, (donetime, donetime))
+            sweeper = dt.RetentionSweeper(temp_dir, max_age=500)
+            self.assertEqual(2, sweeper.sweep()[0])
+            self.assertFalse(os.path.isfile(batchfile))
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_retention_sweeper_max_ip_size(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            a = self._create_done_task(temp_dir, '1.2.3.4', 'a', 100, 300)
+            b = self._create_done_task(temp_dir, '1.2.3.4', 'b', 100, 200)
+            c = self._create_done_task(temp_dir, '1.2.3.4', 'c', 100, 100)
+            d = self._create_done_task(temp_dir, '5.6.7.8', 'd', 100, 400)
+            sweeper = dt.RetentionSweeper(temp_dir, max_ip_size=250)
+            self.assertEqual((1, 100), sweeper.sweep())
+            self.assertFalse(os.path.isdir(a))
+            for taskdir in [b, c, d]:
+                self.assertTrue(os.path.isdir(taskdir))
+            self.assertEqual(1, sweeper.get_stats()['ipquota'])
+
+            # new task from same ip pushes it over quota again
+            e = self._create_done_task(temp_dir, '1.2.3.4', 'e', 100, 0)
+            self.assertEqual((1, 100), sweeper.sweep())
+            self.assertFalse(os.path.isdir(b))
+            for taskdir in [c, d, e]:
+                self.assertTrue(os.path.isdir(taskdir))
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_retention_sweeper_max_size_and_max_deletes(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            taskdirs = []
+            for i in range(5):
+                taskdirs.append(self._create_done_task(temp_dir,
+                                                       '1.2.3.' + str(i),
+                                                       'task' + str(i),
+                                                       100, 500 - i))
+            sweeper = dt.RetentionSweeper(temp_dir, max_size=150,
+                                          max_deletes=2)
+            self.assertEqual((2, 200), sweeper.sweep())
+            self.assertFalse(os.path.isdir(taskdirs[0]))
+            self.assertFalse(os.path.isdir(taskdirs[1]))
+            self.assertEqual((2, 200), sweeper.sweep())
+            self.assertFalse(os.path.isdir(taskdirs[2]))
+            self.assertFalse(os.path.isdir(taskdirs[3]))
+            self.assertEqual((0, 0), sweeper.sweep())
+            self.assertTrue(os.path.isdir(taskdirs[4]))
+            self.assertEqual(4, sweeper.get_stats()['totalsize'])
+            self.assertEqual(400, sweeper.get_stats()['bytes'])
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_sweep_done_tasks(self):
+        sweeper = MagicMock()
+        sweeper.sweep = MagicMock(return_value=(2, 10))
+        runner = DDotTaskRunner(taskfactory=None, sweeper=sweeper,
+                                sweep_interval=3600)
+        self.assertEqual(2, runner._sweep_done_tasks())
+        # too soon to sweep again
+        self.assertEqual(0, runner._sweep_done_tasks())
+        self.assertEqual(1, sweeper.sweep.call_count)
+
+        sweeper.sweep = MagicMock(side_effect=Exception('some error'))
+        runner = DDotTaskRunner(taskfactory=None, sweeper=sweeper)
+        self.assertEqual(0, runner._sweep_done_tasks())
+
+        runner = DDotTaskRunner(taskfactory=None)
+        self.assertEqual(0, runner._sweep_done_tasks())
+
+    def test_ndex_client_cache(self):
+        cache = dt.NdexClientCache(max_size=2, max_idle=100)
+        cache._create_client = MagicMock(side_effect=lambda server, user,
+                                         password: MagicMock())
+        c1 = cache.get_client('server', 'bob', 'pass')
+        self.assertTrue(cache.get_client('server', 'bob', 'pass') is c1)
+        self.assertEqual(cache._create_client.call_count, 1)
+
+        # new password replaces client
+        c2 = cache.get_client('server', 'bob', 'newpass')
+        self.assertFalse(c2 is c1)
+        self.assertTrue(c1.s.close.called)
+
+        # least recently used client is dropped when full
+        c3 = cache.get_client('server', 'joe', 'pass')
+        c4 = cache.get_client('server2', 'bob', 'pass')
+        self.assertTrue(c2.s.close.called)
+        self.assertFalse(c3.s.close.called)
+        self.assertTrue(cache.get_client('server', 'joe', 'pass') is c3)
+
+        # idle clients are dropped
+        for entry in cache._clients.values():
+            entry[2] -= 1000
+        c5 = cache.get_client('server', 'joe', 'pass')
+        self.assertFalse(c5 is c3)
+        self.assertTrue(c3.s.close.called)
+        self.assertTrue(c4.s.close.called)
+
+        cache.close()
+        self.assertTrue(c5.s.close.called)
+        self.assertEqual(len(cache._clients), 0)
+
+    def test_ndex_client_cache_create_client(self):
+        orig_ndex2 = dt.Ndex2
+        try:
+            client = MagicMock()
+            client.s = requests.Session()
+            dt.Ndex2 = MagicMock(return_value=client)
+            cache = dt.NdexClientCache(pool_maxsize=4)
+            self.assertTrue(cache._create_client('http://server', 'bob',
+                                                 'pass') is client)
+            dt.Ndex2.assert_called_with('http://server', 'bob', 'pass')
+            adapter = client.s.get_adapter('https://server/v2/network')
+            self.assertEqual(adapter._pool_maxsize, 4)
+            self.assertEqual(adapter.max_retries.total, dt.NDEX_RETRIES)
+            self.assertEqual(tuple(adapter.max_retries.status_forcelist),
+                             dt.NDEX_RETRY_STATUS)
+            client.s.close()
+        finally:
+            dt.Ndex2 = orig_ndex2
+
+    def test_network_attribute_setter_uses_client_cache(self):
+        cache = MagicMock()
+        setter = dt.NetworkAttributeSetter(clientcache=cache)
+        self.assertTrue(setter._get_client('s', 'u', 'p') is
+                        cache.get_client.return_value)
+        cache.get_client.assert_called_with('s', 'u', 'p')
+
     def test_main(self):
         temp_dir = tempfile.mkdtemp()
         try:
@@ -597,6 +2203,66 @@ class TestDdotTaskRunner(unittest.TestCase):
                      temp_dir],
                     keep_looping=loop)
 
+            # test no work with multiple workers
+            loop = MagicMock()
+            loop.side_effect = [True, True, False]
+            dt.main(['foo.py', '--wait_time', '0',
+                     '--nodaemon', '--workers', '2',
+                     temp_dir],
+                    keep_looping=loop)
+
+            # test no work with inotify disabled
+            loop = MagicMock()
+            loop.side_effect = [True, True, False]
+            dt.main(['foo.py', '--wait_time', '0',
+                     '--nodaemon', '--disableinotify',
+                     temp_dir],
+                    keep_looping=loop)
+
+            # test no work with in process executor
+            loop = MagicMock()
+            loop.side_effect = [True, True, False]
+            dt.main(['foo.py', '--wait_time', '0',
+                     '--nodaemon', '--executor', 'inprocess',
+                     temp_dir],
+                    keep_looping=loop)
+
+            # test no work with leases disabled
+            loop = MagicMock()
+            loop.side_effect = [True, True, False]
+            dt.main(['foo.py', '--wait_time', '0',
+                     '--nodaemon', '--leasetime', '0',
+                     temp_dir],
+                    keep_looping=loop)
+
+            # test no work with separate upload workers
+            loop = MagicMock()
+            loop.side_effect = [True, True, False]
+            dt.main(['foo.py', '--wait_time', '0',
+                     '--nodaemon', '--uploadworkers', '1',
+                     temp_dir],
+                    keep_looping=loop)
+            self.assertTrue(os.path.isdir(os.path.join(temp_dir,
+                                                       ddot_rest_server.
+                                                       CLUSTERED_STATUS)))
+
+            # test no work with cache cleared on startup
+            loop = MagicMock()
+            loop.side_effect = [True, True, False]
+            dt.main(['foo.py', '--wait_time', '0',
+                     '--nodaemon', '--clearcache',
+                     temp_dir],
+                    keep_looping=loop)
+
+            # test no work with retention policies
+            loop = MagicMock()
+            loop.side_effect = [True, True, False]
+            dt.main(['foo.py', '--wait_time', '0',
+                     '--nodaemon', '--retentionmaxage', '3600',
+                     '--retentionmaxipsize', '1000000',
+                     temp_dir],
+                    keep_looping=loop)
+
             # test exception catch works
             loop = MagicMock()
             loop.side_effect = Exception('some error')
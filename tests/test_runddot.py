@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `runddot.py` script run in ddot docker image."""
+
+import io
+import os
+import json
+import stat
+import unittest
+import shutil
+import tempfile
+import importlib.util
+
+
+RUNDDOT_PATH = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'ddot_docker', 'runddot.py')
+
+
+def _load_runddot():
+    """
+    Loads runddot.py which needs ddot installed
+    :return: runddot module or None if ddot is not installed
+    """
+    try:
+        spec = importlib.util.spec_from_file_location('runddot',
+                                                      RUNDDOT_PATH)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+    except ImportError:
+        return None
+
+
+runddot = _load_runddot()
+
+# stands in for clixo, writes partial output then fails
+FAILING_CLIXO = """#!/bin/sh
+echo "# partial"
+echo "some clixo error" >&2
+exit 3
+"""
+
+
+@unittest.skipIf(runddot is None, 'ddot is not installed')
+class TestRunDDot(unittest.TestCase):
+
+    def setUp(self):
+        self._temp_dir = tempfile.mkdtemp()
+        self._input = os.path.join(self._temp_dir, 'input.txt')
+        with open(self._input, 'w') as f:
+            f.write('A\tB\t1.0\nB\tC\t0.5\n')
+
+    def tearDown(self):
+        shutil.rmtree(self._temp_dir)
+
+    def _write_clixo(self, script):
+        clixo = os.path.join(self._temp_dir, 'clixo')
+        with open(clixo, 'w') as f:
+            f.write(script)
+        os.chmod(clixo, stat.S_IRWXU)
+        return clixo
+
+    def test_get_ddot_result_clixo_fails(self):
+        clixo = self._write_clixo(FAILING_CLIXO)
+        output = os.path.join(self._temp_dir, 'out')
+        theargs = runddot._parse_arguments('desc',
+                                           [self._input,
+                                            '--clixopath', clixo,
+                                            '--output', output])
+        ndexurl, emsg = runddot.get_ddot_result(theargs)
+        self.assertEqual(None, ndexurl)
+        self.assertEqual('clixo exited with code 3: some clixo error',
+                         emsg)
+
+        self.assertEqual('ERROR:clixo exited with code 3: some '
+                         'clixo error\n', runddot.run_ddot(theargs))
+
+    def test_get_ddot_result_clixo_fails_no_output(self):
+        clixo = self._write_clixo(FAILING_CLIXO)
+        theargs = runddot._parse_arguments('desc',
+                                           [self._input,
+                                            '--clixopath', clixo])
+        ndexurl, emsg = runddot.get_ddot_result(theargs)
+        self.assertEqual(None, ndexurl)
+        self.assertTrue(emsg.startswith('clixo exited with code 3'))
+
+    def test_run_worker_usage_has_no_maxrss(self):
+        infile = io.StringIO('{"id": 1, "args": ["--badflag"]}\n')
+        outfile = io.StringIO()
+        self.assertEqual(0, runddot.run_worker('desc', infile, outfile))
+        lines = outfile.getvalue().split('\n')
+        self.assertTrue(lines[0].startswith(runddot.USAGE_PREFIX))
+        usage = json.loads(lines[0][len(runddot.USAGE_PREFIX):])
+        self.assertTrue('cputime' in usage)
+        self.assertFalse('maxrss' in usage)
+        self.assertTrue(lines[1].startswith('ERROR:'))
+        self.assertEqual(lines[2], runddot.DONE_PREFIX + '1')
+
+    def test_read_interaction_file(self):
+        df = runddot.read_interaction_file(self._input)
+        self.assertEqual(list(df.columns), runddot.INTERACTION_COLUMNS)
+        gene1, gene2, weight = runddot.INTERACTION_COLUMNS
+        # both gene columns share categories so they can be compared
+        self.assertEqual(df[gene1].dtype, df[gene2].dtype)
+        self.assertEqual(list(df[gene1].cat.categories), ['A', 'B', 'C'])
+        self.assertEqual(list(df[gene1] == df[gene2]), [False, False])
+        self.assertEqual(list(df[gene2] == 'B'), [True, False])
+        self.assertEqual(str(df[weight].dtype), 'float64')
+        self.assertEqual(list(df[weight]), [1.0, 0.5])
+
+    def test_read_interaction_file_invalid(self):
+        with open(self._input, 'w') as f:
+            f.write('A\tB\n')
+        with self.assertRaises(ValueError):
+            runddot.read_interaction_file(self._input)
+        with open(self._input, 'w') as f:
+            f.write('A\tB\t1.0\nB\t\t0.5\n')
+        with self.assertRaises(ValueError):
+            runddot.read_interaction_file(self._input)
+
+    def test_get_ddot_network(self):
+        df = runddot.read_interaction_file(self._input)
+        network = runddot.get_ddot_network(df)
+        gene1, gene2, weight = runddot.INTERACTION_COLUMNS
+        self.assertEqual(network[gene1].dtype, object)
+        self.assertEqual(network[gene2].dtype, object)
+        self.assertEqual(str(network[weight].dtype), 'float64')
+        self.assertEqual(json.loads(json.dumps(network.values.tolist())),
+                         [['A', 'B', 1.0], ['B', 'C', 0.5]])
+        # original is left alone
+        self.assertEqual(str(df[gene1].dtype), 'category')
+
+    @unittest.skipIf(runddot is None or runddot.feather is None,
+                     'pyarrow is not installed')
+    def test_read_interaction_file_sidecar(self):
+        sidecar = self._input + runddot.SIDECAR_SUFFIX
+        df = runddot.read_interaction_file(self._input)
+        self.assertTrue(os.path.isfile(sidecar))
+
+        # newer sidecar is loaded instead of parsing the file
+        with open(self._input, 'w') as f:
+            f.write('not\tvalid\n')
+        os.utime(self._input, (0, 0))
+        self.assertTrue(runddot.read_interaction_file(self._input).
+                        equals(df))
+
+        # stale sidecar is ignored and replaced
+        with open(self._input, 'w') as f:
+            f.write('X\tY\t2.0\n')
+        os.utime(sidecar, (0, 0))
+        newdf = runddot.read_interaction_file(self._input)
+        self.assertEqual(newdf.values.tolist(), [['X', 'Y', 2.0]])
+        self.assertTrue(os.path.getmtime(sidecar) > 0)
+
+
+if __name__ == '__main__':
+    unittest.main()